@@ -0,0 +1,271 @@
+"""Binary evaluating every response file of the data directory at once.
+
+Discovers the `{lang}_input_response_data_{model}.jsonl` files, reads each
+input file and loads the NLP resources once, and checks all the responses in a
+single worker pool. Writes the results in the layout of `evaluation_main`,
+`{evaluations_dir}/{lang}_input_response_data_{model}/eval_results_*.jsonl`,
+and a `summary.json` with the accuracies of every model and language.
+
+It also accepts the `--workers`, `--spacy_batch_size`, `--spacy_n_process`,
+`--result_cache`, `--run_log`, `--profile`, `--profile_dir`,
+`--results_format`, `--fast_score` and `--checker_costs` flags of
+`evaluation_main`. See README.md.
+"""
+
+import contextlib
+import dataclasses
+import functools
+import glob
+import itertools
+import json
+import os
+import re
+
+from absl import app
+from absl import flags
+from absl import logging
+import langdetect
+
+import evaluation_main
+import metrics
+import response_corpus
+import response_index
+import results_store
+
+
+_DATA_DIR = flags.DEFINE_string(
+    "data_dir", "./data", "Directory of the input and response data."
+)
+
+_EVALUATIONS_DIR = flags.DEFINE_string(
+    "evaluations_dir", "./evaluations", "Directory of the eval results."
+)
+
+_LANGUAGES = flags.DEFINE_list(
+    "languages", None, "Languages to evaluate. Defaults to all of them."
+)
+
+_MODELS = flags.DEFINE_list(
+    "models",
+    None,
+    "Models to evaluate, as in the response file names (with `__` for `/`). "
+    "Defaults to all of them.",
+)
+
+_RESPONSE_FILE_RE = re.compile(
+    r"^(?P<language>[a-z]+)_input_response_data_(?P<model>.+)\.jsonl$")
+
+
+@dataclasses.dataclass
+class ResponseFile:
+  language: str
+  model: str
+  path: str
+
+  @property
+  def name(self):
+    """The name of the evaluation directory of the file."""
+    return os.path.basename(self.path)[:-len(".jsonl")]
+
+
+def discover_response_files(data_dir, languages=None, models=None):
+  """Returns the `ResponseFile`s of `data_dir`, sorted by language and model."""
+  response_files = []
+  for path in sorted(glob.glob(
+      os.path.join(data_dir, "*_input_response_data_*.jsonl"))):
+    match = _RESPONSE_FILE_RE.match(os.path.basename(path))
+    if not match:
+      continue
+    if languages and match["language"] not in languages:
+      continue
+    if models and match["model"] not in models:
+      continue
+    response_files.append(
+        ResponseFile(match["language"], match["model"], path))
+  return response_files
+
+
+def input_data_path(data_dir, language):
+  """Returns the input data of `language`, preferring the cleaned versions."""
+  for suffix in ("_FINAL_CLEAN", "_clean", ""):
+    path = os.path.join(data_dir, f"{language}_input_data{suffix}.jsonl")
+    if os.path.exists(path):
+      return path
+  return None
+
+
+def evaluate_response_files(response_files, data_dir, evaluations_dir,
+                            workers=1, spacy_batch_size=64, spacy_n_process=1,
+                            run_log=None, results_format="jsonl",
+                            fast_score=None, context=None):
+  """Evaluates response files and writes their results.
+
+  Args:
+    response_files: A list of `ResponseFile`.
+    data_dir: Directory of the input data.
+    evaluations_dir: Directory of the eval results.
+    workers: The number of worker processes shared by all the files.
+    spacy_batch_size: Batch size of the spaCy pre-analysis, 0 disables it.
+    spacy_n_process: Number of processes of the spaCy pre-analysis.
+    run_log: A `metrics.RunLog` recording the duration of each stage, if any.
+      As the files share the worker pool, the evaluate stage of a file is the
+      time spent waiting for its results.
+    results_format: "jsonl", "columnar" or "both", see `--results_format`.
+    fast_score: "strict", "loose" or "both" to only write the prompt-level
+      accuracies of each file to `fast_scores.json`, see `--fast_score`.
+    context: The `evaluation_main.EvaluationContext` shared by all the files,
+      if any.
+
+  Returns:
+    A list of summary dictionaries, one per evaluated file.
+  """
+  inputs = {}
+  input_paths = {}
+  jobs = []
+  for response_file in response_files:
+    language = response_file.language
+    if language not in input_paths:
+      input_paths[language] = input_data_path(data_dir, language)
+      if input_paths[language] is not None:
+        inputs[language] = evaluation_main.read_prompt_list(
+            input_paths[language])
+    if input_paths[language] is None:
+      logging.warning("No input data for %s, skipping %s", language,
+                      response_file.path)
+      continue
+    with metrics.stage(run_log, "read", language=language,
+                       model=response_file.model) as stage:
+      index = response_index.ResponseIndex(response_file.path)
+      index.log_duplicates()
+      jobs.append((response_file, list(index.iter_pairs(inputs[language])),
+                   input_paths[language]))
+      stage["prompts"] = len(jobs[-1][1])
+
+  all_pairs = [pair for _, pairs, _ in jobs for pair in pairs]
+  preanalyzed_utils = []
+  func = evaluation_main.test_instruction_following_all
+  if fast_score:
+    variants = evaluation_main.fast_score_variants(fast_score)
+    func = functools.partial(evaluation_main.test_instruction_following_fast,
+                             variants=variants)
+  elif spacy_batch_size > 0:
+    # Runs before the worker pool is created so that forked workers inherit
+    # the analyses.
+    with metrics.stage(run_log, "preanalyze", prompts=len(all_pairs)):
+      preanalyzed_utils = evaluation_main.preanalyze_responses(
+          all_pairs, spacy_batch_size, spacy_n_process, context)
+
+  logging.info("Evaluating %d responses of %d files...", len(all_pairs),
+               len(jobs))
+  summary = []
+  with contextlib.ExitStack() as stack:
+    for util in preanalyzed_utils:
+      stack.callback(util.clear_preanalyzed)
+    if workers > 1:
+      # The workers read the responses of every file from shared memory.
+      corpus_jobs = []
+      for response_file, pairs, _ in jobs:
+        corpus = stack.enter_context(response_corpus.ResponseCorpus.create(
+            response for _, response in pairs))
+        corpus_jobs.append((inputs[response_file.language], corpus))
+      results = evaluation_main.iter_corpus_evaluations(
+          func, corpus_jobs, workers=workers, languages=sorted(inputs),
+          context=context)
+    else:
+      results = evaluation_main.iter_evaluations(func, all_pairs,
+                                                 context=context)
+    # Stops the worker pool, before the corpora are freed.
+    stack.callback(results.close)
+    for response_file, pairs, input_path in jobs:
+      fields = {"language": response_file.language,
+                "model": response_file.model}
+      with metrics.stage(run_log, "evaluate", prompts=len(pairs), **fields):
+        file_results = list(itertools.islice(results, len(pairs)))
+      entry = dict(fields)
+      output_dir = os.path.join(evaluations_dir, response_file.name)
+      if fast_score:
+        scores = evaluation_main.fast_score_summary(file_results, variants)
+        logging.info("Generated: %s",
+                     evaluation_main.write_fast_scores(output_dir, scores))
+        entry.update(scores)
+        summary.append(entry)
+        continue
+      if results_format != "jsonl":
+        with metrics.stage(run_log, "write", prompts=len(pairs),
+                           output=results_store.RESULTS_DIR, **fields):
+          evaluation_main.write_results_store(
+              output_dir, pairs, file_results, input_path, response_file.path)
+      for position, variant in [(0, "strict"), (1, "loose")]:
+        outputs = [result[position] for result in file_results]
+        if results_format != "columnar":
+          output_file_name = results_store.jsonl_path(output_dir, variant)
+          with metrics.stage(run_log, "write", prompts=len(outputs),
+                             output=os.path.basename(output_file_name),
+                             **fields):
+            evaluation_main.write_outputs(output_file_name, outputs)
+        report = evaluation_main.AccuracyReport()
+        for o in outputs:
+          report.add(o)
+        entry[variant] = {"prompt_level": report.prompt_accuracy,
+                          "instruction_level": report.instruction_accuracy}
+      logging.info("Generated: %s", os.path.join(evaluations_dir,
+                                                  response_file.name))
+      summary.append(entry)
+  return summary
+
+
+def print_summary(summary):
+  """Prints the accuracies of every evaluated file."""
+  print("=" * 64)
+  print("language model strict-prompt strict-instruction loose-prompt "
+        "loose-instruction")
+  for entry in summary:
+    # Fast scores only have the prompt-level accuracy of some variants.
+    accuracies = [entry.get(variant, {}).get(level, "-")
+                  for variant in results_store.VARIANTS
+                  for level in ("prompt_level", "instruction_level")]
+    print(f"{entry['language']} {entry['model']} "
+          + " ".join(str(accuracy) for accuracy in accuracies))
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError("Too many command-line arguments.")
+
+  # Seeds langdetect so that serial and parallel runs give the same results.
+  langdetect.DetectorFactory.seed = 0
+  run_log = None
+  if flags.FLAGS.run_log:
+    run_log = metrics.RunLog(flags.FLAGS.run_log)
+  context = evaluation_main.EvaluationContext.from_flags(
+      time_checkers=run_log is not None)
+
+  response_files = discover_response_files(
+      _DATA_DIR.value, _LANGUAGES.value, _MODELS.value)
+  if not response_files:
+    raise app.UsageError(f"No response files found in {_DATA_DIR.value}.")
+
+  summary = evaluate_response_files(
+      response_files, _DATA_DIR.value, _EVALUATIONS_DIR.value,
+      workers=flags.FLAGS.workers,
+      spacy_batch_size=flags.FLAGS.spacy_batch_size,
+      spacy_n_process=flags.FLAGS.spacy_n_process,
+      run_log=run_log,
+      results_format=flags.FLAGS.results_format,
+      fast_score=flags.FLAGS.fast_score,
+      context=context)
+  if run_log:
+    evaluation_main.log_metrics(run_log, context)
+
+  summary_file_name = os.path.join(_EVALUATIONS_DIR.value, "summary.json")
+  with open(summary_file_name, "w") as f:
+    json.dump(summary, f, indent=2)
+  logging.info("Generated: %s", summary_file_name)
+  print_summary(summary)
+  if context.profiler is not None:
+    evaluation_main.report_profile(context.profiler, _EVALUATIONS_DIR.value,
+                                   flags.FLAGS.profile_dir)
+
+
+if __name__ == "__main__":
+  app.run(main)
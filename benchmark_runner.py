@@ -5,8 +5,12 @@ import subprocess
 import time
 import json
 import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from huggingface_hub import scan_cache_dir
+from huggingface_hub import HfApi, scan_cache_dir, snapshot_download
+
+import metrics
 
 # --- CONFIGURAÇÃO DA ESCALA ---
 MODELS_TO_BENCHMARK = [
@@ -28,11 +32,11 @@ MODELS_TO_BENCHMARK = [
     'Qwen/Qwen2.5-7B-Instruct-GPTQ-Int4',
     'Qwen/Qwen2.5-14B-Instruct-GPTQ-Int4',
     'Qwen/Qwen2.5-32B-Instruct-GPTQ-Int4',
-    'Qwen/Qwen2.5-72B-Instruct-GPTQ-Int4'',
+    'Qwen/Qwen2.5-72B-Instruct-GPTQ-Int4',
     'hugging-quants/Meta-Llama-3.1-70B-Instruct-AWQ-INT4',
     'hugging-quants/Meta-Llama-3.1-8B-Instruct-AWQ-INT4',
     'mistralai/Mistral-7B-Instruct-v0.3',
-    'deepseek-ai/deepseek-llm-7b-chat''
+    'deepseek-ai/deepseek-llm-7b-chat'
 ]
 
 def install_dependencies():
@@ -143,72 +147,222 @@ def delete_model_cache(model_id):
 def format_time(seconds):
     return str(timedelta(seconds=int(seconds)))
 
-def run_benchmark():
-    benchmark_start_time = time.time()
+def hf_cache_size():
+    """Bytes ocupados pelo cache do HuggingFace."""
+    try:
+        return scan_cache_dir().size_on_disk
+    except Exception:
+        return 0
 
-    for model in MODELS_TO_BENCHMARK:
-        model_start_time = time.time()
-        safe_model_name = model.replace('/', '__')
+def hf_cached_models():
+    """Modelos no cache do HuggingFace, do acesso mais antigo ao mais recente."""
+    try:
+        repos = scan_cache_dir().repos
+    except Exception:
+        return []
+    return [repo.repo_id for repo in sorted(repos, key=lambda repo: repo.last_accessed)]
 
-        print(f"\n{'='*60}")
-        print(f"🚀 INICIANDO: {model}")
-        print(f"{'='*60}")
+def hf_model_size(model_id):
+    """Bytes dos arquivos do modelo no Hub, ou None se não for possível saber."""
+    try:
+        info = HfApi().model_info(model_id, files_metadata=True)
+        return sum(sibling.size or 0 for sibling in info.siblings)
+    except Exception:
+        return None
 
-        # --- PASSO 1: INFERÊNCIA ---
-        print(">> Passo 1: Inferência (Processo Isolado)")
-        t0_inf = time.time()
-        inferencia_sucesso = False
+def prefetch_model(model_id):
+    """Baixa os pesos do modelo para o cache do HuggingFace."""
+    try:
+        snapshot_download(model_id)
+        return True
+    except Exception as e:
+        # Não é fatal: a inferência baixa o modelo se ele não estiver no cache.
+        print(f"   -> Pré-download de {model_id} falhou: {e}")
+        return False
 
-        try:
-            cmd = [sys.executable, "universal_inference.py", "--model_name", model]
-            process = subprocess.run(cmd, check=True, text=True)
-            
-            inference_time = time.time() - t0_inf
-            print(f"   ⏱️ Tempo de Inferência: {format_time(inference_time)}")
-            inferencia_sucesso = True
-
-        except subprocess.CalledProcessError as e:
-            print(f"\n❌ FALHA NO MODELO {model} (Código {e.returncode})")
-            print("   Ação: Pulando avaliação e limpando recursos.")
-            delete_model_cache(model)
-            continue
-
-        # --- PASSO 2: AVALIAÇÃO ---
-        if inferencia_sucesso:
-            print("\n>> Passo 2: Avaliação")
-            t0_eval = time.time()
-            lang = "pt"
-            
-            resp_file = f"data/{lang}_input_response_data_{safe_model_name}.jsonl"
-            out_dir = f"evaluations/{lang}_input_response_data_{safe_model_name}"
-
-            if os.path.exists(resp_file):
-                os.makedirs(out_dir, exist_ok=True)
-                try:
-                    subprocess.run([
-                        sys.executable, "-m", "evaluation_main",
-                        "--input_data", f"data/{lang}_input_data_FINAL_CLEAN.jsonl",
-                        "--input_response_data", resp_file,
-                        "--output_dir", out_dir
-                    ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-                    print(f"   ✅ {lang.upper()}: Métricas calculadas com sucesso.")
-                except subprocess.CalledProcessError:
-                    print(f"   ❌ {lang.upper()}: Falhou na etapa de cálculo de métricas.")
-            else:
-                print(f"   ⚠️ {lang.upper()}: Arquivo de resposta não encontrado: {resp_file}")
-
-            print(f"   ⏱️ Tempo Avaliação: {format_time(time.time() - t0_eval)}")
-
-        # --- PASSO 3: LIMPEZA ---
-        print(f"\n>> Passo 3: Limpeza Pós-Ciclo")
-        delete_model_cache(model)
-        
-        print(f"✅ Ciclo finalizado para {model}")
-        print(f"⏱️ Tempo total deste modelo: {format_time(time.time() - model_start_time)}")
+def run_inference(model, run_log_path=""):
+    """Gera as respostas do modelo em um processo isolado. Retorna True se deu certo."""
+    try:
+        subprocess.run([sys.executable, "universal_inference.py", "--model_name", model,
+                        "--run_log", run_log_path],
+                       check=True, text=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"\n❌ FALHA NO MODELO {model} (Código {e.returncode})")
+        return False
+
+def run_evaluation(model, run_log_path=""):
+    """Calcula as métricas das respostas do modelo. Retorna True se deu certo."""
+    lang = "pt"
+    safe_model_name = model.replace('/', '__')
+    resp_file = f"data/{lang}_input_response_data_{safe_model_name}.jsonl"
+    out_dir = f"evaluations/{lang}_input_response_data_{safe_model_name}"
+
+    if not os.path.exists(resp_file):
+        print(f"   ⚠️ {lang.upper()}: Arquivo de resposta não encontrado: {resp_file}")
+        return False
+
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        subprocess.run([
+            sys.executable, "-m", "evaluation_main",
+            "--input_data", f"data/{lang}_input_data_FINAL_CLEAN.jsonl",
+            "--input_response_data", resp_file,
+            "--output_dir", out_dir
+        ] + (["--run_log", run_log_path] if run_log_path else []), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        print(f"   ✅ {lang.upper()} ({model}): Métricas calculadas com sucesso.")
+        return True
+    except subprocess.CalledProcessError:
+        print(f"   ❌ {lang.upper()} ({model}): Falhou na etapa de cálculo de métricas.")
+        return False
+
+class BenchmarkPipeline:
+    """Executa o benchmark em pipeline.
+
+    Enquanto o modelo i gera respostas (GPU), os pesos do modelo i+1 são baixados
+    e as respostas do modelo i-1 são avaliadas (CPU). Cada etapa é uma função
+    injetável, o que permite testar o pipeline com funções falsas e sem GPU.
+
+    Args:
+        models: Modelos a avaliar, em ordem.
+        prefetch: Baixa os pesos de um modelo para o cache.
+        infer: Gera as respostas de um modelo; retorna True se deu certo.
+        evaluate: Avalia as respostas de um modelo; retorna True se deu certo.
+        evict: Remove os pesos de um modelo do cache.
+        cache_size: Retorna os bytes ocupados pelo cache.
+        model_size: Retorna os bytes de um modelo, ou None se desconhecido.
+        cached_models: Retorna os modelos no cache, na ordem em que podem ser removidos.
+        disk_budget: Bytes que o cache pode ocupar; None para não limitar. Antes de
+            cada download antecipado, os modelos em cache que não estão em uso são
+            removidos até o modelo caber no orçamento; um modelo de tamanho
+            desconhecido só é baixado antecipadamente com o cache vazio.
+        run_log: `metrics.RunLog` onde registrar a duração de cada etapa por
+            modelo (download, inference, evaluation, cleanup); None para não registrar.
+    """
+
+    def __init__(self, models, prefetch=prefetch_model, infer=run_inference,
+                 evaluate=run_evaluation, evict=delete_model_cache,
+                 cache_size=hf_cache_size, model_size=hf_model_size,
+                 cached_models=hf_cached_models, disk_budget=None, run_log=None):
+        self.models = list(models)
+        self.prefetch = prefetch
+        self.infer = infer
+        self.evaluate = evaluate
+        self.evict = evict
+        self.cache_size = cache_size
+        self.model_size = model_size
+        self.cached_models = cached_models
+        self.disk_budget = disk_budget
+        self.run_log = run_log
+
+    def timed(self, stage, fn, model):
+        """Executa `fn(model)` registrando a duração da etapa no run log."""
+        with metrics.stage(self.run_log, stage, kind="pipeline", model=model):
+            return fn(model)
+
+    def fits_disk_budget(self, size):
+        """Se um modelo de `size` bytes (None se desconhecido) cabe no cache agora."""
+        if self.disk_budget is None:
+            return True
+        if size is None:
+            return self.cache_size() == 0
+        return self.cache_size() + size <= self.disk_budget
+
+    def make_room(self, model, in_use=()):
+        """Remove modelos do cache até `model` caber no orçamento de disco.
+
+        Os modelos em `in_use` nunca são removidos. Retorna se `model` cabe.
+        """
+        if self.disk_budget is None:
+            return True
+        cached_models = self.cached_models()
+        if model in cached_models:
+            # Já está no cache, não há o que baixar.
+            return True
+        size = self.model_size(model)
+        for cached in cached_models:
+            if self.fits_disk_budget(size):
+                break
+            if cached != model and cached not in in_use:
+                self.timed("cleanup", self.evict, cached)
+        return self.fits_disk_budget(size)
+
+    def run(self):
+        """Executa o pipeline e retorna, por modelo, o resultado de cada etapa."""
+        results = {model: {"inference": False, "evaluation": None, "inference_time": 0.0}
+                   for model in self.models}
+        evaluations = {}
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher, \
+             ThreadPoolExecutor(max_workers=1) as evaluator:
+            prefetched = None
+            if self.models and self.make_room(self.models[0]):
+                prefetched = prefetcher.submit(self.timed, "download", self.prefetch, self.models[0])
+
+            for i, model in enumerate(self.models):
+                print(f"\n{'='*60}")
+                print(f"🚀 INICIANDO: {model}")
+                print(f"{'='*60}")
+
+                # Espera o download deste modelo antes de carregá-lo.
+                if prefetched is not None:
+                    prefetched.result()
+                    prefetched = None
+
+                # Baixa o próximo modelo durante a inferência deste.
+                if i + 1 < len(self.models):
+                    next_model = self.models[i + 1]
+                    if self.make_room(next_model, in_use=(model,)):
+                        prefetched = prefetcher.submit(self.timed, "download", self.prefetch, next_model)
+                    else:
+                        print(f"   -> Orçamento de disco: {next_model} será baixado depois.")
+
+                print(">> Inferência (Processo Isolado)")
+                t0_inf = time.time()
+                results[model]["inference"] = self.timed("inference", self.infer, model)
+                results[model]["inference_time"] = time.time() - t0_inf
+                print(f"   ⏱️ Tempo de Inferência ({model}): {format_time(results[model]['inference_time'])}")
+
+                # Os pesos só são necessários para a inferência.
+                self.timed("cleanup", self.evict, model)
+
+                if results[model]["inference"]:
+                    # A avaliação (CPU) roda enquanto o próximo modelo gera respostas (GPU).
+                    evaluations[model] = evaluator.submit(self.timed, "evaluation", self.evaluate, model)
+                else:
+                    print("   Ação: Pulando avaliação.")
+
+            if prefetched is not None:
+                prefetched.result()
+            for model, evaluation in evaluations.items():
+                results[model]["evaluation"] = evaluation.result()
+
+        return results
+
+def run_benchmark(disk_budget=None, run_log_path=metrics.DEFAULT_PATH):
+    benchmark_start_time = time.time()
+
+    run_log = None
+    if run_log_path:
+        run_log = metrics.RunLog(run_log_path)
+        # Os subprocessos registram no mesmo run log, com o mesmo run_id.
+        os.environ[metrics.RUN_ID_ENV] = run_log.run_id
+    results = BenchmarkPipeline(
+        MODELS_TO_BENCHMARK,
+        infer=functools.partial(run_inference, run_log_path=run_log_path),
+        evaluate=functools.partial(run_evaluation, run_log_path=run_log_path),
+        disk_budget=disk_budget, run_log=run_log).run()
 
     total_benchmark_time = time.time() - benchmark_start_time
+    failed = [model for model, result in results.items() if not result["inference"]]
     print(f"\n{'='*60}")
+    if failed:
+        print(f"⚠️ Modelos com falha na inferência: {', '.join(failed)}")
     print(f"🎉 BENCHMARK COMPLETO! Tempo total: {format_time(total_benchmark_time)}")
+    if run_log:
+        print(f"📈 Métricas da execução {run_log.run_id} em {run_log_path}")
+        metrics.print_summary([record for record in metrics.read_run_log(run_log_path)
+                               if record["run_id"] == run_log.run_id])
 
 def zip_results():
     """Empacota os resultados (JSONs e Evaluations) localmente."""
@@ -250,8 +404,18 @@ def zip_results():
 
 if __name__ == "__main__":
     sys.path.append(os.getcwd())
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--disk_budget_gb", type=float, default=None,
+                        help="Espaço máximo do cache do HuggingFace; antes de baixar o próximo "
+                             "modelo, os modelos em cache que não estão em uso são removidos "
+                             "até ele caber.")
+    parser.add_argument("--run_log", type=str, default=metrics.DEFAULT_PATH,
+                        help="Arquivo JSONL com a duração e a vazão de cada etapa; vazio para desativar.")
+    args = parser.parse_args()
+    disk_budget = None if args.disk_budget_gb is None else int(args.disk_budget_gb * 1024**3)
     
     install_dependencies()
     prepare_data()
-    run_benchmark()
+    run_benchmark(disk_budget, args.run_log)
     zip_results()
@@ -0,0 +1,172 @@
+"""Testes do pipeline do benchmark, com etapas falsas e sem GPU."""
+
+import threading
+
+from absl.testing import absltest
+
+import benchmark_runner
+
+# Tempo máximo de espera por uma etapa que deveria rodar em paralelo.
+_TIMEOUT = 5
+
+
+class FakeStages:
+    """Etapas falsas do pipeline que registram a ordem dos eventos.
+
+    A inferência do modelo i espera o download do modelo i+1 terminar e a avaliação
+    do modelo i-1 começar: se o pipeline rodar as etapas em sequência, a espera
+    expira e o evento não é registrado.
+    """
+
+    def __init__(self, models, failing=()):
+        self.models = models
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.events = []
+        self.prefetched = {model: threading.Event() for model in models}
+        self.evaluating = {model: threading.Event() for model in models}
+        self.cache = []
+
+    def record(self, *event):
+        with self.lock:
+            self.events.append(event)
+
+    def index(self, *event):
+        return self.events.index(event)
+
+    def next_model(self, model):
+        i = self.models.index(model)
+        return self.models[i + 1] if i + 1 < len(self.models) else None
+
+    def previous_model(self, model):
+        i = self.models.index(model)
+        return self.models[i - 1] if i > 0 else None
+
+    def prefetch(self, model):
+        self.record("prefetch", model)
+        self.cache.append(model)
+        self.prefetched[model].set()
+
+    def infer(self, model):
+        self.record("infer_start", model)
+        next_model = self.next_model(model)
+        if next_model is not None and self.prefetched[next_model].wait(_TIMEOUT):
+            self.record("prefetched_during_inference", next_model)
+        previous_model = self.previous_model(model)
+        if (previous_model is not None and previous_model not in self.failing
+                and self.evaluating[previous_model].wait(_TIMEOUT)):
+            self.record("evaluated_during_inference", previous_model)
+        self.record("infer_end", model)
+        return model not in self.failing
+
+    def evaluate(self, model):
+        self.record("evaluate_start", model)
+        self.evaluating[model].set()
+        self.record("evaluate_end", model)
+        return True
+
+    def evict(self, model):
+        self.record("evict", model)
+        if model in self.cache:
+            self.cache.remove(model)
+
+    def pipeline(self, **kwargs):
+        return benchmark_runner.BenchmarkPipeline(
+            self.models, prefetch=self.prefetch, infer=self.infer,
+            evaluate=self.evaluate, evict=self.evict, **kwargs)
+
+
+class BenchmarkPipelineTest(absltest.TestCase):
+
+    def test_stages_overlap(self):
+        models = ["a", "b", "c"]
+        stages = FakeStages(models)
+        results = stages.pipeline().run()
+
+        for model, next_model in zip(models, models[1:]):
+            # O modelo i+1 é baixado antes do fim da inferência do modelo i.
+            self.assertIn(("prefetched_during_inference", next_model), stages.events)
+            self.assertLess(stages.index("prefetch", next_model),
+                            stages.index("infer_end", model))
+            # A avaliação do modelo i roda durante a inferência do modelo i+1.
+            self.assertIn(("evaluated_during_inference", model), stages.events)
+            self.assertLess(stages.index("evaluate_start", model),
+                            stages.index("infer_end", next_model))
+        for model in models:
+            self.assertTrue(results[model]["inference"])
+            self.assertTrue(results[model]["evaluation"])
+
+    def test_evicts_after_each_inference(self):
+        models = ["a", "b", "c"]
+        stages = FakeStages(models)
+        stages.pipeline().run()
+
+        for model in models:
+            self.assertLess(stages.index("infer_end", model),
+                            stages.index("evict", model))
+        for model, next_model in zip(models, models[1:]):
+            self.assertLess(stages.index("evict", model),
+                            stages.index("infer_start", next_model))
+
+    def test_failed_inference_skips_evaluation(self):
+        models = ["a", "b", "c"]
+        stages = FakeStages(models, failing=["b"])
+        results = stages.pipeline().run()
+
+        self.assertFalse(results["b"]["inference"])
+        self.assertIsNone(results["b"]["evaluation"])
+        self.assertNotIn(("evaluate_start", "b"), stages.events)
+        self.assertIn(("evict", "b"), stages.events)
+        self.assertTrue(results["a"]["evaluation"])
+        self.assertTrue(results["c"]["evaluation"])
+
+
+class DiskBudgetTest(absltest.TestCase):
+
+    def pipeline(self, cache, sizes, disk_budget):
+        evicted = []
+
+        def evict(model):
+            evicted.append(model)
+            del cache[model]
+
+        pipeline = benchmark_runner.BenchmarkPipeline(
+            [], evict=evict, cache_size=lambda: sum(cache.values()),
+            model_size=sizes.get, cached_models=lambda: list(cache),
+            disk_budget=disk_budget)
+        return pipeline, evicted
+
+    def test_evicts_down_to_budget(self):
+        cache = {"old": 40, "older": 30, "current": 20}
+        pipeline, evicted = self.pipeline(cache, {"next": 40}, disk_budget=100)
+
+        self.assertTrue(pipeline.make_room("next", in_use=("current",)))
+        self.assertEqual(evicted, ["old"])
+
+    def test_never_evicts_models_in_use(self):
+        cache = {"current": 80}
+        pipeline, evicted = self.pipeline(cache, {"next": 40}, disk_budget=100)
+
+        self.assertFalse(pipeline.make_room("next", in_use=("current",)))
+        self.assertEqual(evicted, [])
+
+    def test_unknown_size_needs_an_empty_cache(self):
+        cache = {"old": 10}
+        pipeline, evicted = self.pipeline(cache, {}, disk_budget=100)
+        self.assertTrue(pipeline.make_room("api-model"))
+        self.assertEqual(evicted, ["old"])
+
+        cache = {"current": 10}
+        pipeline, _ = self.pipeline(cache, {}, disk_budget=100)
+        self.assertFalse(pipeline.make_room("api-model", in_use=("current",)))
+
+    def test_cached_model_fits(self):
+        cache = {"next": 90}
+        pipeline, evicted = self.pipeline(cache, {"next": 90}, disk_budget=100)
+
+        self.assertTrue(pipeline.make_room("next"))
+        self.assertEqual(evicted, [])
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -0,0 +1,270 @@
+"""Micro-benchmarks of the instruction checkers and the language utils.
+
+Replays real responses of `data/{lang}_input_response_data_*.jsonl` through the
+`count_words`, `count_sentences`, `split_into_sentences` and `tokenizing_texts`
+utils of each language and through the `check_following` of each instruction.
+Every benchmark runs on a short, a median and a very long response of the
+language, and reports the calls per second and the peak memory allocated by a
+call. The analysis caches of the utils and the memoized language labels are
+cleared before each call, so the benchmarks measure uncached calls.
+
+Runs offline on CPU. Save a baseline, then compare later runs to it:
+
+  python checker_benchmark.py --save_baseline=benchmark_baseline.json
+  python checker_benchmark.py --baseline=benchmark_baseline.json
+
+Benchmarks slower than the baseline by more than `--threshold` are flagged and
+make the binary exit with status 1. The `--data_dir` and `--languages` flags are
+those of `batch_evaluation`.
+"""
+
+import collections
+import functools
+import importlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from absl import app
+from absl import flags
+from absl import logging
+import langdetect
+
+import batch_evaluation
+import evaluation_main
+from instruction_utils import language_id
+import instructions_registry
+
+
+_FILTER = flags.DEFINE_string(
+    "filter", None, "Only runs the benchmarks whose name contains this."
+)
+
+_MIN_TIME = flags.DEFINE_float(
+    "min_time", 0.5, "Minimum duration of each benchmark in seconds."
+)
+
+_BASELINE = flags.DEFINE_string(
+    "baseline", None, "JSON file of a previous run to compare the results to."
+)
+
+_SAVE_BASELINE = flags.DEFINE_string(
+    "save_baseline", None, "JSON file to save the results of this run to."
+)
+
+_THRESHOLD = flags.DEFINE_float(
+    "threshold",
+    0.2,
+    "Relative drop of the calls per second compared to the baseline above "
+    "which a benchmark is flagged as slower.",
+)
+
+_UTIL_FUNCTIONS = (
+    "count_words", "count_sentences", "split_into_sentences",
+    "tokenizing_texts",
+)
+
+# Quantiles of the response lengths of a language that are benchmarked.
+_SIZES = {"short": 0.1, "median": 0.5, "long": 1.0}
+
+# Number of timed rounds of a benchmark, the fastest one is reported.
+_ROUNDS = 5
+
+
+def sample_responses(data_dir, language):
+  """Returns the short, median and long responses of `language` by size."""
+  responses = set()
+  for response_file in batch_evaluation.discover_response_files(
+      data_dir, [language]):
+    with open(response_file.path, encoding="utf-8") as f:
+      for line in f:
+        response = json.loads(line).get("response")
+        if isinstance(response, str) and response.strip():
+          responses.add(response)
+  if not responses:
+    return {}
+  # Sorted by length and then by text, so that the samples are stable.
+  responses = sorted(responses, key=lambda r: (len(r), r))
+  return {size: responses[round(quantile * (len(responses) - 1))]
+          for size, quantile in _SIZES.items()}
+
+
+def _cache_clearer(*modules):
+  """Returns a function clearing the analysis caches of modules.
+
+  The bounded `functools.lru_cache`s and the `*_cache` dictionaries of the
+  modules hold analyses of texts, while the unbounded `lru_cache`s hold the
+  loaded NLP models and are kept.
+  """
+  caches = [
+      value for module in modules for name, value in vars(module).items()
+      if (hasattr(value, "cache_info") and value.cache_info().maxsize)
+      or (name.endswith("_cache") and isinstance(value, dict))
+  ]
+  clear_preanalyzed = [module.clear_preanalyzed for module in modules
+                       if hasattr(module, "clear_preanalyzed")]
+
+  def clear():
+    for cache in caches:
+      if isinstance(cache, dict):
+        cache.clear()
+      else:
+        cache.cache_clear()
+    for clear_module in clear_preanalyzed:
+      clear_module()
+
+  return clear
+
+
+def build_checkers(data_dir, language):
+  """Returns the checkers of `language`, with arguments of the input data."""
+  examples = {}
+  path = batch_evaluation.input_data_path(data_dir, language)
+  if path is not None:
+    for inp in evaluation_main.read_prompt_list(path):
+      for index, instruction_id in enumerate(inp.instruction_id_list):
+        examples.setdefault(instruction_id, (inp.key, inp.kwargs[index],
+                                             inp.prompt))
+  checkers = {}
+  for short_id in instructions_registry.get_language_instruction_dict(
+      language):
+    instruction_id = f"{language}:{short_id}"
+    key, kwargs, prompt = examples.get(instruction_id, (0, {}, ""))
+    random.seed(key)
+    try:
+      checkers[instruction_id] = evaluation_main.build_instruction(
+          instruction_id, kwargs, prompt)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.warning("Skipping %s: %s", instruction_id, e)
+  return checkers
+
+
+def benchmarks(data_dir, languages):
+  """Yields the `(name, function, text, clear_caches)` of every benchmark."""
+  for language in languages:
+    samples = sample_responses(data_dir, language)
+    if not samples:
+      logging.warning("No responses for %s, skipping it", language)
+      continue
+    util = evaluation_main._get_language_util(language)  # pylint: disable=protected-access
+    clear = _cache_clearer(
+        util, importlib.import_module(f"instructions.{language}_instructions"),
+        language_id)
+    functions = [(f"{language}:util:{name}", getattr(util, name))
+                 for name in _UTIL_FUNCTIONS if hasattr(util, name)]
+    functions += [(f"{instruction_id}:check_following",
+                   checker.check_following)
+                  for instruction_id, checker in sorted(
+                      build_checkers(data_dir, language).items())]
+    for name, function in functions:
+      for size, text in samples.items():
+        yield f"{name}:{size}", function, text, clear
+
+
+def _call(function, text, clear):
+  clear()
+  return function(text)
+
+
+def measure(function, text, clear, min_time):
+  """Returns the calls per second and peak allocated KiB of `function(text)`."""
+  call = functools.partial(_call, function, text, clear)
+  call()
+  round_time = min_time / _ROUNDS
+  best_ops_per_sec = 0.0
+  for _ in range(_ROUNDS):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+      call()
+      calls += 1
+      elapsed = time.perf_counter() - start
+      if elapsed >= round_time:
+        break
+    best_ops_per_sec = max(best_ops_per_sec, calls / elapsed)
+
+  clear()
+  tracemalloc.start()
+  try:
+    function(text)
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return best_ops_per_sec, peak / 1024
+
+
+def compare(results, baseline, threshold):
+  """Returns the benchmark names slower than `baseline` by over `threshold`."""
+  slower = []
+  for name, result in results.items():
+    if name not in baseline:
+      continue
+    ratio = result["ops_per_sec"] / baseline[name]["ops_per_sec"]
+    result["baseline_ratio"] = ratio
+    if ratio < 1 - threshold:
+      slower.append(name)
+  return slower
+
+
+def print_results(results, slower=()):
+  print("benchmark chars ops_per_sec peak_alloc_kb baseline_ratio")
+  for name, result in results.items():
+    ratio = result.get("baseline_ratio")
+    print(f"{name} {result['chars']} {result['ops_per_sec']:.1f} "
+          f"{result['peak_alloc_kb']:.1f} "
+          + (f"{ratio:.2f}" if ratio is not None else "-")
+          + (" SLOWER" if name in slower else ""))
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError("Too many command-line arguments.")
+
+  langdetect.DetectorFactory.seed = 0
+  data_dir = flags.FLAGS.data_dir
+  languages = flags.FLAGS.languages or sorted({
+      response_file.language for response_file in
+      batch_evaluation.discover_response_files(data_dir)})
+  # Loads the NLP models before timing anything.
+  evaluation_main._warm_up(languages)  # pylint: disable=protected-access
+
+  results = collections.OrderedDict()
+  for name, function, text, clear in benchmarks(data_dir, languages):
+    if _FILTER.value and _FILTER.value not in name:
+      continue
+    ops_per_sec, peak_alloc_kb = measure(function, text, clear,
+                                         _MIN_TIME.value)
+    results[name] = {"chars": len(text), "ops_per_sec": ops_per_sec,
+                     "peak_alloc_kb": peak_alloc_kb}
+    logging.info("%s: %.1f ops/sec", name, ops_per_sec)
+
+  slower = []
+  if _BASELINE.value:
+    with open(_BASELINE.value) as f:
+      baseline = json.load(f)["benchmarks"]
+    slower = compare(results, baseline, _THRESHOLD.value)
+  print_results(results, slower)
+
+  if _SAVE_BASELINE.value:
+    benchmark_results = {
+        name: {field: value for field, value in result.items()
+               if field != "baseline_ratio"}
+        for name, result in results.items()}
+    with open(_SAVE_BASELINE.value, "w") as f:
+      json.dump({"python": sys.version.split()[0],
+                 "platform": platform.platform(),
+                 "benchmarks": benchmark_results}, f, indent=2)
+    logging.info("Generated: %s", _SAVE_BASELINE.value)
+
+  if slower:
+    print(f"{len(slower)} benchmarks slower than the baseline by more than "
+          f"{_THRESHOLD.value:.0%}.")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -0,0 +1,145 @@
+"""Per-call profiling of the instruction checkers.
+
+`CheckerProfiler` times every `build_description` and `check_following` call by
+instruction id and phase, and can also collect a cProfile profile of each
+checker. Phases are "build" for `build_description`, "strict" for the check of
+the response and "loose" for the checks of its loose variants.
+"""
+
+import collections
+import cProfile
+import json
+import math
+import os
+import pstats
+import time
+
+PHASES = ("build", "strict", "loose")
+
+
+def percentile(sorted_values, q):
+  """Returns the nearest-rank `q` percentile of non-empty `sorted_values`."""
+  rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+  return sorted_values[rank - 1]
+
+
+class _RawStats:
+  """Stats of a `cProfile.Profile`, in the form `pstats.Stats` loads."""
+
+  def __init__(self, stats):
+    self.stats = stats
+
+  def create_stats(self):
+    pass
+
+
+class CheckerProfiler:
+  """Collects the duration of each call to the checkers."""
+
+  def __init__(self, cprofile=False):
+    # Durations in seconds by `(instruction_id, phase)`.
+    self.samples = collections.defaultdict(list)
+    self.cprofile = cprofile
+    self._profiles = {}
+    # Stats of finished profiles by instruction id, see `pop`.
+    self._stats = collections.defaultdict(list)
+
+  def call(self, instruction_id, phase, method, *args, **kwargs):
+    """Returns `method(*args, **kwargs)`, timing it.
+
+    A call that raises is not timed, e.g. a check that `preanalyze_responses`
+    of `evaluation_main` stops to analyze its text first.
+    """
+    profile = None
+    if self.cprofile:
+      profile = self._profiles.get(instruction_id)
+      if profile is None:
+        profile = self._profiles[instruction_id] = cProfile.Profile()
+      profile.enable()
+    start = time.perf_counter()
+    try:
+      result = method(*args, **kwargs)
+    finally:
+      elapsed = time.perf_counter() - start
+      if profile is not None:
+        profile.disable()
+    self.samples[(instruction_id, phase)].append(elapsed)
+    return result
+
+  def pop(self):
+    """Returns the collected samples and cProfile stats and resets them."""
+    for instruction_id, profile in self._profiles.items():
+      profile.create_stats()
+      self._stats[instruction_id].append(profile.stats)
+    popped = (dict(self.samples), dict(self._stats))
+    self.samples.clear()
+    self._profiles.clear()
+    self._stats.clear()
+    return popped
+
+  def update(self, popped):
+    """Adds the result of `pop` of another profiler, e.g. of a worker."""
+    samples, stats = popped
+    for key, durations in samples.items():
+      self.samples[key].extend(durations)
+    for instruction_id, instruction_stats in stats.items():
+      self._stats[instruction_id].extend(instruction_stats)
+
+  def rows(self):
+    """Returns the statistics of each instruction id and phase.
+
+    Returns:
+      A list of dictionaries with the `instruction_id`, `language`, `phase`,
+      `calls` and the `total`, `mean`, `p95` and `p99` durations in seconds,
+      sorted by decreasing total duration.
+    """
+    rows = []
+    for (instruction_id, phase), durations in self.samples.items():
+      durations = sorted(durations)
+      total = math.fsum(durations)
+      rows.append({
+          "instruction_id": instruction_id,
+          "language": instruction_id.split(":")[0],
+          "phase": phase,
+          "calls": len(durations),
+          "total": total,
+          "mean": total / len(durations),
+          "p95": percentile(durations, 95),
+          "p99": percentile(durations, 99),
+      })
+    rows.sort(key=lambda row: -row["total"])
+    return rows
+
+  def print_table(self, limit=None):
+    """Prints the statistics of `rows`, the slowest checkers first."""
+    rows = self.rows()
+    grand_total = math.fsum(row["total"] for row in rows)
+    print("=" * 64)
+    print("Checker profile:")
+    print("instruction_id phase calls total_s share mean_ms p95_ms p99_ms")
+    for row in rows[:limit]:
+      share = row["total"] / grand_total if grand_total else 0
+      print(f"{row['instruction_id']} {row['phase']} {row['calls']} "
+            f"{row['total']:.3f} {share:.1%} {row['mean'] * 1000:.3f} "
+            f"{row['p95'] * 1000:.3f} {row['p99'] * 1000:.3f}")
+    by_language = collections.defaultdict(float)
+    for row in rows:
+      by_language[row["language"]] += row["total"]
+    print("language total_s")
+    for language, total in sorted(by_language.items(),
+                                  key=lambda item: -item[1]):
+      print(f"{language} {total:.3f}")
+
+  def write_json(self, path):
+    """Writes `rows` to a JSON file."""
+    with open(path, "w") as f:
+      json.dump(self.rows(), f, indent=2)
+
+  def dump_stats(self, directory):
+    """Writes the cProfile stats of each checker to `{instruction_id}.pstats`."""
+    self.update(self.pop())
+    os.makedirs(directory, exist_ok=True)
+    for instruction_id, instruction_stats in self._stats.items():
+      stats = pstats.Stats(*(_RawStats(s) for s in instruction_stats))
+      stats.dump_stats(os.path.join(
+          directory, instruction_id.replace(":", "-") + ".pstats"))
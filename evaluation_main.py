@@ -16,20 +16,34 @@
 """Binary of evaluating instruction following. See README.md."""
 
 import collections
+import contextlib
 import dataclasses
+import functools
+import importlib
+import itertools
 import json
+import multiprocessing
 import os
+import random
+import time
 from typing import Dict, Optional, Sequence, Union
 
 from absl import app
 from absl import flags
 from absl import logging
+import langdetect
 
+import checker_profiler
 import instructions_registry
+import metrics
+import response_corpus
+import response_index
+import result_cache
+import results_store
 
 
 _INPUT_DATA = flags.DEFINE_string(
-    "input_data", None, "path to input data", required=True
+    "input_data", None, "path to input data"
 )
 
 _INPUT_RESPONSE_DATA = flags.DEFINE_string(
@@ -40,9 +54,177 @@ _OUTPUT_DIR = flags.DEFINE_string(
     "output_dir",
     None,
     "Output directory for inference and eval results.",
-    required=True,
 )
 
+_WORKERS = flags.DEFINE_integer(
+    "workers",
+    1,
+    "Number of worker processes used to check the instructions. With 1 the "
+    "prompts are evaluated serially in the main process.",
+)
+
+_SPACY_BATCH_SIZE = flags.DEFINE_integer(
+    "spacy_batch_size",
+    64,
+    "Batch size of the spaCy pre-analysis of the es and pt responses. "
+    "0 disables the pre-analysis.",
+)
+
+_SPACY_N_PROCESS = flags.DEFINE_integer(
+    "spacy_n_process", 1, "Number of processes of the spaCy pre-analysis."
+)
+
+_STREAM = flags.DEFINE_bool(
+    "stream",
+    False,
+    "Reads, evaluates and writes the prompts one at a time instead of loading "
+    "the input and response files into memory. Skips the spaCy "
+    "pre-analysis.",
+)
+
+_RESULT_CACHE = flags.DEFINE_string(
+    "result_cache",
+    None,
+    "Path of a SQLite file caching the checker results across runs. Only "
+    "the results of new responses and of changed checkers are recomputed.",
+)
+
+_RUN_LOG = flags.DEFINE_string(
+    "run_log",
+    None,
+    "Path of a JSONL run log to append the duration of each stage, the time "
+    "spent in each checker and the result cache hit rate to. See metrics.py.",
+)
+
+_PROFILE = flags.DEFINE_bool(
+    "profile",
+    False,
+    "Times every `build_description` and `check_following` call and prints "
+    "the total, mean, p95 and p99 time of each instruction id in the strict "
+    "and loose passes. The table is also written to `profile.json` in the "
+    "output directory.",
+)
+
+_PROFILE_DIR = flags.DEFINE_string(
+    "profile_dir",
+    None,
+    "With --profile, directory to write a cProfile `.pstats` file per "
+    "instruction id to.",
+)
+
+_RESULTS_FORMAT = flags.DEFINE_enum(
+    "results_format",
+    "jsonl",
+    ["jsonl", "columnar", "both"],
+    "Format of the results: the `eval_results_*.jsonl` files, the compact "
+    "`results/` store of `results_store.py`, which can be exported to the "
+    "JSONL files later, or both.",
+)
+
+_FAST_SCORE = flags.DEFINE_enum(
+    "fast_score",
+    None,
+    ["strict", "loose", "both"],
+    "Only scores whether each prompt follows all its instructions, in strict "
+    "mode, loose mode or both, for quick comparisons of models. The checks of "
+    "a prompt run cheapest first, see --checker_costs, and stop at the first "
+    "failure. Writes the prompt-level accuracies to `fast_scores.json` "
+    "instead of the per-instruction results, and skips the spaCy "
+    "pre-analysis and the result cache.",
+)
+
+_CHECKER_COSTS = flags.DEFINE_string(
+    "checker_costs",
+    None,
+    "The `profile.json` of a --profile run, whose mean check time of each "
+    "instruction id orders the checks of --fast_score. Without it, the "
+    "checkers backed by spaCy run last.",
+)
+
+# Number of prompts handed to the worker pool at a time in streaming mode.
+_STREAM_CHUNK_SIZE = 256
+
+# Instructions whose checkers analyze the response with spaCy, by language.
+_SPACY_INSTRUCTIONS = {
+    "es": (
+        "es:length_constraints:number_words",
+        "es:length_constraints:number_sentences",
+        "es:change_case:capital_word_frequency",
+        "es:special_character:enie",
+        "es:special_character:dieresis",
+        "es:special_character:tildes",
+    ),
+    "pt": (
+        "pt:length_constraints:number_words",
+        "pt:length_constraints:number_sentences",
+    ),
+}
+
+
+@dataclasses.dataclass
+class EvaluationContext:
+  """The optional collaborators of an evaluation, handed to its workers.
+
+  Attributes:
+    result_cache: The `result_cache.ResultCache` consulted by
+      `evaluate_response`, if any.
+    checker_timer: The `metrics.CheckerTimer` timing the checks of
+      `evaluate_response` and `fast_score_response`, if any.
+    profiler: The `checker_profiler.CheckerProfiler` timing every checker
+      call, if any.
+    checker_costs: The estimated seconds per check of each instruction id
+      ordering the checks of `fast_score_response`, if any.
+    outcomes: The strict and loose results of the checks run ahead by
+      `preanalyze_responses`, by `_outcome_key`.
+    jobs: The `(inputs, ResponseCorpus)` jobs of a worker of
+      `iter_corpus_evaluations`.
+  """
+  # A string, as the field shadows the module in the class body.
+  result_cache: Optional["result_cache.ResultCache"] = None
+  checker_timer: Optional[metrics.CheckerTimer] = None
+  profiler: Optional[checker_profiler.CheckerProfiler] = None
+  checker_costs: Optional[Dict[str, float]] = None
+  outcomes: Dict[tuple, tuple[bool, bool]] = dataclasses.field(
+      default_factory=dict)
+  jobs: Optional[list] = None
+
+  @classmethod
+  def from_flags(cls, time_checkers=False):
+    """Returns the context set up by `--result_cache`, `--profile`, etc.
+
+    Args:
+      time_checkers: Whether to time the checks, for the run log.
+    """
+    context = cls()
+    if _RESULT_CACHE.value:
+      context.result_cache = result_cache.ResultCache(_RESULT_CACHE.value)
+    if time_checkers:
+      context.checker_timer = metrics.CheckerTimer()
+    if _PROFILE.value:
+      context.profiler = checker_profiler.CheckerProfiler(
+          cprofile=bool(_PROFILE_DIR.value))
+    if _CHECKER_COSTS.value:
+      context.checker_costs = load_checker_costs(_CHECKER_COSTS.value)
+    return context
+
+  def for_worker(self, jobs=None):
+    """Returns the context of a worker process, with its own collectors.
+
+    The result cache is shared, and the checker times and profile that the
+    worker collects are merged back by `iter_evaluations`.
+    """
+    return dataclasses.replace(
+        self,
+        checker_timer=(metrics.CheckerTimer()
+                       if self.checker_timer is not None else None),
+        profiler=(checker_profiler.CheckerProfiler(self.profiler.cprofile)
+                  if self.profiler is not None else None),
+        jobs=jobs)
+
+
+# The `EvaluationContext` of a worker process, set by `_init_worker`.
+_worker_context = None
+
 
 @dataclasses.dataclass
 class InputExample:
@@ -61,18 +243,32 @@ class OutputExample:
   follow_instruction_list: list[bool]
 
 
-def read_prompt_list(input_jsonl_filename):
-  """Read inputs from jsonl."""
-  inputs = []
+def iter_prompt_list(input_jsonl_filename):
+  """Yields the inputs of a jsonl file one at a time."""
   with open(input_jsonl_filename, "r", encoding='utf-8') as f:
     for l in f:
       example = json.loads(l)
-      inputs.append(
-          InputExample(key=example["key"],
-                       instruction_id_list=example["instruction_id_list"],
-                       prompt=example["prompt"],
-                       kwargs=example["kwargs"]))
-  return inputs
+      yield InputExample(key=example["key"],
+                         instruction_id_list=example["instruction_id_list"],
+                         prompt=example["prompt"],
+                         kwargs=example["kwargs"])
+
+
+def read_prompt_list(input_jsonl_filename):
+  """Read inputs from jsonl."""
+  return list(iter_prompt_list(input_jsonl_filename))
+
+
+# `OutputExample` fields in the order they are written, which is the sorted
+# order the former `dir()` based serialization produced.
+_OUTPUT_FIELDS = sorted(
+    field.name for field in dataclasses.fields(OutputExample))
+
+
+def write_output(f, output):
+  """Writes one output as a jsonl line to the open file `f`."""
+  f.write(json.dumps({name: getattr(output, name) for name in _OUTPUT_FIELDS}))
+  f.write("\n")
 
 
 def write_outputs(output_jsonl_filename, outputs):
@@ -86,42 +282,130 @@ def write_outputs(output_jsonl_filename, outputs):
   
   with open(output_jsonl_filename, "w") as f:
     for o in outputs:
-      f.write(
-          json.dumps(
-              {
-                  attr_name: o.__getattribute__(attr_name)
-                  for attr_name in [
-                      name for name in dir(o) if not name.startswith("_")
-                  ]
-              }
-          )
-      )
-      f.write("\n")
+      write_output(f, o)
 
 
-def test_instruction_following_strict(
-    inp,
-    prompt_to_response,
-):
-  """Tests response to see if instrutions are followed."""
-  response = prompt_to_response[inp.prompt]
-  instruction_list = inp.instruction_id_list
-  is_following_list = []
+def build_instruction(instruction_id, kwargs, prompt, profiler=None):
+  """Builds the checker of `instruction_id` with its arguments.
+
+  Args:
+    instruction_id: The instruction id.
+    kwargs: The arguments of the instruction.
+    prompt: The prompt, for the checkers that take it.
+    profiler: The `checker_profiler.CheckerProfiler` timing the build, if any.
+  """
+  instruction_cls = instructions_registry.INSTRUCTION_DICT[instruction_id]
+  instruction = instruction_cls(instruction_id)
+
+  _call(profiler, instruction, "build", instruction.build_description,
+        **kwargs)
+  args = instruction.get_instruction_args()
+  if args and "prompt" in args:
+    _call(profiler, instruction, "build", instruction.build_description,
+          prompt=prompt)
+  return instruction
 
-  for index, instruction_id in enumerate(instruction_list):
-    instruction_cls = instructions_registry.INSTRUCTION_DICT[instruction_id]
-    instruction = instruction_cls(instruction_id)
 
-    instruction.build_description(**inp.kwargs[index])
+class InstructionPool:
+  """Reuses the checkers built with the same arguments.
+
+  Building a checker only depends on its instruction id, its arguments and,
+  for the checkers that take it, the prompt, so many prompts and every response
+  to them share a checker. A checker whose build draws arguments at random
+  depends on the random state too and is rebuilt every time, which also keeps
+  the random state of the other checkers of the prompt as it was.
+  """
+
+  def __init__(self):
+    self._instructions = {}
+    # Whether the checkers of an instruction id depend on the prompt.
+    self._uses_prompt = {}
+    self.hits = 0
+    self.misses = 0
+
+  def _key(self, instruction_id, frozen_kwargs, prompt):
+    return (instruction_id, frozen_kwargs,
+            prompt if self._uses_prompt[instruction_id] else None)
+
+  def get(self, instruction_id, kwargs, prompt, profiler=None):
+    """Returns the checker of `build_instruction`, building it if needed."""
+    frozen_kwargs = json.dumps(kwargs, sort_keys=True, ensure_ascii=False)
+    if instruction_id in self._uses_prompt:
+      instruction = self._instructions.get(
+          self._key(instruction_id, frozen_kwargs, prompt))
+      if instruction is not None:
+        self.hits += 1
+        return instruction
+    self.misses += 1
+    state = random.getstate()
+    instruction = build_instruction(instruction_id, kwargs, prompt, profiler)
     args = instruction.get_instruction_args()
-    if args and "prompt" in args:
-      instruction.build_description(prompt=inp.prompt)
+    self._uses_prompt[instruction_id] = bool(args) and "prompt" in args
+    if random.getstate() == state:
+      self._instructions[self._key(instruction_id, frozen_kwargs,
+                                   prompt)] = instruction
+    return instruction
 
-    if isinstance(response, str) and response.strip() and instruction.check_following(response):
-      is_following_list.append(True)
-    else:
-      is_following_list.append(False)
 
+# The checkers built by the evaluation functions, shared by all the inputs.
+_instruction_pool = InstructionPool()
+
+
+def get_instruction(instruction_id, kwargs, prompt, context=None):
+  """Returns the checker of `instruction_id` from the instruction pool."""
+  return _instruction_pool.get(instruction_id, kwargs, prompt,
+                               context.profiler if context else None)
+
+
+def _call(profiler, instruction, phase, method, *args, **kwargs):
+  """Calls a method of `instruction`, through `profiler` if there is one."""
+  if profiler is None:
+    return method(*args, **kwargs)
+  return profiler.call(instruction.id, phase, method, *args, **kwargs)
+
+
+def loose_response_variants(response):
+  """Returns the variants of `response` tried by the loose evaluation.
+
+  The first variant is always the response itself.
+  """
+  if not isinstance(response, str):
+    return []
+  r = response.split("\n")
+  response_remove_first = "\n".join(r[1:]).strip()
+  response_remove_last = "\n".join(r[:-1]).strip()
+  response_remove_both = "\n".join(r[1:-1]).strip()
+  revised_response = response.replace("*", "")
+  revised_response_remove_first = response_remove_first.replace("*", "")
+  revised_response_remove_last = response_remove_last.replace("*", "")
+  revised_response_remove_both = response_remove_both.replace("*", "")
+  return [
+    response,
+    revised_response,
+    response_remove_first,
+    response_remove_last,
+    response_remove_both,
+    revised_response_remove_first,
+    revised_response_remove_last,
+    revised_response_remove_both,
+  ]
+
+
+def _is_following_strict(instruction, response, profiler=None):
+  return bool(isinstance(response, str) and response.strip()
+              and _call(profiler, instruction, "strict",
+                        instruction.check_following, response))
+
+
+def _is_following_loose(instruction, all_responses, profiler=None):
+  for r in all_responses:
+    if r.strip() and _call(profiler, instruction, "loose",
+                           instruction.check_following, r):
+      return True
+  return False
+
+
+def _make_output(inp, response, is_following_list):
   return OutputExample(
       instruction_id_list=inp.instruction_id_list,
       prompt=inp.prompt,
@@ -131,62 +415,268 @@ def test_instruction_following_strict(
   )
 
 
+def test_instruction_following_strict(
+    inp,
+    prompt_to_response,
+    context=None,
+):
+  """Tests response to see if instrutions are followed."""
+  response = prompt_to_response[inp.prompt]
+  profiler = context.profiler if context else None
+  is_following_list = []
+
+  for index, instruction_id in enumerate(inp.instruction_id_list):
+    instruction = get_instruction(
+        instruction_id, inp.kwargs[index], inp.prompt, context)
+    is_following_list.append(
+        _is_following_strict(instruction, response, profiler))
+
+  return _make_output(inp, response, is_following_list)
+
+
 def test_instruction_following_loose(
     inp,
     prompt_to_response,
+    context=None,
 ):
   """Tests response for an upper bound for following instructions."""
   response = prompt_to_response[inp.prompt]
-  if isinstance(response, str):
-    r = response.split("\n")
-    response_remove_first = "\n".join(r[1:]).strip()
-    response_remove_last = "\n".join(r[:-1]).strip()
-    response_remove_both = "\n".join(r[1:-1]).strip()
-    revised_response = response.replace("*", "")
-    revised_response_quotation = response.replace('\"', '')
-    revised_response_remove_first = response_remove_first.replace("*", "")
-    revised_response_remove_last = response_remove_last.replace("*", "")
-    revised_response_remove_both = response_remove_both.replace("*", "")
-    all_responses = [
-      response,
-      revised_response,
-      response_remove_first,
-      response_remove_last,
-      response_remove_both,
-      revised_response_remove_first,
-      revised_response_remove_last,
-      revised_response_remove_both,
-    ]
-  else:
-    all_responses=[]
-    
-  instruction_list = inp.instruction_id_list
+  profiler = context.profiler if context else None
+  all_responses = loose_response_variants(response)
   is_following_list = []
 
-  for index, instruction_id in enumerate(instruction_list):
-    instruction_cls = instructions_registry.INSTRUCTION_DICT[instruction_id]
-    instruction = instruction_cls(instruction_id)
+  for index, instruction_id in enumerate(inp.instruction_id_list):
+    instruction = get_instruction(
+        instruction_id, inp.kwargs[index], inp.prompt, context)
+    is_following_list.append(
+        _is_following_loose(instruction, all_responses, profiler))
 
-    instruction.build_description(**inp.kwargs[index])
-    args = instruction.get_instruction_args()
-    if args and "prompt" in args:
-      instruction.build_description(prompt=inp.prompt)
+  return _make_output(inp, response, is_following_list)
 
-    is_following = False
-    for r in all_responses:
-      if r.strip() and instruction.check_following(r):
-        is_following = True
-        break
 
-    is_following_list.append(is_following)
+def _build_instructions(inp, context=None):
+  return [
+      get_instruction(instruction_id, inp.kwargs[index], inp.prompt, context)
+      for index, instruction_id in enumerate(inp.instruction_id_list)
+  ]
+
+
+def _is_spacy_instruction(instruction_id):
+  return instruction_id in _SPACY_INSTRUCTIONS.get(
+      instruction_id.split(":")[0], ())
+
+
+def _outcome_key(instruction, kwargs, response):
+  """Returns the key of the results of a check in `EvaluationContext`."""
+  return (instruction.id, result_cache.canonical_kwargs(kwargs),
+          result_cache.canonical_kwargs(instruction.get_instruction_args()),
+          response)
+
+
+def _cache_keys(inp, instructions, response, cache):
+  """Returns the `cache` keys of each instruction, or None."""
+  if cache is None or not isinstance(response, str):
+    return None
+  return [
+      cache.keys(instruction, inp.kwargs[index], response)
+      for index, instruction in enumerate(instructions)
+  ]
+
+
+def evaluate_response(inp, response, context=None):
+  """Tests `response` in both strict and loose mode in a single pass.
+
+  Every instruction is taken from the instruction pool and the loose variants of the response are
+  computed once. The loose variants are only tried for instructions that are
+  not already followed by the unmodified response. Results found in the
+  result cache, or run ahead by `preanalyze_responses`, are not recomputed.
+
+  Args:
+    inp: An `InputExample`.
+    response: The response to `inp.prompt`.
+    context: The `EvaluationContext`, if any.
+
+  Returns:
+    A tuple of the strict and the loose `OutputExample`.
+  """
+  context = context or EvaluationContext()
+  profiler = context.profiler
+  all_responses = loose_response_variants(response)
+  instructions = _build_instructions(inp, context)
+  keys = _cache_keys(inp, instructions, response, context.result_cache)
+  cached = {}
+  if keys:
+    cached = context.result_cache.get_many(
+        key for instruction_keys in keys for key in instruction_keys.values())
+  new_results = {}
+  strict_list = []
+  loose_list = []
+
+  for index, instruction in enumerate(instructions):
+    if keys and all(key in cached for key in keys[index].values()):
+      strict_list.append(cached[keys[index][result_cache.STRICT]])
+      loose_list.append(cached[keys[index][result_cache.LOOSE]])
+      continue
+    outcome = None
+    if context.outcomes and _is_spacy_instruction(instruction.id):
+      outcome = context.outcomes.get(
+          _outcome_key(instruction, inp.kwargs[index], response))
+    if outcome is not None:
+      strict_list.append(outcome[0])
+      loose_list.append(outcome[1])
+    else:
+      start = time.perf_counter()
+      is_following = _is_following_strict(instruction, response, profiler)
+      strict_list.append(is_following)
+      # The first loose variant is the response itself.
+      loose_list.append(is_following or _is_following_loose(
+          instruction, all_responses[1:], profiler))
+      if context.checker_timer is not None:
+        context.checker_timer.add(inp.instruction_id_list[index],
+                                  time.perf_counter() - start)
+    if keys:
+      new_results[keys[index][result_cache.STRICT]] = strict_list[-1]
+      new_results[keys[index][result_cache.LOOSE]] = loose_list[-1]
+
+  if new_results:
+    context.result_cache.put_many(new_results)
+  return (_make_output(inp, response, strict_list),
+          _make_output(inp, response, loose_list))
+
+
+def load_checker_costs(profile_json_filename):
+  """Returns the mean seconds per check of each instruction id of a profile.
+
+  Args:
+    profile_json_filename: The `profile.json` written by `report_profile`.
+
+  Returns:
+    A dictionary mapping instruction ids to the mean duration of their strict
+    check, or of their loose checks for the ids without strict checks.
+  """
+  with open(profile_json_filename) as f:
+    rows = json.load(f)
+  costs = {}
+  for phase in ("loose", "strict"):
+    for row in rows:
+      if row["phase"] == phase:
+        costs[row["instruction_id"]] = row["mean"]
+  return costs
+
+
+def _checker_cost(instruction_id, checker_costs=None):
+  if checker_costs is not None:
+    # Checkers missing from the profile run last.
+    return checker_costs.get(instruction_id, float("inf"))
+  language = instruction_id.split(":")[0]
+  return int(instruction_id in _SPACY_INSTRUCTIONS.get(language, ()))
 
-  return OutputExample(
-      instruction_id_list=inp.instruction_id_list,
-      prompt=inp.prompt,
-      response=response,
-      follow_all_instructions=all(is_following_list),
-      follow_instruction_list=is_following_list,
-  )
+
+def fast_score_response(inp, response, variants=("strict", "loose"),
+                        context=None):
+  """Returns whether `response` follows all the instructions of `inp`.
+
+  The instructions are checked cheapest first, see `_checker_cost`, until
+  one is not followed in any of `variants`: an instruction not followed in
+  loose mode is not followed in strict mode either. The loose variants of a
+  response are only tried until one follows the instruction.
+
+  Args:
+    inp: An `InputExample`.
+    response: The response to `inp.prompt`.
+    variants: "strict", "loose" or both.
+    context: The `EvaluationContext`, if any.
+
+  Returns:
+    A dictionary mapping each of `variants` to whether `response` follows all
+    the instructions in that mode.
+  """
+  context = context or EvaluationContext()
+  profiler = context.profiler
+  # Built in the order of the prompt, so that arguments drawn at random are
+  # the same as in the other evaluations.
+  instructions = _build_instructions(inp, context)
+  order = sorted(range(len(instructions)),
+                 key=lambda i: _checker_cost(inp.instruction_id_list[i],
+                                             context.checker_costs))
+  follow_all = {variant: True for variant in variants}
+  all_responses = None
+  for index in order:
+    if not any(follow_all.values()):
+      break
+    start = time.perf_counter()
+    instruction = instructions[index]
+    if not _is_following_strict(instruction, response, profiler):
+      if "strict" in follow_all:
+        follow_all["strict"] = False
+      if follow_all.get("loose"):
+        if all_responses is None:
+          all_responses = loose_response_variants(response)
+        # The first loose variant is the response itself.
+        follow_all["loose"] = _is_following_loose(
+            instruction, all_responses[1:], profiler)
+    if context.checker_timer is not None:
+      context.checker_timer.add(inp.instruction_id_list[index],
+                                time.perf_counter() - start)
+  return follow_all
+
+
+def test_instruction_following_fast(inp, prompt_to_response,
+                                    variants=("strict", "loose"),
+                                    context=None):
+  """Tests whether all instructions are followed, see `fast_score_response`."""
+  return fast_score_response(inp, prompt_to_response[inp.prompt], variants,
+                             context)
+
+
+def fast_score_variants(fast_score):
+  """Returns the variants scored by a `--fast_score` value."""
+  return results_store.VARIANTS if fast_score == "both" else (fast_score,)
+
+
+def fast_score_summary(scores, variants):
+  """Returns the prompt-level accuracy of each variant of the fast scores."""
+  return {variant: {"prompt_level": sum(score[variant] for score in scores)
+                                    / max(1, len(scores))}
+          for variant in variants}
+
+
+def fast_score_evaluation(input_jsonl_filename, response_jsonl_filename,
+                          variants=("strict", "loose"), workers=1,
+                          context=None):
+  """Returns the `fast_score_summary` of a response file.
+
+  The input and response files are read lazily, as in `stream_evaluation`.
+  """
+  index = response_index.ResponseIndex(response_jsonl_filename)
+  try:
+    index.log_duplicates()
+    pairs = index.iter_pairs(iter_prompt_list(input_jsonl_filename))
+    func = functools.partial(test_instruction_following_fast,
+                             variants=variants)
+    scores = list(iter_evaluations(func, pairs, workers=workers,
+                                   context=context))
+  finally:
+    index.close()
+  return fast_score_summary(scores, variants)
+
+
+def write_fast_scores(output_dir, summary):
+  """Writes the result of `fast_score_summary` to `fast_scores.json`."""
+  os.makedirs(output_dir, exist_ok=True)
+  output_file_name = os.path.join(output_dir, "fast_scores.json")
+  with open(output_file_name, "w") as f:
+    json.dump(summary, f, indent=2)
+  return output_file_name
+
+
+def test_instruction_following_all(
+    inp,
+    prompt_to_response,
+    context=None,
+):
+  """Tests response in both strict and loose mode, see `evaluate_response`."""
+  return evaluate_response(inp, prompt_to_response[inp.prompt], context)
 
 
 def read_prompt_to_response_dict(input_jsonl_filename):
@@ -199,90 +689,656 @@ def read_prompt_to_response_dict(input_jsonl_filename):
   return return_dict
 
 
-def print_report(outputs):
-  """Prints a report on accuracy scores."""
+def _get_language_util(language):
+  return importlib.import_module(f"instruction_utils.{language}_instructions_util")
 
-  prompt_total = 0
-  prompt_correct = 0
-  instruction_total = 0
-  instruction_correct = 0
 
-  tier0_total = collections.defaultdict(int)
-  tier0_correct = collections.defaultdict(int)
+@dataclasses.dataclass
+class _AheadCheck:
+  """A spaCy-backed check run by `preanalyze_responses`."""
+  instruction: object
+  kwargs: dict
+  variants: list[str]
+  # The position of the next loose variant to check.
+  position: int = 0
+  strict: bool = False
+  seconds: float = 0.0
 
-  tier1_total = collections.defaultdict(int)
-  tier1_correct = collections.defaultdict(int)
 
-  for example in outputs:
+def _run_ahead(check, pending_errors, profiler=None):
+  """Checks the variants of `check` as `evaluate_response` does.
+
+  Returns:
+    The strict and loose results, or None if a check stopped for a text to
+    analyze, in which case it resumes from that variant on the next call.
+  """
+  instruction = check.instruction
+  while check.position < len(check.variants):
+    text = check.variants[check.position]
+    start = time.perf_counter()
+    try:
+      is_following = bool(text.strip()) and _call(
+          profiler, instruction, "strict" if check.position == 0 else "loose",
+          instruction.check_following, text)
+    except pending_errors:
+      return None
+    check.seconds += time.perf_counter() - start
+    if check.position == 0:
+      check.strict = is_following
+    if is_following:
+      return check.strict, True
+    check.position += 1
+  return check.strict, False
+
+
+def preanalyze_responses(pairs, batch_size, n_process=1, context=None):
+  """Runs the spaCy-backed checks of the es and pt responses ahead.
+
+  The checks run while the utils collect the texts they analyze, see
+  `collect_texts`. A check asking for a text that was not analyzed yet
+  stops, and once every check has run or stopped the collected texts are
+  analyzed together through `nlp.pipe` and the stopped checks resume. As in
+  `evaluate_response`, the loose variants of a response are only checked
+  until one follows the instruction, so only the texts a check actually
+  analyzes are parsed.
+
+  The results are kept in `context.outcomes`, where `evaluate_response`
+  finds them instead of running the checks again.
+
+  Args:
+    pairs: A list of `(InputExample, response)` tuples.
+    batch_size: The number of texts spaCy processes per batch.
+    n_process: The number of processes spaCy uses.
+    context: The `EvaluationContext` receiving the results, whose result
+      cache spares the responses already evaluated, if any.
+
+  Returns:
+    The utils modules holding pre-analyzed texts.
+  """
+  context = context or EvaluationContext()
+  checks = collections.defaultdict(list)
+  for inp, response in pairs:
+    if not isinstance(response, str):
+      continue
+    indexes = [
+        index for index, instruction_id in enumerate(inp.instruction_id_list)
+        if _is_spacy_instruction(instruction_id)
+    ]
+    if not indexes or (context.result_cache is not None
+                       and _is_cached(inp, response, context)):
+      continue
+    # As in `_evaluate_one`, for the arguments drawn at random.
+    random.seed(inp.key)
+    instructions = _build_instructions(inp, context)
+    variants = loose_response_variants(response)
+    for index in indexes:
+      checks[inp.instruction_id_list[index].split(":")[0]].append(
+          _AheadCheck(instructions[index], inp.kwargs[index], variants))
+
+  utils = {language: _get_language_util(language) for language in checks}
+  pending_errors = tuple(util.AnalysisPending for util in utils.values())
+  counts = collections.Counter()
+  while any(checks.values()):
+    for language, language_checks in checks.items():
+      util = utils[language]
+      stopped = []
+      with util.collect_texts() as texts:
+        for check in language_checks:
+          outcome = _run_ahead(check, pending_errors, context.profiler)
+          if outcome is None:
+            stopped.append(check)
+            continue
+          context.outcomes[_outcome_key(check.instruction, check.kwargs,
+                                        check.variants[0])] = outcome
+          if context.checker_timer is not None:
+            context.checker_timer.add(check.instruction.id, check.seconds)
+      checks[language] = stopped
+      if texts:
+        texts = list(dict.fromkeys(texts))
+        counts[language] += len(texts)
+        util.preanalyze_texts(texts, batch_size=batch_size,
+                              n_process=n_process)
+
+  for language, count in counts.items():
+    logging.info("Pre-analyzed %d %s texts with spaCy", count, language)
+  return list(utils.values())
+
+
+def _is_cached(inp, response, context):
+  """Returns whether all the results of `inp` are in the result cache."""
+  # Builds the instructions as `_evaluate_one` does, so that arguments drawn
+  # at random are the same.
+  random.seed(inp.key)
+  keys = _cache_keys(inp, _build_instructions(inp, context), response,
+                     context.result_cache)
+  return bool(keys) and context.result_cache.contains_all(
+      key for instruction_keys in keys for key in instruction_keys.values())
+
+
+def _warm_up(languages):
+  """Loads the NLP resources used by the checkers of `languages`."""
+  warm_ups = {
+      "en": lambda util: util.count_sentences("Warm up."),
+      "es": lambda util: util.count_words("Calentamiento."),
+      "fr": lambda util: util.count_sentences("Échauffement."),
+      "ja": lambda util: util.tokenizing_texts("準備運動。"),
+      "pt": lambda util: util.count_words("Aquecimento."),
+  }
+  try:
+    langdetect.detect("warm up")
+  except langdetect.LangDetectException:
+    pass
+  for language in languages:
+    if language in warm_ups:
+      warm_ups[language](_get_language_util(language))
+
+
+def _init_worker(languages, context):
+  """Initializes a worker process of `iter_evaluations`.
+
+  Args:
+    languages: The languages whose NLP resources to load.
+    context: The `EvaluationContext` of the worker, see
+      `EvaluationContext.for_worker`.
+  """
+  global _worker_context
+  langdetect.DetectorFactory.seed = 0
+  _worker_context = context
+  # A forked worker starts with the counts of the main process.
+  _pop_worker_metrics(context)
+  _warm_up(languages)
+
+
+def _evaluate_one(func, inp, prompt_to_response, context=None):
+  """Evaluates a single input with a per-prompt random seed."""
+  # Some checkers fall back to random arguments (e.g. a non-letter `letter`),
+  # so the seed is tied to the prompt to keep results independent of the
+  # order and process in which prompts are evaluated.
+  random.seed(inp.key)
+  return func(inp, prompt_to_response, context=context)
+
+
+def _map_outputs(result, function):
+  """Applies `function` to the `OutputExample`s of a result of `func`."""
+  if isinstance(result, OutputExample):
+    return function(result)
+  if isinstance(result, tuple):
+    return tuple(_map_outputs(output, function) for output in result)
+  return result
+
+
+def _evaluate_corpus_task(task):
+  """Runs one task of `iter_corpus_evaluations` inside a worker process.
+
+  Returns:
+    The result of the task without the prompts and responses, which the main
+    process already has, and the metrics of the worker since the previous
+    task.
+  """
+  func, job, position = task
+  inputs, corpus = _worker_context.jobs[job]
+  inp = inputs[position]
+  result = _evaluate_one(func, inp, {inp.prompt: corpus.get(position)},
+                         _worker_context)
+  result = _map_outputs(result, functools.partial(
+      dataclasses.replace, prompt=None, response=None))
+  return result, _pop_worker_metrics(_worker_context)
+
+
+def _evaluate_in_worker(task):
+  """Runs one evaluation task inside a worker process.
+
+  Returns:
+    The result of the task and the metrics of the worker since the previous
+    task, to be merged into those of the main process.
+  """
+  func, inp, response = task
+  # The evaluation functions look the response up by prompt.
+  result = _evaluate_one(func, inp, {inp.prompt: response}, _worker_context)
+  return result, _pop_worker_metrics(_worker_context)
+
+
+def _pop_worker_metrics(context):
+  """Returns and resets the metrics collected by the worker."""
+  pool_counts = (_instruction_pool.hits, _instruction_pool.misses)
+  _instruction_pool.hits = _instruction_pool.misses = 0
+  checker_times = None
+  if context.checker_timer is not None:
+    checker_times = context.checker_timer.pop()
+  cache_counts = None
+  if context.result_cache is not None:
+    cache_counts = (context.result_cache.hits, context.result_cache.misses)
+    context.result_cache.hits = context.result_cache.misses = 0
+  profile = None
+  if context.profiler is not None:
+    profile = context.profiler.pop()
+  return checker_times, cache_counts, profile, pool_counts
+
+
+def _merge_worker_metrics(context, checker_times, cache_counts, profile,
+                          pool_counts):
+  """Adds the metrics of a worker to those of the main process."""
+  _instruction_pool.hits += pool_counts[0]
+  _instruction_pool.misses += pool_counts[1]
+  if checker_times is not None and context.checker_timer is not None:
+    context.checker_timer.update(checker_times)
+  if cache_counts is not None and context.result_cache is not None:
+    context.result_cache.hits += cache_counts[0]
+    context.result_cache.misses += cache_counts[1]
+  if profile is not None and context.profiler is not None:
+    context.profiler.update(profile)
+
+
+def log_metrics(run_log, context, **fields):
+  """Records the checker times and the pool and cache counts in `run_log`."""
+  if context.checker_timer is not None:
+    context.checker_timer.log(run_log, **fields)
+  run_log.cache("instruction", _instruction_pool.hits,
+                _instruction_pool.misses, **fields)
+  if context.result_cache is not None:
+    run_log.cache("result", context.result_cache.hits,
+                  context.result_cache.misses, **fields)
+
+
+def _languages(inputs):
+  return sorted({
+      instruction_id.split(":")[0]
+      for inp in inputs for instruction_id in inp.instruction_id_list
+  })
+
+
+def iter_evaluations(func, pairs, workers=1, chunk_size=_STREAM_CHUNK_SIZE,
+                     languages=None, context=None):
+  """Lazily evaluates `(input, response)` pairs with `func`.
+
+  Args:
+    func: One of the `test_instruction_following_*` functions.
+    pairs: An iterable of `(InputExample, response)` tuples.
+    workers: The number of worker processes. With 1 the pairs are evaluated
+      serially in the current process.
+    chunk_size: The number of pairs handed to the worker pool at a time, which
+      bounds how many pairs are held in memory.
+    languages: The languages whose NLP resources the workers load on start-up.
+      Defaults to the languages of the first chunk of pairs.
+    context: The `EvaluationContext` of the evaluation, which collects the
+      metrics of the workers, if any.
+
+  Yields:
+    The results of `func`, in the same order as `pairs`.
+  """
+  context = context or EvaluationContext()
+  if workers <= 1:
+    for inp, response in pairs:
+      yield _evaluate_one(func, inp, {inp.prompt: response}, context)
+    return
+
+  tasks = ((func, inp, response) for inp, response in pairs)
+  chunks = iter(lambda: list(itertools.islice(tasks, chunk_size)), [])
+  first_chunk = next(chunks, None)
+  if first_chunk is None:
+    return
+  if languages is None:
+    # Any language missing from the first chunk is loaded on first use.
+    languages = _languages(inp for _, inp, _ in first_chunk)
+  with multiprocessing.Pool(
+      workers, initializer=_init_worker,
+      initargs=(languages, context.for_worker())) as pool:
+    for chunk in itertools.chain([first_chunk], chunks):
+      chunksize = max(1, len(chunk) // (workers * 4))
+      # `map` preserves the order of `chunk`, so the outputs keep the key order.
+      for result, worker_metrics in pool.map(_evaluate_in_worker, chunk,
+                                             chunksize=chunksize):
+        _merge_worker_metrics(context, *worker_metrics)
+        yield result
+
+
+def iter_corpus_evaluations(func, jobs, workers=1, languages=None,
+                            context=None):
+  """Lazily evaluates inputs against the responses of `ResponseCorpus`es.
+
+  Unlike `iter_evaluations`, the inputs are handed to the workers once, when
+  they start, and the workers read the responses from the shared memory of
+  the corpora. A task only carries the position of its input, and its result
+  comes back without the prompt and the response.
+
+  Args:
+    func: One of the `test_instruction_following_*` functions.
+    jobs: A list of `(inputs, corpus)` tuples, with a list of `InputExample`
+      and the `response_corpus.ResponseCorpus` of their responses, in the
+      same order.
+    workers: The number of worker processes. With 1 the inputs are evaluated
+      serially in the current process.
+    languages: The languages whose NLP resources the workers load on start-up.
+      Defaults to the languages of all the inputs.
+    context: The `EvaluationContext` of the evaluation, which collects the
+      metrics of the workers, if any.
+
+  Yields:
+    The results of `func`, in the order of the inputs of each job.
+  """
+  context = context or EvaluationContext()
+  if workers <= 1:
+    for inputs, corpus in jobs:
+      for position, inp in enumerate(inputs):
+        yield _evaluate_one(func, inp, {inp.prompt: corpus.get(position)},
+                            context)
+    return
+
+  if languages is None:
+    languages = _languages(inp for inputs, _ in jobs for inp in inputs)
+  tasks = [(func, job, position) for job, (inputs, _) in enumerate(jobs)
+           for position in range(len(inputs))]
+  if not tasks:
+    return
+  chunksize = max(1, len(tasks) // (workers * 4))
+  with multiprocessing.Pool(
+      workers, initializer=_init_worker,
+      initargs=(languages, context.for_worker(jobs))) as pool:
+    # `imap` preserves the order of `tasks`, so the outputs keep the key order.
+    for (_, job, position), (result, worker_metrics) in zip(
+        tasks, pool.imap(_evaluate_corpus_task, tasks, chunksize=chunksize)):
+      _merge_worker_metrics(context, *worker_metrics)
+      inputs, corpus = jobs[job]
+      inp = inputs[position]
+      yield _map_outputs(result, functools.partial(
+          dataclasses.replace, prompt=inp.prompt,
+          response=corpus.get(position)))
+
+
+def evaluate_inputs(func, inputs, prompt_to_response, workers=1,
+                    context=None):
+  """Evaluates every input with `func`, optionally in a process pool.
+
+  Args:
+    func: One of the `test_instruction_following_*` functions.
+    inputs: A list of `InputExample`.
+    prompt_to_response: A dictionary mapping prompts to responses.
+    workers: The number of worker processes. With 1 the inputs are evaluated
+      serially in the current process.
+    context: The `EvaluationContext`, if any.
+
+  Returns:
+    A list of the results of `func`, in the same order as `inputs`.
+  """
+  pairs = ((inp, prompt_to_response[inp.prompt]) for inp in inputs)
+  return list(iter_evaluations(func, pairs, workers=workers,
+                               chunk_size=max(1, len(inputs)),
+                               context=context))
+
+
+class AccuracyReport:
+  """Accumulates the accuracy scores of outputs added one at a time."""
+
+  def __init__(self):
+    self.prompt_total = 0
+    self.prompt_correct = 0
+    self.instruction_total = 0
+    self.instruction_correct = 0
+
+    self.tier0_total = collections.defaultdict(int)
+    self.tier0_correct = collections.defaultdict(int)
+
+    self.tier1_total = collections.defaultdict(int)
+    self.tier1_correct = collections.defaultdict(int)
+
+  def add(self, example):
+    """Counts the results of one `OutputExample`."""
     follow_instruction_list = example.follow_instruction_list
     instruction_id_list = example.instruction_id_list
 
-    prompt_total += 1
+    self.prompt_total += 1
     if all(follow_instruction_list):
-      prompt_correct += 1
+      self.prompt_correct += 1
 
-    instruction_total += len(instruction_id_list)
-    instruction_correct += sum(follow_instruction_list)
+    self.instruction_total += len(instruction_id_list)
+    self.instruction_correct += sum(follow_instruction_list)
 
     for instruction_id, followed_or_not in zip(
         instruction_id_list, follow_instruction_list
     ):
-      instruction_id = instruction_id.split(":")[0]
-      tier0_total[instruction_id] += 1
+      self.tier1_total[instruction_id] += 1
       if followed_or_not:
-        tier0_correct[instruction_id] += 1
+        self.tier1_correct[instruction_id] += 1
 
-    for instruction_id, followed_or_not in zip(
-        instruction_id_list, follow_instruction_list
-    ):
-      tier1_total[instruction_id] += 1
+      instruction_id = instruction_id.split(":")[0]
+      self.tier0_total[instruction_id] += 1
       if followed_or_not:
-        tier1_correct[instruction_id] += 1
+        self.tier0_correct[instruction_id] += 1
+
+  @property
+  def prompt_accuracy(self):
+    return self.prompt_correct / self.prompt_total
+
+  @property
+  def instruction_accuracy(self):
+    return self.instruction_correct / self.instruction_total
 
-  print(f"prompt-level: {prompt_correct / prompt_total}")
-  print(f"instruction-level: {instruction_correct / instruction_total}")
-  print()
-  for instruction_id in sorted(tier0_total.keys()):
-    accuracy = tier0_correct[instruction_id] / tier0_total[instruction_id]
-    print(f"{instruction_id} {accuracy}")
-  print()
-  for instruction_id in sorted(tier1_total.keys()):
-    accuracy = tier1_correct[instruction_id] / tier1_total[instruction_id]
-    print(f"{instruction_id} {accuracy}")
+  def print(self):
+    """Prints a report on accuracy scores."""
+    print(f"prompt-level: {self.prompt_accuracy}")
+    print(f"instruction-level: {self.instruction_accuracy}")
+    print()
+    for instruction_id in sorted(self.tier0_total.keys()):
+      accuracy = (self.tier0_correct[instruction_id] /
+                  self.tier0_total[instruction_id])
+      print(f"{instruction_id} {accuracy}")
+    print()
+    for instruction_id in sorted(self.tier1_total.keys()):
+      accuracy = (self.tier1_correct[instruction_id] /
+                  self.tier1_total[instruction_id])
+      print(f"{instruction_id} {accuracy}")
+
+
+def print_report(outputs):
+  """Prints a report on accuracy scores."""
+  report = AccuracyReport()
+  for example in outputs:
+    report.add(example)
+  report.print()
+
+
+def _print_results(output_file_name, report):
+  logging.info("Accuracy: %f", report.prompt_accuracy)
+  logging.info("Generated: %s", output_file_name)
+
+  # Prints instruction following accuracy report.
+  print("=" * 64)
+  print(f"{output_file_name} Accuracy Scores:")
+  report.print()
+
+
+def output_names(output_dir, results_format="jsonl"):
+  """Returns the names of the strict and loose results in `output_dir`."""
+  if results_format == "columnar":
+    return [os.path.join(results_store.store_dir(output_dir), variant)
+            for variant in results_store.VARIANTS]
+  return [results_store.jsonl_path(output_dir, variant)
+          for variant in results_store.VARIANTS]
+
+
+def write_results_store(output_dir, pairs, results, input_jsonl_filename,
+                        response_jsonl_filename):
+  """Writes the results of `pairs` to the `results_store` of `output_dir`."""
+  writer = results_store.ResultsWriter(output_dir, input_jsonl_filename,
+                                       response_jsonl_filename)
+  for (inp, _), (strict, loose) in zip(pairs, results):
+    writer.add(inp.key, strict, loose)
+  return writer.write()
+
+
+def stream_evaluation(input_jsonl_filename, response_jsonl_filename,
+                      output_dir, workers=1, results_format="jsonl",
+                      context=None):
+  """Evaluates a response file prompt by prompt with flat memory use.
+
+  The strict and loose results of each prompt are written as soon as they are
+  available and only the report counters are kept. The `results_store`, if
+  any, is written at the end from the few bytes kept per instruction.
+
+  Args:
+    input_jsonl_filename: Path to the input data.
+    response_jsonl_filename: Path to the input response data.
+    output_dir: Directory of the results.
+    workers: The number of worker processes.
+    results_format: "jsonl", "columnar" or "both", see `--results_format`.
+    context: The `EvaluationContext`, if any.
+
+  Returns:
+    A list of `(output_name, AccuracyReport)` for the strict and loose
+    results.
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  index = response_index.ResponseIndex(response_jsonl_filename)
+  index.log_duplicates()
+  # The keys of the pairs handed to the workers and not evaluated yet.
+  keys = collections.deque()
+
+  def iter_pairs():
+    for inp, response in index.iter_pairs(
+        iter_prompt_list(input_jsonl_filename)):
+      keys.append(inp.key)
+      yield inp, response
+
+  results = iter_evaluations(test_instruction_following_all, iter_pairs(),
+                             workers=workers, context=context)
+
+  writer = None
+  if results_format != "jsonl":
+    writer = results_store.ResultsWriter(output_dir, input_jsonl_filename,
+                                         response_jsonl_filename)
+  names = output_names(output_dir, results_format)
+  reports = [AccuracyReport(), AccuracyReport()]
+  with contextlib.ExitStack() as stack:
+    files = []
+    if results_format != "columnar":
+      files = [stack.enter_context(open(name, "w")) for name in names]
+    for outputs in results:
+      for f, output in zip(files, outputs):
+        write_output(f, output)
+      for report, output in zip(reports, outputs):
+        report.add(output)
+      key = keys.popleft()
+      if writer is not None:
+        writer.add(key, *outputs)
+  if writer is not None:
+    writer.write()
+  return list(zip(names, reports))
+
+
+def report_profile(profiler, output_dir, profile_dir=None):
+  """Prints `profiler`'s table and writes it to `output_dir/profile.json`."""
+  profiler.print_table()
+  os.makedirs(output_dir, exist_ok=True)
+  profile_file_name = os.path.join(output_dir, "profile.json")
+  profiler.write_json(profile_file_name)
+  logging.info("Generated: %s", profile_file_name)
+  if profile_dir:
+    profiler.dump_stats(profile_dir)
+    logging.info("Generated: %s", profile_dir)
 
 
 def main(argv):
   if len(argv) > 1:
     raise app.UsageError("Too many command-line arguments.")
 
-  inputs = read_prompt_list(_INPUT_DATA.value)
-  prompt_to_response = read_prompt_to_response_dict(
-      _INPUT_RESPONSE_DATA.value)
+  # Seeds langdetect so that serial and parallel runs give the same results.
+  langdetect.DetectorFactory.seed = 0
+  run_log = None
+  if _RUN_LOG.value:
+    run_log = metrics.RunLog(_RUN_LOG.value)
+  context = EvaluationContext.from_flags(time_checkers=run_log is not None)
+  fields = {"responses": os.path.basename(_INPUT_RESPONSE_DATA.value)}
+
+  if _FAST_SCORE.value:
+    logging.info("Generating %s fast scores...", _FAST_SCORE.value)
+    with metrics.stage(run_log, "fast_score", **fields):
+      summary = fast_score_evaluation(
+          _INPUT_DATA.value, _INPUT_RESPONSE_DATA.value,
+          fast_score_variants(_FAST_SCORE.value), workers=_WORKERS.value,
+          context=context)
+    output_file_name = write_fast_scores(_OUTPUT_DIR.value, summary)
+    for variant, accuracy in summary.items():
+      print("=" * 64)
+      print(f"{output_file_name} {variant} Accuracy Scores:")
+      print(f"prompt-level: {accuracy['prompt_level']}")
+    if run_log:
+      log_metrics(run_log, context, **fields)
+    if context.profiler is not None:
+      report_profile(context.profiler, _OUTPUT_DIR.value, _PROFILE_DIR.value)
+    return
+
+  if _STREAM.value:
+    logging.info("Generating strict and loose results...")
+    with metrics.stage(run_log, "evaluate", **fields) as stage:
+      reports = stream_evaluation(
+          _INPUT_DATA.value, _INPUT_RESPONSE_DATA.value, _OUTPUT_DIR.value,
+          workers=_WORKERS.value, results_format=_RESULTS_FORMAT.value,
+          context=context)
+      stage["prompts"] = reports[0][1].prompt_total
+    for output_file_name, report in reports:
+      _print_results(output_file_name, report)
+    if run_log:
+      log_metrics(run_log, context, **fields)
+    if context.profiler is not None:
+      report_profile(context.profiler, _OUTPUT_DIR.value, _PROFILE_DIR.value)
+    return
+
+  with metrics.stage(run_log, "read", **fields) as stage:
+    inputs = read_prompt_list(_INPUT_DATA.value)
+    index = response_index.ResponseIndex(_INPUT_RESPONSE_DATA.value)
+    index.log_duplicates()
+    pairs = list(index.iter_pairs(inputs))
+    stage["prompts"] = len(pairs)
+
+  preanalyzed_utils = []
+  if _SPACY_BATCH_SIZE.value > 0:
+    # Runs before the worker pool is created so that forked workers inherit
+    # the analyses.
+    with metrics.stage(run_log, "preanalyze", **fields):
+      preanalyzed_utils = preanalyze_responses(
+          pairs, _SPACY_BATCH_SIZE.value, _SPACY_N_PROCESS.value, context)
 
   # get instruction following results
-  for func, output_file_name in [
-      (test_instruction_following_strict, "eval_results_strict"),
-      (test_instruction_following_loose, "eval_results_loose"),
-  ]:
-    logging.info("Generating %s...", output_file_name)
-    outputs = []
-    for inp in inputs:
-      outputs.append(func(inp, prompt_to_response))
-    follow_all_instructions = [o.follow_all_instructions for o in outputs]
-    accuracy = sum(follow_all_instructions) / len(outputs)
-    logging.info("Accuracy: %f", accuracy)
-
-    output_file_name = os.path.join(
-        _OUTPUT_DIR.value, output_file_name + ".jsonl"
-    )
-    write_outputs(output_file_name, outputs)
-    logging.info("Generated: %s", output_file_name)
-
-    # Prints instruction following accuracy report.
-    print("=" * 64)
-    print(f"{output_file_name} Accuracy Scores:")
-    print_report(outputs)
+  logging.info("Generating strict and loose results...")
+  with metrics.stage(run_log, "evaluate", prompts=len(pairs), **fields):
+    if _WORKERS.value > 1:
+      # The workers read the responses from shared memory.
+      with response_corpus.ResponseCorpus.create(
+          response for _, response in pairs) as corpus:
+        results = list(iter_corpus_evaluations(
+            test_instruction_following_all, [(inputs, corpus)],
+            workers=_WORKERS.value, context=context))
+    else:
+      results = list(iter_evaluations(test_instruction_following_all, pairs,
+                                      context=context))
+  for util in preanalyzed_utils:
+    util.clear_preanalyzed()
+  strict_outputs = [strict for strict, _ in results]
+  loose_outputs = [loose for _, loose in results]
+
+  if _RESULTS_FORMAT.value != "jsonl":
+    with metrics.stage(run_log, "write", prompts=len(pairs),
+                       output=results_store.RESULTS_DIR, **fields):
+      write_results_store(_OUTPUT_DIR.value, pairs, results,
+                          _INPUT_DATA.value, _INPUT_RESPONSE_DATA.value)
+  for outputs, output_file_name in zip(
+      [strict_outputs, loose_outputs],
+      output_names(_OUTPUT_DIR.value, _RESULTS_FORMAT.value)):
+    if _RESULTS_FORMAT.value != "columnar":
+      with metrics.stage(run_log, "write", prompts=len(outputs),
+                         output=os.path.basename(output_file_name), **fields):
+        write_outputs(output_file_name, outputs)
+    report = AccuracyReport()
+    for o in outputs:
+      report.add(o)
+    _print_results(output_file_name, report)
+  if run_log:
+    log_metrics(run_log, context, **fields)
+  if context.profiler is not None:
+    report_profile(context.profiler, _OUTPUT_DIR.value, _PROFILE_DIR.value)
 
 
 if __name__ == "__main__":
+  # Marked here so that other binaries can import this module.
+  flags.mark_flags_as_required(["input_data", "output_dir"])
   app.run(main)
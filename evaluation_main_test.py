@@ -0,0 +1,83 @@
+"""Tests that parallel evaluations write the same results as serial ones."""
+
+import io
+import itertools
+import os
+
+from absl.testing import absltest
+
+import evaluation_main
+import metrics
+import response_corpus
+import response_index
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Number of prompts of each language to evaluate.
+_NUM_PROMPTS = 40
+
+
+def _read_pairs(language, model):
+  inputs = list(itertools.islice(evaluation_main.iter_prompt_list(
+      os.path.join(_DATA_DIR, f"{language}_input_data.jsonl")), _NUM_PROMPTS))
+  index = response_index.ResponseIndex(os.path.join(
+      _DATA_DIR, f"{language}_input_response_data_{model}.jsonl"))
+  try:
+    return inputs, list(index.iter_pairs(inputs))
+  finally:
+    index.close()
+
+
+def _serialize(results):
+  """Returns the strict and loose jsonl lines of `results`."""
+  files = [io.StringIO(), io.StringIO()]
+  for outputs in results:
+    for f, output in zip(files, outputs):
+      evaluation_main.write_output(f, output)
+  return [f.getvalue() for f in files]
+
+
+class ParallelEvaluationTest(absltest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    cls.jobs = [_read_pairs("en", "gpt-4o-2024-08-06"),
+                _read_pairs("es", "claude-3-haiku-20240307")]
+    cls.pairs = [pair for _, pairs in cls.jobs for pair in pairs]
+    cls.serial = _serialize(evaluation_main.iter_evaluations(
+        evaluation_main.test_instruction_following_all, cls.pairs))
+
+  def test_workers_write_identical_results(self):
+    results = evaluation_main.iter_evaluations(
+        evaluation_main.test_instruction_following_all, self.pairs,
+        workers=2, chunk_size=16)
+    self.assertEqual(_serialize(results), self.serial)
+
+  def test_corpus_workers_write_identical_results(self):
+    with response_corpus.ResponseCorpus.create(
+        response for _, response in self.pairs) as corpus:
+      inputs = [inp for inp, _ in self.pairs]
+      results = list(evaluation_main.iter_corpus_evaluations(
+          evaluation_main.test_instruction_following_all,
+          [(inputs, corpus)], workers=2))
+    self.assertEqual(_serialize(results), self.serial)
+
+  def test_worker_metrics_merge_into_context(self):
+    serial_context = evaluation_main.EvaluationContext(
+        checker_timer=metrics.CheckerTimer())
+    list(evaluation_main.iter_evaluations(
+        evaluation_main.test_instruction_following_all, self.pairs,
+        context=serial_context))
+    context = evaluation_main.EvaluationContext(
+        checker_timer=metrics.CheckerTimer())
+    list(evaluation_main.iter_evaluations(
+        evaluation_main.test_instruction_following_all, self.pairs,
+        workers=2, context=context))
+
+    self.assertEqual(context.checker_timer.calls,
+                     serial_context.checker_timer.calls)
+
+
+if __name__ == "__main__":
+  absltest.main()
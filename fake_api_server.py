@@ -0,0 +1,213 @@
+"""Local stand-in for the OpenAI and Anthropic APIs, to measure generators offline.
+
+Serves `/v1/chat/completions` and `/v1/messages` with a simulated latency and
+answers a share of the requests, and every request beyond `--max_in_flight`,
+with a 429 rate limit error.
+
+Run the server and point the SDK clients to it:
+
+    python fake_api_server.py --port 8000
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=fake \\
+        python get_responses.py --model_name gpt-4o-mini-2024-07-18
+
+Or compare the sync and async generators of `get_responses.py` against it:
+
+    python fake_api_server.py --benchmark --num_prompts 200
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_text(prompt):
+    return "Response to: " + prompt
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, jitter=0.2, rate_limit_probability=0.05,
+                 max_in_flight=64, retry_after=0.2, seed=0):
+        super().__init__(address, FakeApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_probability = rate_limit_probability
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def admit(self):
+        """Returns whether a new request is served rather than rate limited."""
+        with self.lock:
+            self.requests += 1
+            if (self.in_flight >= self.max_in_flight
+                    or self.random.random() < self.rate_limit_probability):
+                self.rate_limited += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + jitter)
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.endswith("/chat/completions"):
+            api = "openai"
+        elif self.path.endswith("/messages"):
+            api = "anthropic"
+        else:
+            self._send_json(404, {"error": {"type": "not_found", "message": self.path}})
+            return
+
+        if not self.server.admit():
+            retry_ms = str(int(self.server.retry_after * 1000))
+            self._send_json(429, {"error": {"type": "rate_limit_error", "message": "Rate limited."}},
+                            headers=[("retry-after-ms", retry_ms),
+                                     ("retry-after", str(self.server.retry_after))])
+            return
+        try:
+            time.sleep(self.server.delay())
+        finally:
+            self.server.release()
+
+        content = request["messages"][-1]["content"]
+        prompt = content if isinstance(content, str) else content[0]["text"]
+        text = fake_text(prompt)
+        if api == "openai":
+            body = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        else:
+            body = {
+                "id": "msg_fake",
+                "type": "message",
+                "role": "assistant",
+                "model": request["model"],
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            }
+        self._send_json(200, body)
+
+
+def start_server(port=0, **kwargs):
+    """Starts a `FakeApiServer` in a background thread and returns it."""
+    server = FakeApiServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_benchmark(server, num_prompts, concurrency, requests_per_second):
+    """Times the sync and async generators of `get_responses.py` on `server`."""
+    import get_responses
+
+    os.environ["OPENAI_BASE_URL"] = server.url + "/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "fake")
+
+    prompts = [f"prompt {i}" for i in range(num_prompts)]
+    expected = [fake_text(prompt) for prompt in prompts]
+    generators = [
+        ("openai sync", lambda: get_responses.OpenaiResponseGenerator("fake-model")),
+        ("openai async", lambda: get_responses.AsyncOpenaiResponseGenerator(
+            "fake-model", concurrency=concurrency, requests_per_second=requests_per_second)),
+        ("anthropic sync", lambda: get_responses.AnthropicResponseGenerator("fake-model")),
+        ("anthropic async", lambda: get_responses.AsyncAnthropicResponseGenerator(
+            "fake-model", concurrency=concurrency, requests_per_second=requests_per_second)),
+    ]
+    for name, make_generator in generators:
+        generator = make_generator()
+        start_requests, start_rate_limited = server.requests, server.rate_limited
+        start = time.perf_counter()
+        responses = generator.get_response(prompts)
+        elapsed = time.perf_counter() - start
+        if hasattr(generator, "close"):
+            generator.close()
+        print(f"{name}: {num_prompts / elapsed:.1f} prompts/s ({elapsed:.1f}s), "
+              f"{server.requests - start_requests} requests, "
+              f"{server.rate_limited - start_rate_limited} rate limited, "
+              f"in order: {responses == expected}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response time in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Maximum deviation from the mean response time.")
+    parser.add_argument("--rate_limit_probability", type=float, default=0.05,
+                        help="Share of the requests answered with a 429.")
+    parser.add_argument("--max_in_flight", type=int, default=64,
+                        help="Concurrent requests above which requests get a 429.")
+    parser.add_argument("--retry_after", type=float, default=0.2, help="Seconds sent in the retry-after headers.")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Benchmark the generators of get_responses.py instead of serving.")
+    parser.add_argument("--num_prompts", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests_per_second", type=float, default=0)
+    args = parser.parse_args()
+
+    server = start_server(
+        port=0 if args.benchmark else args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_probability=args.rate_limit_probability,
+        max_in_flight=args.max_in_flight,
+        retry_after=args.retry_after,
+    )
+    if args.benchmark:
+        run_benchmark(server, args.num_prompts, args.concurrency, args.requests_per_second)
+        server.shutdown()
+    else:
+        print(f"Serving the fake OpenAI and Anthropic APIs on {server.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,120 @@
+"""Append-as-you-go checkpoints of response generation.
+
+Responses are appended to `<output file>.checkpoint` as they are generated, so
+a rerun after a crash only generates the prompts that have no response yet.
+Once every prompt is answered the final output file is written atomically and
+the checkpoint is deleted.
+"""
+
+import os
+import json
+
+from response_index import prompt_digest
+
+
+def prompt_keys(ds, prompt_col="prompt"):
+    """Returns the `key` column of `ds`, or digests of the prompts if it has none."""
+    if "key" in ds.column_names:
+        return list(ds["key"])
+    return [prompt_digest(prompt) for prompt in ds[prompt_col]]
+
+
+class GenerationCheckpoint:
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.path = output_path + ".checkpoint"
+        self.responses = {}
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                # A crash while writing can leave a truncated last line.
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.responses[record["key"]] = record["response"]
+                valid_size += len(line)
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_size)
+
+    def is_answered(self, key):
+        return self.responses.get(key) is not None
+
+    def add(self, keys, responses):
+        """Records responses and syncs them to disk."""
+        for key, response in zip(keys, responses):
+            self.responses[key] = response
+            self._file.write(json.dumps({"key": key, "response": response}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def generate(self, generate_fn, keys, prompts, chunk_size=256):
+        """Generates the responses of the prompts that have none yet.
+
+        Args:
+            generate_fn: A function returning the list of responses to a list of prompts.
+            keys: The keys of `prompts`.
+            prompts: The prompts to answer.
+            chunk_size: The number of prompts generated between two checkpoints.
+
+        Returns:
+            The responses to all of `prompts`, in order.
+        """
+        return generate_all(generate_fn, [self], [keys], [prompts], chunk_size)[0]
+
+    def commit(self, write_fn):
+        """Writes the output file with `write_fn(path)` atomically and deletes the checkpoint."""
+        tmp_path = self.output_path + ".tmp"
+        write_fn(tmp_path)
+        os.replace(tmp_path, self.output_path)
+        self._file.close()
+        os.remove(self.path)
+
+
+def generate_all(generate_fn, checkpoints, keys, prompts, chunk_size=256):
+    """Generates the missing responses of several output files in shared submissions.
+
+    The pending prompts of all files are merged, so that each call to
+    `generate_fn` gets up to `chunk_size` prompts whatever file they come from.
+
+    Args:
+        generate_fn: A function returning the list of responses to a list of prompts.
+        checkpoints: The `GenerationCheckpoint` of each output file.
+        keys: The list of prompt keys of each output file.
+        prompts: The list of prompts of each output file.
+        chunk_size: The number of prompts generated between two checkpoints.
+
+    Returns:
+        The list of responses of each output file, in the order of `prompts`.
+    """
+    pending = []
+    for index, checkpoint in enumerate(checkpoints):
+        file_pending = [(index, key, prompt) for key, prompt in zip(keys[index], prompts[index])
+                        if not checkpoint.is_answered(key)]
+        if len(file_pending) < len(keys[index]):
+            print(f"Resuming from {checkpoint.path}: {len(keys[index]) - len(file_pending)} "
+                  f"of {len(keys[index])} prompts already answered")
+        pending.extend(file_pending)
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        responses = generate_fn([prompt for _, _, prompt in chunk])
+        by_file = {}
+        for (index, key, _), response in zip(chunk, responses):
+            by_file.setdefault(index, ([], []))
+            by_file[index][0].append(key)
+            by_file[index][1].append(response)
+        for index, (file_keys, file_responses) in by_file.items():
+            checkpoints[index].add(file_keys, file_responses)
+
+    return [[checkpoint.responses[key] for key in file_keys]
+            for checkpoint, file_keys in zip(checkpoints, keys)]
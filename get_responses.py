@@ -14,11 +14,17 @@
 # limitations under the License.
 
 import os
+import time
+import asyncio
 import argparse
 from glob import glob
 from tqdm.auto import tqdm
 from datasets import load_dataset
 
+import metrics
+from generation_checkpoint import GenerationCheckpoint, generate_all, prompt_keys
+from response_cache import DEFAULT_PATH, ResponseCache, vllm_sampling_params
+
 class ResponseGenerator:
     def __init__(self, model_name):
         raise NotImplementedError
@@ -26,6 +32,18 @@ class ResponseGenerator:
     def get_response(self, input_texts):
         raise NotImplementedError
 
+    def cache_params(self):
+        """Returns the generation settings that change the responses, for the response cache."""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the clients held by the generator."""
+
+######## Anthropic / OpenAI request settings ########
+
+ANTHROPIC_CACHE_PARAMS = {"api": "anthropic.messages", "max_tokens": 2048, "temperature": 0}
+OPENAI_CACHE_PARAMS = {"api": "openai.chat.completions"}
+
 ######## Anthropic ########
 
 class AnthropicResponseGenerator(ResponseGenerator):
@@ -36,6 +54,9 @@ class AnthropicResponseGenerator(ResponseGenerator):
             api_key=os.environ["ANTHROPIC_API_KEY"],
         )
         self.model_name = model_name
+
+    def cache_params(self):
+        return ANTHROPIC_CACHE_PARAMS
     
     def get_response(self, input_texts):
         return [
@@ -65,6 +86,9 @@ class OpenaiResponseGenerator(ResponseGenerator):
 
         self.openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
         self.model_name = model_name
+
+    def cache_params(self):
+        return OPENAI_CACHE_PARAMS
     
     def get_single_response(self, input_text):
         try:
@@ -97,6 +121,155 @@ class OpenaiResponseGenerator(ResponseGenerator):
             self.get_single_response(input_text) for input_text in tqdm(input_texts)
         ]
 
+######## Async API ########
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncApiResponseGenerator(ResponseGenerator):
+    """Keeps up to `concurrency` API requests in flight through one pooled client.
+
+    `requests_per_second` caps the request rate with a token bucket (0 disables
+    it). Rate limit errors (429) are retried by the SDK client, which honours the
+    `retry-after` header of the response.
+    """
+
+    def __init__(self, model_name, concurrency=16, requests_per_second=0, max_retries=8):
+        import httpx
+        self.model_name = model_name
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        # The client's connection pool is bound to this loop, which is reused by
+        # every `get_response` call.
+        self._loop = asyncio.new_event_loop()
+        self._client = self._make_client(
+            httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            max_retries,
+        )
+
+    def _make_client(self, limits, max_retries):
+        raise NotImplementedError
+
+    async def _get_single_response(self, input_text):
+        raise NotImplementedError
+
+    async def _get_responses(self, input_texts):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.requests_per_second) if self.requests_per_second > 0 else None
+        progress = tqdm(total=len(input_texts))
+
+        async def get_single_response(input_text):
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                response = await self._get_single_response(input_text)
+            progress.update(1)
+            return response
+
+        try:
+            # `gather` returns the responses in the order of `input_texts`.
+            return list(await asyncio.gather(*[get_single_response(t) for t in input_texts]))
+        finally:
+            progress.close()
+
+    def get_response(self, input_texts):
+        return self._loop.run_until_complete(self._get_responses(list(input_texts)))
+
+    def close(self):
+        self._loop.run_until_complete(self._client.close())
+        self._loop.close()
+
+
+class AsyncAnthropicResponseGenerator(AsyncApiResponseGenerator):
+
+    def cache_params(self):
+        return ANTHROPIC_CACHE_PARAMS
+
+    def _make_client(self, limits, max_retries):
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            api_key=os.environ["ANTHROPIC_API_KEY"],
+            max_retries=max_retries,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=limits),
+        )
+
+    async def _get_single_response(self, input_text):
+        try:
+            message = await self._client.messages.create(
+                model=self.model_name,
+                max_tokens=2048,
+                temperature=0,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": input_text
+                            }
+                        ]
+                    }
+                ]
+            )
+            return message.content[0].text
+        except Exception as e:
+            print(e)
+            return None
+
+
+class AsyncOpenaiResponseGenerator(AsyncApiResponseGenerator):
+
+    def cache_params(self):
+        return OPENAI_CACHE_PARAMS
+
+    def _make_client(self, limits, max_retries):
+        import openai
+        return openai.AsyncOpenAI(
+            api_key=os.environ["OPENAI_API_KEY"],
+            max_retries=max_retries,
+            http_client=openai.DefaultAsyncHttpxClient(limits=limits),
+        )
+
+    async def _get_single_response(self, input_text):
+        try:
+            completion = await self._client.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {
+                    "role": "user",
+                    "content": [
+                        {
+                        "type": "text",
+                        "text": input_text
+                        }
+                    ]
+                    }
+                ],
+            )
+            return completion.choices[0].message.content
+        except Exception as e:
+            print(e)
+            return None
+
 ######## VertexAI ########
 
 # TO DO: Add Support for VertexAI
@@ -138,10 +311,27 @@ class OpenaiResponseGenerator(ResponseGenerator):
 
 class VllmResponseGenerator(ResponseGenerator):
     def __init__(self, model_name):
-        from vllm import LLM, SamplingParams
+        from vllm import SamplingParams
         self.model_name = model_name
-        self.llm = LLM(model=self.model_name, max_model_len=os.environ.get("MAX_MODEL_LEN", 4096))
+        self.max_model_len = os.environ.get("MAX_MODEL_LEN", 4096)
         self.sampling_params = SamplingParams(temperature=0.0, max_tokens=2048)
+        self._llm = None
+        self.load_seconds = 0.0
+        self.generated_tokens = 0
+
+    @property
+    def llm(self):
+        # Loaded on first use, so that fully cached runs do not load the model.
+        if self._llm is None:
+            from vllm import LLM
+            start = time.perf_counter()
+            self._llm = LLM(model=self.model_name, max_model_len=self.max_model_len)
+            self.load_seconds = time.perf_counter() - start
+        return self._llm
+
+    def cache_params(self):
+        return {"api": "vllm.chat", "max_model_len": int(self.max_model_len),
+                **vllm_sampling_params(self.sampling_params)}
 
     def get_response(self, input_texts):
         input_conversations = [[{
@@ -152,6 +342,7 @@ class VllmResponseGenerator(ResponseGenerator):
         outputs = self.llm.chat(input_conversations,
                    sampling_params=self.sampling_params,
                    use_tqdm=True)
+        self.generated_tokens += sum(len(output.outputs[0].token_ids) for output in outputs)
         return [output.outputs[0].text for output in outputs]
 
 ######## Main ########
@@ -183,15 +374,32 @@ SUPPORTED_MODELS = {
 }
 
 MODEL_CLASS_DICT = {
-    "openai": OpenaiResponseGenerator,
-    "anthropic": AnthropicResponseGenerator,
+    "openai": AsyncOpenaiResponseGenerator,
+    "anthropic": AsyncAnthropicResponseGenerator,
     # "gemini": VertexResponseGenerator,
     "vllm": VllmResponseGenerator,
 }
 
+SYNC_MODEL_CLASS_DICT = {
+    "openai": OpenaiResponseGenerator,
+    "anthropic": AnthropicResponseGenerator,
+}
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--model_name", type=str, required=True)
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Number of API requests kept in flight.")
+    parser.add_argument("--requests_per_second", type=float, default=0,
+                        help="Maximum API request rate, 0 for no limit.")
+    parser.add_argument("--sync", action="store_true",
+                        help="Send the API requests one at a time.")
+    parser.add_argument("--checkpoint_every", type=int, default=2048,
+                        help="Number of prompts generated between two checkpoints.")
+    parser.add_argument("--response_cache", type=str, default=DEFAULT_PATH,
+                        help="SQLite file caching responses across runs, empty to disable it.")
+    parser.add_argument("--run_log", type=str, default="",
+                        help="JSONL file to record the load and generation times in, empty to disable it.")
     args = parser.parse_args()
 
     model_name = args.model_name
@@ -201,12 +409,56 @@ if __name__ == "__main__":
     paths = sorted(glob("./data/*_input_data.jsonl"))
 
     model_class = MODEL_CLASS_DICT[SUPPORTED_MODELS[model_name]]
-    response_generator = model_class(model_name)
+    if args.sync:
+        model_class = SYNC_MODEL_CLASS_DICT.get(SUPPORTED_MODELS[model_name], model_class)
+    if issubclass(model_class, AsyncApiResponseGenerator):
+        response_generator = model_class(model_name,
+                                         concurrency=args.concurrency,
+                                         requests_per_second=args.requests_per_second)
+    else:
+        response_generator = model_class(model_name)
+
+    generate = response_generator.get_response
+    if args.response_cache:
+        response_cache = ResponseCache(args.response_cache)
+        generate = response_cache.cached(generate, model_name, response_generator.cache_params())
 
+    # The prompts of every language are submitted together, so that vLLM batches
+    # (and the API generators keep in flight) the whole workload at once.
+    datasets, checkpoints = [], []
     for path in paths:
         print(path + " - " + model_name)
-        ds = load_dataset("json", data_files={"train": path}, split="train")
-        ds = ds.add_column("response", response_generator.get_response(ds["prompt"]))
-        ds.select_columns(["prompt", "response"]).to_json(
-            path[:-10] + "response_data_" + model_name.replace("/", "__") + ".jsonl"
-        )
\ No newline at end of file
+        output_path = path[:-10] + "response_data_" + model_name.replace("/", "__") + ".jsonl"
+        datasets.append(load_dataset("json", data_files={"train": path}, split="train"))
+        # Responses are checkpointed as they come, a rerun resumes from there.
+        checkpoints.append(GenerationCheckpoint(output_path))
+    start = time.perf_counter()
+    try:
+        all_responses = generate_all(generate, checkpoints,
+                                     [prompt_keys(ds) for ds in datasets],
+                                     [ds["prompt"] for ds in datasets],
+                                     chunk_size=args.checkpoint_every)
+    finally:
+        # Closes the pooled client and the event loop of the async generators.
+        response_generator.close()
+    generate_seconds = time.perf_counter() - start
+
+    if args.run_log:
+        run_log = metrics.RunLog(args.run_log)
+        # The vLLM model is loaded during the first generation.
+        load_seconds = getattr(response_generator, "load_seconds", 0.0)
+        if load_seconds:
+            run_log.record_stage("load", load_seconds, model=model_name)
+        run_log.record_stage("generate", generate_seconds - load_seconds, model=model_name,
+                             prompts=sum(len(ds) for ds in datasets),
+                             tokens=getattr(response_generator, "generated_tokens", None))
+        if args.response_cache:
+            run_log.cache("response", response_cache.hits, response_cache.misses, model=model_name)
+
+    for ds, checkpoint, responses in zip(datasets, checkpoints, all_responses):
+        ds = ds.add_column("response", responses)
+        # Keeps the key so that the evaluation can match responses by key.
+        checkpoint.commit(ds.select_columns(["key", "prompt", "response"]).to_json)
+
+    if args.response_cache:
+        print(f"Response cache: {response_cache.hits} hits, {response_cache.misses} misses")
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""Testes dos geradores assíncronos contra a API falsa de `fake_api_server`."""
+
+import os
+from unittest import mock
+
+from absl.testing import absltest
+
+import fake_api_server
+import get_responses
+
+_NUM_PROMPTS = 40
+
+
+class AsyncGeneratorTest(absltest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Latência variável para as respostas chegarem fora de ordem, e poucas
+        # requisições simultâneas para o servidor responder 429 com frequência.
+        self.server = fake_api_server.start_server(
+            latency=0.02, jitter=0.02, rate_limit_probability=0.3, max_in_flight=3,
+            retry_after=0.01)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.enter_context(mock.patch.dict(os.environ, {
+            "OPENAI_BASE_URL": self.server.url + "/v1",
+            "ANTHROPIC_BASE_URL": self.server.url,
+            "OPENAI_API_KEY": "fake",
+            "ANTHROPIC_API_KEY": "fake",
+        }))
+        self.prompts = [f"prompt {i}" for i in range(_NUM_PROMPTS)]
+
+    def assert_all_responses_in_order(self, generator_class):
+        generator = generator_class("fake-model", concurrency=8, max_retries=50)
+        try:
+            responses = generator.get_response(self.prompts)
+        finally:
+            generator.close()
+
+        self.assertEqual(responses, [fake_api_server.fake_text(p) for p in self.prompts])
+        # As respostas só chegaram completas porque os 429 foram repetidos.
+        self.assertGreater(self.server.rate_limited, 0)
+
+    def test_openai_returns_every_response_in_order(self):
+        self.assert_all_responses_in_order(get_responses.AsyncOpenaiResponseGenerator)
+
+    def test_anthropic_returns_every_response_in_order(self):
+        self.assert_all_responses_in_order(get_responses.AsyncAnthropicResponseGenerator)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -25,6 +25,7 @@ from absl import logging
 import langdetect
 
 from instruction_utils import en_instructions_util
+from instruction_utils import language_id
 
 
 _InstructionArgsDtype = Optional[Dict[str, Union[int, str, Sequence[str]]]]
@@ -91,6 +92,9 @@ _NUM_WORDS_LOWER_LIMIT = 100
 _NUM_WORDS_UPPER_LIMIT = 500
 
 
+# Patterns used by the checkers, compiled once.
+_TITLE_PATTERN = re.compile(r"<<[^\n]+>>")
+
 class Instruction:
   """An instruction template."""
 
@@ -155,7 +159,7 @@ class ResponseLanguageChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return langdetect.detect(value) == self._language
+      return language_id.detect(value) == self._language
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -382,6 +386,8 @@ class ConstrainedStartChecker(Instruction):
     self._description_pattern = (
         "During the conversation, when it is your turn, " +
         "please always start with {starter}")
+    self._start_pattern = re.compile(r"^\s*" + self._starter + r".*$",
+                                     flags=re.MULTILINE)
     return self._description_pattern.format(starter=self._starter)
 
   def get_instruction_args(self):
@@ -402,9 +408,7 @@ class ConstrainedStartChecker(Instruction):
       True if the response starts with the given phrase or keyword that is
       contained in `instruction_args`; otherwise, False.
     """
-    response_pattern = r"^\s*" + self._starter + r".*$"
-    response_with_constrained_start = re.search(response_pattern, value,
-                                                flags=re.MULTILINE)
+    response_with_constrained_start = self._start_pattern.search(value)
     return True if response_with_constrained_start else False
 
 
@@ -495,6 +499,8 @@ class SectionChecker(Instruction):
         "{section_spliter} 2\n" +
         "[content of section 2]")
 
+    self._section_splitter_pattern = re.compile(
+        r"\s?" + self._section_spliter + r"\s?\d+\s?")
     return self._description_pattern.format(
         num_sections=self._num_sections,
         section_spliter=self._section_spliter)
@@ -521,8 +527,7 @@ class SectionChecker(Instruction):
       True if the number of sections in the response is greater than or equal to
       the minimum number of sections; otherwise, False.
     """
-    section_splitter_patten = r"\s?" + self._section_spliter  + r"\s?\d+\s?"
-    sections = re.split(section_splitter_patten, value)
+    sections = self._section_splitter_pattern.split(value)
     num_sections = len(sections) - 1
     return num_sections >= self._num_sections
 
@@ -604,6 +609,14 @@ class PostscriptChecker(Instruction):
         "At the end of your response, please explicitly add a postscript " +
         "starting with {postscript}")
 
+    if self._postscript_marker == "P.P.S":
+      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
+    elif self._postscript_marker == "P.S.":
+      postscript_pattern = r"\s*p\.\s?s\..*$"
+    else:
+      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
+    self._postscript_pattern = re.compile(postscript_pattern,
+                                          flags=re.MULTILINE)
     return self._description_pattern.format(postscript=self._postscript_marker)
 
   def get_instruction_args(self):
@@ -626,13 +639,7 @@ class PostscriptChecker(Instruction):
       the keyword containing in the `instruction_args`; otherwise False.
     """
     value = value.lower()
-    if self._postscript_marker == "P.P.S":
-      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
-    elif self._postscript_marker == "P.S.":
-      postscript_pattern = r"\s*p\.\s?s\..*$"
-    else:
-      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
-    postscript = re.findall(postscript_pattern, value, flags=re.MULTILINE)
+    postscript = self._postscript_pattern.findall(value)
     return True if postscript else False
 
 
@@ -724,6 +731,10 @@ class KeywordChecker(Instruction):
 
     self._description_pattern = ("Include keywords {keywords} in the response.")
 
+    # Every keyword must be found, so each one keeps its own pattern.
+    self._keyword_patterns = [re.compile(keyword, flags=re.IGNORECASE)
+                              for keyword in self._keywords]
+
     return self._description_pattern.format(keywords=self._keywords)
 
   def get_instruction_args(self):
@@ -736,8 +747,8 @@ class KeywordChecker(Instruction):
 
   def check_following(self, value):
     """Check if the response contain the expected keywords."""
-    for keyword in self._keywords:
-      if not re.search(keyword, value, flags=re.IGNORECASE):
+    for keyword_pattern in self._keyword_patterns:
+      if not keyword_pattern.search(value):
         return False
     return True
 
@@ -784,6 +795,8 @@ class KeywordFrequencyChecker(Instruction):
         "In your response, the word {keyword} should appear {relation} " +
         "{frequency} times.")
 
+    self._keyword_pattern = re.compile(self._keyword, flags=re.IGNORECASE)
+
     return self._description_pattern.format(
         keyword=self._keyword,
         relation=self._comparison_relation,
@@ -801,8 +814,7 @@ class KeywordFrequencyChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contain the keyword with required frequency."""
-    actual_occurrences = len(re.findall(
-        self._keyword, value, flags=re.IGNORECASE))
+    actual_occurrences = len(self._keyword_pattern.findall(value))
 
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return actual_occurrences < self._frequency
@@ -1092,6 +1104,12 @@ class ForbiddenWords(Instruction):
         "Do not include keywords {forbidden_words} in the response."
     )
 
+    # A single alternation of the words finds any of them in one scan.
+    self._forbidden_pattern = None
+    if self._forbidden_words:
+      self._forbidden_pattern = re.compile(
+          "|".join(r"(?:\b" + word + r"\b)" for word in self._forbidden_words),
+          flags=re.IGNORECASE)
     return self._description_pattern.format(
         forbidden_words=self._forbidden_words
     )
@@ -1106,10 +1124,8 @@ class ForbiddenWords(Instruction):
 
   def check_following(self, value):
     """Check if the response does not contain the expected keywords."""
-    for word in self._forbidden_words:
-      if re.search(r"\b" + word + r"\b", value, flags=re.IGNORECASE):
-        return False
-    return True
+    return (self._forbidden_pattern is None
+            or not self._forbidden_pattern.search(value))
 
 
 class RephraseParagraph(Instruction):
@@ -1279,8 +1295,8 @@ class EndChecker(Instruction):
   def check_following(self, value):
     """Checks if the response ends with the expected phrase."""
     value = value.strip().strip("\"").lower()
-    self._end_phrase = self._end_phrase.strip().lower()
-    return value.endswith(self._end_phrase)
+    end_phrase = self._end_phrase.strip().lower()
+    return value.endswith(end_phrase)
 
 
 class TitleChecker(Instruction):
@@ -1303,9 +1319,7 @@ class TitleChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a title."""
-    pattern = r"<<[^\n]+>>"
-    re_pattern = re.compile(pattern)
-    titles = re.findall(re_pattern, value)
+    titles = _TITLE_PATTERN.findall(value)
 
     for title in titles:
       if title.lstrip("<").rstrip(">").strip():
@@ -1413,7 +1427,7 @@ class CapitalLettersEnglishChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.isupper() and langdetect.detect(value) == "en"
+      return value.isupper() and language_id.detect(value) == "en"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1445,7 +1459,7 @@ class LowercaseLettersEnglishChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.islower() and langdetect.detect(value) == "en"
+      return value.islower() and language_id.detect(value) == "en"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -15,6 +15,7 @@
 
 """Library of instructions."""
 import collections
+import functools
 import json
 import random
 import re
@@ -27,6 +28,7 @@ import unicodedata
 import spacy
 
 from instruction_utils import es_instructions_util
+from instruction_utils import language_id
 
 
 _InstructionArgsDtype = Optional[Dict[str, Union[int, str, Sequence[str]]]]
@@ -90,7 +92,23 @@ _ALL__WORD_FREQUENCY = 20
 _NUM_WORDS_LOWER_LIMIT = 1
 _NUM_WORDS_UPPER_LIMIT = 500
 
-multilingual_nlp = spacy.load("xx_sent_ud_sm")
+@functools.lru_cache(maxsize=None)
+def _get_multilingual_nlp():
+  """Loads the multilingual sentence segmenter on first use."""
+  return spacy.load("xx_sent_ud_sm")
+
+
+@functools.lru_cache(maxsize=1024)
+def _count_multilingual_sentences(text):
+  """Counts the sentences of a non-Spanish text, parsing it only once."""
+  tokenized_text = _get_multilingual_nlp()(text)
+  return len(list(tokenized_text.sents))
+
+
+# Patterns used by the checkers, compiled once.
+_TITLE_PATTERN = re.compile(r"<<[^\n]+>>")
+_QUESTION_PATTERN = re.compile(r"¿[^?]*\?")
+_EXCLAMATION_PATTERN = re.compile(r"¡[^!]*\!")
 
 class Instruction:
   """An instruction template."""
@@ -156,7 +174,7 @@ class ResponseLanguageChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return langdetect.detect(value) == self._language
+      return language_id.detect(value) == self._language
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -228,13 +246,12 @@ class NumberOfSentences(Instruction):
     """
 
     # Remove common bullet points like '-', '*', and numbered lists like '1.', '2.'
-    #Only removes numbers that are bullet points because the pattern is anchored at the beginning of the sentence.
-    cleaned_text = re.sub(r'(^\s*[\d]+\.\s*)|(^\s*[-*]\s*)', '', value, flags=re.MULTILINE)
+    cleaned_text = es_instructions_util.remove_list_markers(value)
 
     # Detect the language
     detected_lang = "es"  # Default to Spanish
     try:
-        detected_lang = langdetect.detect(value.lower())
+        detected_lang = language_id.detect(value.lower())
     except langdetect.lang_detect_exception.LangDetectException:
         # If language detection fails, default to Spanish
         pass
@@ -242,8 +259,7 @@ class NumberOfSentences(Instruction):
     if detected_lang == "es":
       num_sentences = es_instructions_util.count_sentences(cleaned_text)
     else:
-      tokenized_text = multilingual_nlp(cleaned_text) 
-      num_sentences = len(list(tokenized_text.sents))
+      num_sentences = _count_multilingual_sentences(cleaned_text)
       
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return num_sentences >= self._num_sentences_threshold
@@ -420,6 +436,8 @@ class ConstrainedStartChecker(Instruction):
     self._description_pattern = (
         "During the conversation, when it is your turn, " +
         "please always start with {starter}")
+    self._start_pattern = re.compile(r"^\s*" + self._starter + r".*$",
+                                     flags=re.MULTILINE)
     return self._description_pattern.format(starter=self._starter)
 
   def get_instruction_args(self):
@@ -440,9 +458,7 @@ class ConstrainedStartChecker(Instruction):
       True if the response starts with the given phrase or keyword that is
       contained in `instruction_args`; otherwise, False.
     """
-    response_pattern = r"^\s*" + self._starter + r".*$"
-    response_with_constrained_start = re.search(response_pattern, value,
-                                                flags=re.MULTILINE)
+    response_with_constrained_start = self._start_pattern.search(value)
     return True if response_with_constrained_start else False
 
 
@@ -561,6 +577,8 @@ class SectionChecker(Instruction):
         "{section_spliter} 2\n" +
         "[contenido de sección 2]")
 
+    self._section_splitter_pattern = re.compile(
+        r"\s?" + self._section_spliter + r"\s?\d+\s?")
     return self._description_pattern.format(
         num_sections=self._num_sections,
         section_spliter=self._section_spliter,
@@ -593,8 +611,7 @@ class SectionChecker(Instruction):
       method applies. If more relations are supported other than "at least",
       this method needs to be updated.
     """
-    section_splitter_patten = r"\s?" + self._section_spliter  + r"\s?\d+\s?"
-    sections = re.split(section_splitter_patten, value)
+    sections = self._section_splitter_pattern.split(value)
     num_sections = len(sections) - 1
     return num_sections >= self._num_sections
 
@@ -676,6 +693,14 @@ class PostscriptChecker(Instruction):
         "Al final de la respuesta, por favor añade explícitamente una posdata " +
         "que empiece por {postscript}")
 
+    if self._postscript_marker == "P.D.":
+      postscript_pattern = r"\s*p\.\s?d\..*$"
+    elif self._postscript_marker == "Nota":
+      postscript_pattern = r"\s*nota.*$"
+    else:
+      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
+    self._postscript_pattern = re.compile(postscript_pattern,
+                                          flags=re.MULTILINE)
     return self._description_pattern.format(postscript=self._postscript_marker)
 
   def get_instruction_args(self):
@@ -698,13 +723,7 @@ class PostscriptChecker(Instruction):
       the keyword containing in the `instruction_args`; otherwise False.
     """
     value = value.lower()
-    if self._postscript_marker == "P.D.":
-      postscript_pattern = r"\s*p\.\s?d\..*$"
-    elif self._postscript_marker == "Nota":
-      postscript_pattern = r"\s*nota.*$"
-    else:
-      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
-    postscript = re.findall(postscript_pattern, value, flags=re.MULTILINE)
+    postscript = self._postscript_pattern.findall(value)
     return True if postscript else False
 
 # RephraseChecker is not used in the current instructions, so this +
@@ -797,6 +816,10 @@ class KeywordChecker(Instruction):
 
     self._description_pattern = ("Incluye las palabras clave {keywords} en tu respuesta.")
 
+    # Every keyword must be found, so each one keeps its own pattern.
+    self._keyword_patterns = [re.compile(keyword, flags=re.IGNORECASE)
+                              for keyword in self._keywords]
+
     return self._description_pattern.format(keywords=self._keywords)
 
   def get_instruction_args(self):
@@ -809,8 +832,8 @@ class KeywordChecker(Instruction):
 
   def check_following(self, value):
     """Check if the response contain the expected keywords."""
-    for keyword in self._keywords:
-      if not re.search(keyword, value, flags=re.IGNORECASE):
+    for keyword_pattern in self._keyword_patterns:
+      if not keyword_pattern.search(value):
         return False
     return True
 
@@ -857,6 +880,8 @@ class KeywordFrequencyChecker(Instruction):
         "En tu respuesta, la palabra {keyword} debe aparecer {relation} " +
         "{frequency} veces.")
 
+    self._keyword_pattern = re.compile(self._keyword, flags=re.IGNORECASE)
+
     return self._description_pattern.format(
         keyword=self._keyword,
         relation=self._comparison_relation,
@@ -874,8 +899,7 @@ class KeywordFrequencyChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contain the keyword with required frequency."""
-    actual_occurrences = len(re.findall(
-        self._keyword, value, flags=re.IGNORECASE))
+    actual_occurrences = len(self._keyword_pattern.findall(value))
 
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return actual_occurrences >= self._frequency
@@ -937,8 +961,7 @@ class NumberOfWords(Instruction):
     """Checks if the response contains the expected number of words."""
 
     # Remove common bullet points like '-', '*', and numbered lists like '1.', '2.'
-    # Only removes numbers that are bullet points because the pattern is anchored at the beginning of the sentence.
-    cleaned_text = re.sub(r'(^\s*[\d]+\.\s*)|(^\s*[-*]\s*)', '', value, flags=re.MULTILINE)
+    cleaned_text = es_instructions_util.remove_list_markers(value)
     cleaned_text_without_newlines = cleaned_text.replace('\n', ' ')
       
     num_words = es_instructions_util.count_words(cleaned_text_without_newlines)
@@ -1179,6 +1202,12 @@ class ForbiddenWords(Instruction):
         "No incluyas las palabras clave {forbidden_words} en tu respuesta."
     )
 
+    # A single alternation of the words finds any of them in one scan.
+    self._forbidden_pattern = None
+    if self._forbidden_words:
+      self._forbidden_pattern = re.compile(
+          "|".join(r"(?:\b" + word + r"\b)" for word in self._forbidden_words),
+          flags=re.IGNORECASE)
     return self._description_pattern.format(
         forbidden_words=self._forbidden_words
     )
@@ -1193,10 +1222,8 @@ class ForbiddenWords(Instruction):
 
   def check_following(self, value):
     """Check if the response does not contain the expected keywords."""
-    for word in self._forbidden_words:
-      if re.search(r"\b" + word + r"\b", value, flags=re.IGNORECASE):
-        return False
-    return True
+    return (self._forbidden_pattern is None
+            or not self._forbidden_pattern.search(value))
 
 # RephraseParagraph is not used in the current instructions, so this +
 # function has not been reviewed nor adapted to Spanish yet
@@ -1366,12 +1393,12 @@ class EndChecker(Instruction):
   def check_following(self, value):
     """Checks if the response ends with the expected phrase."""
     value = value.strip().strip("\"").lower()
-    self._end_phrase = self._end_phrase.strip().lower()
+    end_phrase = self._end_phrase.strip().lower()
     # Check if the last character in value is a dot (.)
     if value and value[-1] == ".":
     # Remove the dot before checking if it ends with the expected end_phrase kwarg
         value = value[:-1]
-    return value.endswith(self._end_phrase)
+    return value.endswith(end_phrase)
 
 
 class TitleChecker(Instruction):
@@ -1394,9 +1421,7 @@ class TitleChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a title."""
-    pattern = r"<<[^\n]+>>"
-    re_pattern = re.compile(pattern)
-    titles = re.findall(re_pattern, value)
+    titles = _TITLE_PATTERN.findall(value)
 
     for title in titles:
       if title.lstrip("<").rstrip(">").strip():
@@ -1515,7 +1540,7 @@ class CapitalLettersSpanishChecker(Instruction):
 
     #NOTE: langdetect works with the original value since the decomposition of the characters in the normalization could affect the language detection.
     try:
-      return is_uppercase and langdetect.detect(value.lower()) == "es"
+      return is_uppercase and language_id.detect(value.lower()) == "es"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1547,7 +1572,7 @@ class LowercaseLettersSpanishChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.islower() and langdetect.detect(value) == "es"
+      return value.islower() and language_id.detect(value) == "es"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1688,9 +1713,7 @@ class QuestionMarkChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a question."""
-    pattern = r"¿[^?]*\?"
-    re_pattern = re.compile(pattern)
-    questions = re.findall(re_pattern, value)
+    questions = _QUESTION_PATTERN.findall(value)
 
     for question in questions:
       if question.lstrip("¿").rstrip("?").strip():
@@ -1718,9 +1741,7 @@ class ExclamationMarkChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a question."""
-    pattern = r"¡[^!]*\!"
-    re_pattern = re.compile(pattern)
-    exclamations = re.findall(re_pattern, value)
+    exclamations = _EXCLAMATION_PATTERN.findall(value)
 
     for exclamation in exclamations:
       if exclamation.lstrip("¡").rstrip("!").strip():
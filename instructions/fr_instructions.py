@@ -25,6 +25,7 @@ from absl import logging
 import langdetect
 
 from instruction_utils import fr_instructions_util
+from instruction_utils import language_id
 
 
 _InstructionArgsDtype = Optional[Dict[str, Union[int, str, Sequence[str]]]]
@@ -96,6 +97,10 @@ _NUM_WORDS_UPPER_LIMIT = 500
 _FORBIDDEN_CHAR = ("ç", "œ")
 
 
+# Patterns used by the checkers, compiled once.
+_TITLE_PATTERN = re.compile(r"##[^\n]+##")
+_ACCENTED_CHAR_PATTERN = re.compile(r'[àáâãäåçèéêëìíîïñòóôõöùúûüýÿÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝ]')
+
 class Instruction:
   """An instruction template."""
 
@@ -160,7 +165,7 @@ class ResponseLanguageChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return langdetect.detect(value) == self._language
+      return language_id.detect(value) == self._language
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -387,6 +392,8 @@ class ConstrainedStartChecker(Instruction):
     self._description_pattern = (
         "Pendant la conversation, quand c'est votre tour, " +
         "veuillez toujours commencer par {starter}")
+    self._start_pattern = re.compile(r"^\s*" + self._starter + r".*$",
+                                     flags=re.MULTILINE)
     return self._description_pattern.format(starter=self._starter)
 
   def get_instruction_args(self):
@@ -407,9 +414,7 @@ class ConstrainedStartChecker(Instruction):
       True if the response starts with the given phrase or keyword that is
       contained in `instruction_args`; otherwise, False.
     """
-    response_pattern = r"^\s*" + self._starter + r".*$"
-    response_with_constrained_start = re.search(response_pattern, value,
-                                                flags=re.MULTILINE)
+    response_with_constrained_start = self._start_pattern.search(value)
     return True if response_with_constrained_start else False
 
 
@@ -500,6 +505,8 @@ class SectionChecker(Instruction):
         "{section_spliter} 2\n" +
         "[contenu de la section 2]")
 
+    self._section_splitter_pattern = re.compile(
+        r"\s?" + self._section_spliter + r"\s?\d+\s?")
     return self._description_pattern.format(
         num_sections=self._num_sections,
         section_spliter=self._section_spliter)
@@ -526,8 +533,7 @@ class SectionChecker(Instruction):
       True if the number of sections in the response is greater than or equal to
       the minimum number of sections; otherwise, False.
     """
-    section_splitter_patten = r"\s?" + self._section_spliter  + r"\s?\d+\s?"
-    sections = re.split(section_splitter_patten, value)
+    sections = self._section_splitter_pattern.split(value)
     num_sections = len(sections) - 1
     return num_sections >= self._num_sections
 
@@ -609,6 +615,14 @@ class PostscriptChecker(Instruction):
         "À la fin de votre réponse, veuillez ajouter explicitement un post-scriptum " +
         "commençant par {postscript}")
 
+    if self._postscript_marker == "P.P.S":
+      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
+    elif self._postscript_marker == "P.S.":
+      postscript_pattern = r"\s*p\.\s?s\..*$"
+    else:
+      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
+    self._postscript_pattern = re.compile(postscript_pattern,
+                                          flags=re.MULTILINE)
     return self._description_pattern.format(postscript=self._postscript_marker)
 
   def get_instruction_args(self):
@@ -631,13 +645,7 @@ class PostscriptChecker(Instruction):
       the keyword containing in the `instruction_args`; otherwise False.
     """
     value = value.lower()
-    if self._postscript_marker == "P.P.S":
-      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
-    elif self._postscript_marker == "P.S.":
-      postscript_pattern = r"\s*p\.\s?s\..*$"
-    else:
-      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
-    postscript = re.findall(postscript_pattern, value, flags=re.MULTILINE)
+    postscript = self._postscript_pattern.findall(value)
     return True if postscript else False
 
 
@@ -729,6 +737,10 @@ class KeywordChecker(Instruction):
 
     self._description_pattern = ("Incluez les mots {keywords} dans la réponse.")
 
+    # Every keyword must be found, so each one keeps its own pattern.
+    self._keyword_patterns = [re.compile(keyword, flags=re.IGNORECASE)
+                              for keyword in self._keywords]
+
     return self._description_pattern.format(keywords=self._keywords)
 
   def get_instruction_args(self):
@@ -741,8 +753,8 @@ class KeywordChecker(Instruction):
 
   def check_following(self, value):
     """Check if the response contain the expected keywords."""
-    for keyword in self._keywords:
-      if not re.search(keyword, value, flags=re.IGNORECASE):
+    for keyword_pattern in self._keyword_patterns:
+      if not keyword_pattern.search(value):
         return False
     return True
 
@@ -789,6 +801,8 @@ class KeywordFrequencyChecker(Instruction):
         "Votre réponse doit contenir le mot {keyword} {relation} " +
         "{frequency} fois.")
 
+    self._keyword_pattern = re.compile(self._keyword, flags=re.IGNORECASE)
+
     return self._description_pattern.format(
         keyword=self._keyword,
         relation=self._comparison_relation,
@@ -806,8 +820,7 @@ class KeywordFrequencyChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contain the keyword with required frequency."""
-    actual_occurrences = len(re.findall(
-        self._keyword, value, flags=re.IGNORECASE))
+    actual_occurrences = len(self._keyword_pattern.findall(value))
 
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return actual_occurrences < self._frequency
@@ -1096,6 +1109,12 @@ class ForbiddenWords(Instruction):
         "N'incluez pas les mots {forbidden_words} dans votre réponse."
     )
 
+    # A single alternation of the words finds any of them in one scan.
+    self._forbidden_pattern = None
+    if self._forbidden_words:
+      self._forbidden_pattern = re.compile(
+          "|".join(r"(?:\b" + word + r"\b)" for word in self._forbidden_words),
+          flags=re.IGNORECASE)
     return self._description_pattern.format(
         forbidden_words=self._forbidden_words
     )
@@ -1110,10 +1129,8 @@ class ForbiddenWords(Instruction):
 
   def check_following(self, value):
     """Check if the response does not contain the expected keywords."""
-    for word in self._forbidden_words:
-      if re.search(r"\b" + word + r"\b", value, flags=re.IGNORECASE):
-        return False
-    return True
+    return (self._forbidden_pattern is None
+            or not self._forbidden_pattern.search(value))
 
 
 class RephraseParagraph(Instruction):
@@ -1281,8 +1298,8 @@ class EndChecker(Instruction):
   def check_following(self, value):
     """Checks if the response ends with the expected phrase."""
     value = value.strip().strip("\"").lower()
-    self._end_phrase = self._end_phrase.strip().lower()
-    return value.endswith(self._end_phrase)
+    end_phrase = self._end_phrase.strip().lower()
+    return value.endswith(end_phrase)
 
 # Modified - French version
 class TitleChecker(Instruction):
@@ -1305,9 +1322,7 @@ class TitleChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a title."""
-    pattern = r"##[^\n]+##"
-    re_pattern = re.compile(pattern)
-    titles = re.findall(re_pattern, value)
+    titles = _TITLE_PATTERN.findall(value)
 
     for title in titles:
       if title.lstrip("#").rstrip("#").strip():
@@ -1415,7 +1430,7 @@ class CapitalLettersFrenchChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.isupper() and langdetect.detect(value.lower()) == "fr" # put text in lowercase for langdetect, otherwise detection outputs german for French Caps text
+      return value.isupper() and language_id.detect(value.lower()) == "fr" # put text in lowercase for langdetect, otherwise detection outputs german for French Caps text
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1446,7 +1461,7 @@ class LowercaseLettersFrenchChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.islower() and langdetect.detect(value) == "fr"
+      return value.islower() and language_id.detect(value) == "fr"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1593,6 +1608,10 @@ class ForbiddenChar(Instruction):
         "N'incluez pas le caractère {forbidden_char} dans votre réponse."
     )
 
+    # Matches the character, case insensitive.
+    self._forbidden_char_pattern = re.compile(re.escape(self._forbidden_char),
+                                              flags=re.IGNORECASE)
+
     return self._description_pattern.format(
         forbidden_char=self._forbidden_char
     )
@@ -1625,10 +1644,7 @@ class ForbiddenChar(Instruction):
     >>> contains_char("Hello, World!", "z")
     False
     """
-    # Create a regex pattern to match the character, case insensitive
-    pattern = re.compile(re.escape(self._forbidden_char), flags=re.IGNORECASE)
-    # Search for the pattern in the string
-    return pattern.search(value) is not None
+    return self._forbidden_char_pattern.search(value) is not None
   
 # class ExcludeFormalNegation(Instruction):
 #   """Checks that 'ne' and 'n'' are not used in the response."""
@@ -1684,7 +1700,8 @@ class UseInformalAddress(Instruction):
             r'\bta\b',           # possessive adjective
             r'\btes\b',          # possessive adjective
         ]
-    
+    _TU_PATTERN = re.compile('|'.join(_TU_INDICATORS), re.IGNORECASE)
+
     #_VOUS_INDICATORS = [
     #        r'\bvous\b',          # "vous" pronoun
     #        r'\bvotre\b',         # possessive adjective
@@ -1711,8 +1728,7 @@ class UseInformalAddress(Instruction):
     def check_following(self, value):
         """Check if the response uses the informal address: 'tutoiement' form."""
         # Look for common 'tutoiement' form indicators
-        pattern = '|'.join(self._TU_INDICATORS)
-        return bool(re.search(pattern, value, re.IGNORECASE))
+        return bool(self._TU_PATTERN.search(value))
       
 class NoAccents(Instruction):
     """Checks that the response does not use any accented characters."""
@@ -1748,8 +1764,7 @@ class NoAccents(Instruction):
         Returns:
           (bool): True if accented characters are present, False otherwise.
         """
-        accented_chars = re.compile(r'[àáâãäåçèéêëìíîïñòóôõöùúûüýÿÀÁÂÃÄÅÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝ]')
-        return bool(accented_chars.search(value))
+        return bool(_ACCENTED_CHAR_PATTERN.search(value))
 
 class AccentsChecker(Instruction):
     """Checks that the response includes appropriate accents for target French words."""
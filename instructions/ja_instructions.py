@@ -25,6 +25,7 @@ from absl import logging
 import langdetect
 
 from instruction_utils import ja_instructions_util
+from instruction_utils import language_id
 
 import unicodedata
 
@@ -99,6 +100,12 @@ _NUM_LETTERS_LOWER_LIMIT = 200
 _NUM_LETTERS_UPPER_LIMIT = 1000
 
 
+# Patterns used by the checkers, compiled once.
+_TITLE_PATTERN = re.compile(r"『[^\n]+』")
+_KANJI_PATTERN = re.compile(r'[\u4e00-\u9faf]+')
+_KANJI_WITH_FURIGANA_PATTERN = re.compile(r'[\u4e00-\u9faf]+（[ぁ-ん]+）')
+_QUOTE_PATTERNS = (re.compile(r'「.*?」'), re.compile(r'『.*?』'))
+
 class Instruction:
   """An instruction template."""
 
@@ -162,7 +169,7 @@ class ResponseLanguageChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return langdetect.detect(value) == self._language
+      return language_id.detect(value) == self._language
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -432,6 +439,8 @@ class ConstrainedStartChecker(Instruction):
     if self._starter is None:
       self._starter = random.choice(_STARTER_OPTIONS)
     self._description_pattern = ("会話中あなたの番になったら、必ず{starter}で応答を始めてください。")
+    self._start_pattern = re.compile(r"^\s*" + self._starter + r".*$",
+                                     flags=re.MULTILINE)
     return self._description_pattern.format(starter=self._starter)
 
   def get_instruction_args(self):
@@ -452,9 +461,7 @@ class ConstrainedStartChecker(Instruction):
       True if the response starts with the given phrase or keyword that is
       contained in `instruction_args`; otherwise, False.
     """
-    response_pattern = r"^\s*" + self._starter + r".*$"
-    response_with_constrained_start = re.search(response_pattern, value,
-                                                flags=re.MULTILINE)
+    response_with_constrained_start = self._start_pattern.search(value)
     return True if response_with_constrained_start else False
 
 
@@ -540,6 +547,8 @@ class SectionChecker(Instruction):
         "第2{section_spliter}\n" +
         "[セクション2の内容]")
 
+    self._section_splitter_pattern = re.compile(
+        r"\s?" + r"第[\d\uFF10-\uFF19]+" + self._section_spliter + r"\s?")
     return self._description_pattern.format(
         num_sections=self._num_sections,
         section_spliter=self._section_spliter)
@@ -566,8 +575,7 @@ class SectionChecker(Instruction):
       True if the number of sections in the response is greater than or equal to
       the minimum number of sections; otherwise, False.
     """
-    section_splitter_patten = r"\s?" + r"第[\d\uFF10-\uFF19]+" + self._section_spliter + r"\s?"
-    sections = re.split(section_splitter_patten, value)
+    sections = self._section_splitter_pattern.split(value)
     num_sections = len(sections) - 1
     return num_sections >= self._num_sections
 
@@ -645,6 +653,14 @@ class PostscriptChecker(Instruction):
     self._description_pattern = ("応答の最後に、{postscript}で始まる追伸を追加してください。")
 
 
+    if self._postscript_marker == "P.P.S":
+      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
+    elif self._postscript_marker == "P.S.":
+      postscript_pattern = r"\s*p\.\s?s\..*$"
+    else:
+      postscript_pattern = r"\s*" + re.escape(self._postscript_marker) + r".*$"
+    self._postscript_pattern = re.compile(postscript_pattern,
+                                          flags=re.IGNORECASE | re.MULTILINE)
     return self._description_pattern.format(postscript=self._postscript_marker)
 
   def get_instruction_args(self):
@@ -666,13 +682,7 @@ class PostscriptChecker(Instruction):
       True if the response contains a postscript section starting with
       the keyword containing in the `instruction_args`; otherwise False.
     """
-    if self._postscript_marker == "P.P.S":
-      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
-    elif self._postscript_marker == "P.S.":
-      postscript_pattern = r"\s*p\.\s?s\..*$"
-    else:
-      postscript_pattern = r"\s*" + re.escape(self._postscript_marker) + r".*$"
-    postscript = re.findall(postscript_pattern, value, flags=re.IGNORECASE | re.MULTILINE)
+    postscript = self._postscript_pattern.findall(value)
     return True if postscript else False
 
 
@@ -761,6 +771,8 @@ class KeywordChecker(Instruction):
 
     self._description_pattern = ("応答に次のキーワード {keywords} を含めてください。")
 
+    self._keyword_set = frozenset(self._keywords)
+
     return self._description_pattern.format(keywords=self._keywords)
 
   def get_instruction_args(self):
@@ -773,13 +785,12 @@ class KeywordChecker(Instruction):
 
   def check_following(self, value):
     """Check if the response contain the expected keywords."""
-    tokens = ja_instructions_util.tokenizing_texts(value)
-    val_words = [token.surface for token in tokens]
-
-    for keyword in self._keywords:
-      if not keyword in val_words:
-        return False
-    return True
+    missing_keywords = set(self._keyword_set)
+    for token in ja_instructions_util.iter_tokens(value):
+      if not missing_keywords:
+        break
+      missing_keywords.discard(token.surface)
+    return not missing_keywords
 
 
 class KeywordFrequencyChecker(Instruction):
@@ -840,10 +851,13 @@ class KeywordFrequencyChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contain the keyword with required frequency."""
-    tokens = ja_instructions_util.tokenizing_texts(value)
-    val_words = [token.surface for token in tokens]
-    dict_val = collections.Counter(val_words)
-    actual_occurrences = dict_val[self._keyword]
+    actual_occurrences = 0
+    for token in ja_instructions_util.iter_tokens(value):
+      if token.surface == self._keyword:
+        actual_occurrences += 1
+        # Both relations are decided once the threshold is reached.
+        if actual_occurrences >= self._frequency:
+          break
 
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return actual_occurrences < self._frequency
@@ -1120,6 +1134,7 @@ class ForbiddenWords(Instruction):
         "応答に {forbidden_words} という単語を含めないでください。"
     )
 
+    self._forbidden_word_set = frozenset(self._forbidden_words)
     return self._description_pattern.format(
         forbidden_words=self._forbidden_words
     )
@@ -1134,10 +1149,8 @@ class ForbiddenWords(Instruction):
 
   def check_following(self, value):
     """Check if the response does not contain the expected keywords."""
-    tokens = ja_instructions_util.tokenizing_texts(value)
-    words = [token.surface for token in tokens]
-    for word in self._forbidden_words:
-      if word in words:
+    for token in ja_instructions_util.iter_tokens(value):
+      if token.surface in self._forbidden_word_set:
         return False
     return True
 
@@ -1310,8 +1323,8 @@ class EndChecker(Instruction):
   def check_following(self, value):
     """Checks if the response ends with the expected phrase."""
     value = value.strip().strip("」』")
-    self._end_phrase = self._end_phrase.strip().strip("」』")
-    return value.endswith(self._end_phrase)
+    end_phrase = self._end_phrase.strip().strip("」』")
+    return value.endswith(end_phrase)
 
   
 class TitleChecker(Instruction):
@@ -1334,9 +1347,7 @@ class TitleChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a title."""
-    pattern = r"『[^\n]+』"
-    re_pattern = re.compile(pattern)
-    titles = re.findall(re_pattern, value)
+    titles = _TITLE_PATTERN.findall(value)
 
     for title in titles:
       if title.lstrip("『").rstrip("』").strip():
@@ -1508,11 +1519,8 @@ class FuriganaForKanji(Instruction):
 
   def check_following(self, value):
     """Checks if all kanji is described with furigana"""
-    kanji_pattern = r'[\u4e00-\u9faf]+'
-    kanji_with_furigana_pattern = r'[\u4e00-\u9faf]+（[ぁ-ん]+）'
-
-    kanji_count = len(re.findall(kanji_pattern, value))
-    kanji_with_furigana_count = len(re.findall(kanji_with_furigana_pattern, value))
+    kanji_count = len(_KANJI_PATTERN.findall(value))
+    kanji_with_furigana_count = len(_KANJI_WITH_FURIGANA_PATTERN.findall(value))
 
     return kanji_count == kanji_with_furigana_count
 
@@ -1706,10 +1714,8 @@ class SentenceEndingUnification(Instruction):
     Returns:
       True if all the sentence endings follow the instruction; otherwise False.
     """
-    quote_pattern_1 = re.compile(r'「.*?」')
-    quote_pattern_2 = re.compile(r'『.*?』')
-    value = re.sub(quote_pattern_1, '', value)
-    value = re.sub(quote_pattern_2, '', value)
+    for quote_pattern in _QUOTE_PATTERNS:
+      value = quote_pattern.sub('', value)
 
     sentences = re.split(r'[。！？]', value)
     for sentence in sentences:
@@ -1754,18 +1760,17 @@ class NominalEndingChecker(Instruction):
     Returns:
       True if the actual number of nominal endings meets the minimum requirement; otherwise False.
     """
-    quote_pattern_1 = re.compile(r'「.*?」')
-    quote_pattern_2 = re.compile(r'『.*?』')
-    value = re.sub(quote_pattern_1, '', value)
-    value = re.sub(quote_pattern_2, '', value)
-
-    tokens = ja_instructions_util.tokenizing_texts(value)
-    tokens = list(tokens)
+    for quote_pattern in _QUOTE_PATTERNS:
+      value = quote_pattern.sub('', value)
 
     noun_count = 0
-    for i in range(1, len(tokens)):
-      if tokens[i].surface in '。！？' and tokens[i-1].part_of_speech.startswith('名詞'):
+    previous_token = None
+    for token in ja_instructions_util.iter_tokens(value):
+      if previous_token is not None and token.surface in '。！？' and previous_token.part_of_speech.startswith('名詞'):
         noun_count += 1
+        if noun_count >= self._count:
+          return True
+      previous_token = token
 
     return noun_count >= self._count
 
@@ -24,6 +24,7 @@ from typing import Dict, Optional, Sequence, Union
 from absl import logging
 import langdetect
 
+from instruction_utils import language_id
 from instruction_utils import pt_instructions_util
 
 
@@ -95,6 +96,9 @@ _NUM_WORDS_LOWER_LIMIT = 100
 _NUM_WORDS_UPPER_LIMIT = 500
 
 
+# Patterns used by the checkers, compiled once.
+_TITLE_PATTERN = re.compile(r"<<[^\n]+>>")
+
 class Instruction:
   """An instruction template."""
 
@@ -159,7 +163,7 @@ class ResponseLanguageChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return langdetect.detect(value) == self._language
+      return language_id.detect(value) == self._language
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -386,6 +390,8 @@ class ConstrainedStartChecker(Instruction):
     self._description_pattern = (
         "Durante a conversa, quando for o seu turno, " +
         "por favor, sempre inicie com: {starter}")
+    self._start_pattern = re.compile(r"^\s*" + self._starter + r".*$",
+                                     flags=re.MULTILINE)
     return self._description_pattern.format(starter=self._starter)
 
   def get_instruction_args(self):
@@ -406,9 +412,7 @@ class ConstrainedStartChecker(Instruction):
       True if the response starts with the given phrase or keyword that is
       contained in `instruction_args`; otherwise, False.
     """
-    response_pattern = r"^\s*" + self._starter + r".*$"
-    response_with_constrained_start = re.search(response_pattern, value,
-                                                flags=re.MULTILINE)
+    response_with_constrained_start = self._start_pattern.search(value)
     return True if response_with_constrained_start else False
 
 
@@ -499,6 +503,8 @@ class SectionChecker(Instruction):
         "{section_spliter} 2\n" +
         "[conteúdo da sessão 2]")
 
+    self._section_splitter_pattern = re.compile(
+        r"\s?" + self._section_spliter + r"\s?\d+\s?")
     return self._description_pattern.format(
         num_sections=self._num_sections,
         section_spliter=self._section_spliter)
@@ -525,8 +531,7 @@ class SectionChecker(Instruction):
       True if the number of sections in the response is greater than or equal to
       the minimum number of sections; otherwise, False.
     """
-    section_splitter_patten = r"\s?" + self._section_spliter  + r"\s?\d+\s?"
-    sections = re.split(section_splitter_patten, value)
+    sections = self._section_splitter_pattern.split(value)
     num_sections = len(sections) - 1
     return num_sections >= self._num_sections
 
@@ -608,6 +613,16 @@ class PostscriptChecker(Instruction):
         "Ao final da sua resposta, por favor adicione explicitamente um pós-escrito" +
         "que começa com {postscript}")
 
+    if self._postscript_marker == "OBS.":
+      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
+    elif self._postscript_marker == "P.S.":
+      postscript_pattern = r"\s*p\.\s?s\..*$"
+    elif self._postscript_marker == "Nota":
+      postscript_pattern = r"\s*nota.*$"
+    else:
+      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
+    self._postscript_pattern = re.compile(postscript_pattern,
+                                          flags=re.MULTILINE)
     return self._description_pattern.format(postscript=self._postscript_marker)
 
   def get_instruction_args(self):
@@ -630,15 +645,7 @@ class PostscriptChecker(Instruction):
       the keyword containing in the `instruction_args`; otherwise False.
     """
     value = value.lower()
-    if self._postscript_marker == "OBS.":
-      postscript_pattern = r"\s*p\.\s?p\.\s?s.*$"
-    elif self._postscript_marker == "P.S.":
-      postscript_pattern = r"\s*p\.\s?s\..*$"
-    elif self._postscript_marker == "Nota":
-      postscript_pattern = r"\s*nota.*$"
-    else:
-      postscript_pattern = r"\s*" + self._postscript_marker.lower() + r".*$"
-    postscript = re.findall(postscript_pattern, value, flags=re.MULTILINE)
+    postscript = self._postscript_pattern.findall(value)
     return True if postscript else False
 
 
@@ -730,6 +737,10 @@ class KeywordChecker(Instruction):
 
     self._description_pattern = ("Inclua as palavras chaves {keywords} na resposta.")
 
+    # Every keyword must be found, so each one keeps its own pattern.
+    self._keyword_patterns = [re.compile(keyword, flags=re.IGNORECASE)
+                              for keyword in self._keywords]
+
     return self._description_pattern.format(keywords=self._keywords)
 
   def get_instruction_args(self):
@@ -742,8 +753,8 @@ class KeywordChecker(Instruction):
 
   def check_following(self, value):
     """Check if the response contain the expected keywords."""
-    for keyword in self._keywords:
-      if not re.search(keyword, value, flags=re.IGNORECASE):
+    for keyword_pattern in self._keyword_patterns:
+      if not keyword_pattern.search(value):
         return False
     return True
 
@@ -790,6 +801,8 @@ class KeywordFrequencyChecker(Instruction):
         "Em sua resposta, a palavra {keyword} deve aparecer {relation} " +
         "{frequency} vezes.")
 
+    self._keyword_pattern = re.compile(self._keyword, flags=re.IGNORECASE)
+
     return self._description_pattern.format(
         keyword=self._keyword,
         relation=self._comparison_relation,
@@ -807,8 +820,7 @@ class KeywordFrequencyChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contain the keyword with required frequency."""
-    actual_occurrences = len(re.findall(
-        self._keyword, value, flags=re.IGNORECASE))
+    actual_occurrences = len(self._keyword_pattern.findall(value))
 
     if self._comparison_relation == _COMPARISON_RELATION[0]:
       return actual_occurrences < self._frequency
@@ -1098,6 +1110,12 @@ class ForbiddenWords(Instruction):
         "Não inclua as palavras {forbidden_words} na resposta."
     )
 
+    # A single alternation of the words finds any of them in one scan.
+    self._forbidden_pattern = None
+    if self._forbidden_words:
+      self._forbidden_pattern = re.compile(
+          "|".join(r"(?:\b" + word + r"\b)" for word in self._forbidden_words),
+          flags=re.IGNORECASE)
     return self._description_pattern.format(
         forbidden_words=self._forbidden_words
     )
@@ -1112,10 +1130,8 @@ class ForbiddenWords(Instruction):
 
   def check_following(self, value):
     """Check if the response does not contain the expected keywords."""
-    for word in self._forbidden_words:
-      if re.search(r"\b" + word + r"\b", value, flags=re.IGNORECASE):
-        return False
-    return True
+    return (self._forbidden_pattern is None
+            or not self._forbidden_pattern.search(value))
 
 
 class RephraseParagraph(Instruction):
@@ -1285,8 +1301,8 @@ class EndChecker(Instruction):
   def check_following(self, value):
     """Checks if the response ends with the expected phrase."""
     value = value.strip().strip("\"").lower()
-    self._end_phrase = self._end_phrase.strip().lower()
-    return value.endswith(self._end_phrase)
+    end_phrase = self._end_phrase.strip().lower()
+    return value.endswith(end_phrase)
 
 
 class TitleChecker(Instruction):
@@ -1308,9 +1324,7 @@ class TitleChecker(Instruction):
 
   def check_following(self, value):
     """Checks if the response contains a title."""
-    pattern = r"<<[^\n]+>>"
-    re_pattern = re.compile(pattern)
-    titles = re.findall(re_pattern, value)
+    titles = _TITLE_PATTERN.findall(value)
 
     for title in titles:
       if title.lstrip("<").rstrip(">").strip():
@@ -1418,7 +1432,7 @@ class CapitalLettersPortugueseChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.isupper() and langdetect.detect(value) == "pt"
+      return value.isupper() and language_id.detect(value) == "pt"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -1450,7 +1464,7 @@ class LowercaseLettersPortugueseChecker(Instruction):
     assert isinstance(value, str)
 
     try:
-      return value.islower() and langdetect.detect(value) == "pt"
+      return value.islower() and language_id.detect(value) == "pt"
     except langdetect.LangDetectException as e:
       # Count as instruction is followed.
       logging.error(
@@ -21,10 +21,12 @@
 
 import spacy
 
+import contextlib
+import dataclasses
 import functools
 import random
 import re
-from typing import List
+from typing import List, Tuple
 
 import immutabledict
 
@@ -74,7 +76,113 @@ _WEBSITES = "[.](com|net|org|io|gov|edu|me|es|mx|ar|cl|co|pe|uy|ve|bo|do|gt|hn|p
 _DIGITS = "([0-9])"
 _MULTIPLE_DOTS = r"\.{2,}"
 
-nlp = spacy.load("es_core_news_sm")
+# The maximum number of texts whose analysis is kept in memory.
+_ANALYSIS_CACHE_SIZE = 1024
+
+# The default batch size of `preanalyze_texts`.
+_BATCH_SIZE = 64
+
+# Pipeline components that word and sentence counting do not use.
+_UNUSED_COMPONENTS = ["morphologizer", "attribute_ruler", "lemmatizer", "ner"]
+
+_LIST_MARKERS = re.compile(r'(^\s*[\d]+\.\s*)|(^\s*[-*]\s*)', flags=re.MULTILINE)
+
+
+# Analyses computed in bulk by `preanalyze_texts`, looked up before parsing.
+_preanalyzed = {}
+
+# The texts `analyze_text` was asked for inside `collect_texts`, if active.
+_collected = None
+
+
+class AnalysisPending(Exception):
+  """Raised by `analyze_text` inside `collect_texts` for a text to analyze."""
+
+
+@functools.lru_cache(maxsize=None)
+def _get_nlp():
+  """Loads the Spanish spaCy pipeline on first use."""
+  return spacy.load("es_core_news_sm", disable=_UNUSED_COMPONENTS)
+
+
+@dataclasses.dataclass(frozen=True)
+class TextAnalysis:
+  """The spaCy analysis of a text shared by all the checkers.
+
+  Attributes:
+    words: The non-punctuation tokens of the text.
+    num_sentences: The number of sentences of the text.
+  """
+  words: Tuple[str, ...]
+  num_sentences: int
+
+
+def _analyze_doc(tokenized_text):
+  return TextAnalysis(
+      words=tuple(token.text for token in tokenized_text if not token.is_punct),
+      num_sentences=len(list(tokenized_text.sents)),
+  )
+
+
+@functools.lru_cache(maxsize=_ANALYSIS_CACHE_SIZE)
+def analyze_text(text):
+  """Parses `text` once with spaCy and returns its `TextAnalysis`."""
+  analysis = _preanalyzed.get(text)
+  if analysis is None:
+    if _collected is not None:
+      _collected.append(text)
+      raise AnalysisPending(text)
+    analysis = _analyze_doc(_get_nlp()(text))  # Process the text with the Spanish tokenizer
+  return analysis
+
+
+def preanalyze_texts(texts, batch_size=_BATCH_SIZE, n_process=1):
+  """Analyzes many texts in batches with `nlp.pipe`.
+
+  The analyses are kept until `clear_preanalyzed` is called and are used by
+  `analyze_text` instead of parsing the texts one at a time.
+
+  Args:
+    texts: An iterable of strings.
+    batch_size: The number of texts spaCy processes per batch.
+    n_process: The number of processes spaCy uses.
+  """
+  pending = [text for text in dict.fromkeys(texts) if text not in _preanalyzed]
+  docs = _get_nlp().pipe(pending, batch_size=batch_size, n_process=n_process)
+  for text, tokenized_text in zip(pending, docs):
+    _preanalyzed[text] = _analyze_doc(tokenized_text)
+
+
+def clear_preanalyzed():
+  """Drops the analyses computed by `preanalyze_texts`."""
+  _preanalyzed.clear()
+
+
+@contextlib.contextmanager
+def collect_texts():
+  """Collects the texts the checkers analyze instead of parsing them.
+
+  Inside the block, `analyze_text` appends a text it has no analysis of to
+  the yielded list and raises `AnalysisPending`, so that the texts of many
+  checks can be analyzed together by `preanalyze_texts` before the checks are
+  run again.
+
+  Yields:
+    The list of the collected texts.
+  """
+  global _collected
+  _collected = []
+  try:
+    yield _collected
+  finally:
+    _collected = None
+
+
+def remove_list_markers(text):
+  """Removes bullet points like '-', '*' and numbered lists like '1.', '2.'."""
+  # Only removes numbers that are bullet points because the pattern is anchored at the beginning of the sentence.
+  return _LIST_MARKERS.sub('', text)
+
 
 def split_into_sentences(text):
   """Split the text into sentences.
@@ -130,25 +238,17 @@ def split_into_sentences(text):
 
 def count_words(text):
   """Counts the number of words, respecting Spanish special characters and features with spacy."""
-  # Load the Spanish tokenizer model from spacy
-  tokenized_text = nlp(text)  # Process the text with the Spanish tokenizer
-  num_words = len([token.text for token in tokenized_text if not token.is_punct])  # Count non-punctuation tokens
-  return num_words
+  # Count non-punctuation tokens
+  return len(analyze_text(text).words)
 
 def tokenize_words(text):
   """Returns a list of words from the text, respecting Spanish special characters and features with spaCy."""
-  # Load the Spanish tokenizer model from spaCy
-  tokenized_text = nlp(text)  # Process the text with the Spanish tokenizer
   # Extract non-punctuation tokens
-  words = [token.text for token in tokenized_text if not token.is_punct]
-  return words
+  return list(analyze_text(text).words)
 
 def count_sentences(text):
   """Count the number of sentences."""
-  # Load the Spanish tokenizer model from spacy
-  tokenized_text = nlp(text)  # Process the text with the Spanish tokenizer
-  num_sentences = len(list(tokenized_text.sents))  # Count the number of sentences
-  return num_sentences
+  return analyze_text(text).num_sentences
 
 def generate_keywords(num_keywords):
   """Randomly generates a few keywords."""
@@ -24,8 +24,6 @@ import unicodedata
 import immutabledict
 import nltk
 
-nltk.download('punkt_tab')
-
 WORD_LIST = ["occidental", "phrase", "signal", "château", "tache", "opposé", "bas", "pomme de terre", "administration", "étoile"]  # pylint: disable=line-too-long
 
 # ISO 639-1 codes to language names.
@@ -72,6 +70,9 @@ _WEBSITES = "[.](com|net|org|io|gov|edu|me|fr|ac)"
 _DIGITS = "([0-9])"
 _MULTIPLE_DOTS = r"\.{2,}"
 
+# The maximum number of texts whose analysis is kept in memory.
+_ANALYSIS_CACHE_SIZE = 1024
+
 # abbreviations should be in lower case in the below definition, 
 _ABBREVIATIONS = [
                       # Titles
@@ -124,6 +125,8 @@ def _get_sentence_tokenizer():
           with updated handling for abbreviations, websites, decimal numbers, ellipses, and acronyms.
     """
     
+    nltk.download('punkt_tab')
+
     # Load the default French sentence tokenizer
     tokenizer = nltk.data.load("nltk:tokenizers/punkt/french.pickle")
     
@@ -140,11 +143,17 @@ def split_into_sentences(text):
     Returns:
       A list of strings where each string is a sentence.
     """
+    return list(_tokenize_sentences(text))
+
+
+@functools.lru_cache(maxsize=_ANALYSIS_CACHE_SIZE)
+def _tokenize_sentences(text):
+    """Splits `text` once; the sentences are shared by all the checkers."""
     tokenizer = _get_sentence_tokenizer()
-    sentences = tokenizer.tokenize(text)
-    return sentences
+    return tuple(tokenizer.tokenize(text))
 
 
+@functools.lru_cache(maxsize=_ANALYSIS_CACHE_SIZE)
 def count_words(text):
   """Counts the number of words."""
   tokenizer = nltk.tokenize.RegexpTokenizer(r"\w+")
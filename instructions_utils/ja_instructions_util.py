@@ -15,7 +15,9 @@
 
 """Utility library of instructions."""
 
+import collections
 import functools
+import os
 import random
 import re
 from typing import List
@@ -75,6 +77,16 @@ _WEBSITES = "[.](com|net|org|io|gov|edu|me)"
 _DIGITS = "([0-9])"
 _MULTIPLE_DOTS = r"\.{2,}"
 
+# The maximum number of texts whose analysis is kept in memory.
+_ANALYSIS_CACHE_SIZE = 1024
+
+# Whether Janome memory-maps its system dictionary ("1") or loads it in memory
+# ("0"). Janome's own default is used when unset.
+_JANOME_MMAP = os.environ.get("JANOME_MMAP")
+
+# Token tuples of the most recently tokenized texts, in LRU order.
+_token_cache = collections.OrderedDict()
+
 
 def split_into_sentences(text):
   """Split the text into sentences.
@@ -129,11 +141,26 @@ def split_into_sentences(text):
   return sentences
 
 
-def count_sentences(text):
-  """Count the number of sentences."""
+@functools.lru_cache(maxsize=None)
+def _get_tokenizer():
+  """Returns the Janome tokenizer shared by the whole process."""
+  if _JANOME_MMAP is None:
+    return Tokenizer()
+  return Tokenizer(mmap=_JANOME_MMAP == "1")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_segmenter():
+  """Returns the sentence segmenter pipeline shared by the whole process."""
   split_punc2 = functools.partial(split_punctuation, punctuations=r"。!?")
   concat_tail_no = functools.partial(concatenate_matching, former_matching_rule=r"^(?P<result>.+)(の)$", remove_former_matched=False)
-  segmenter = make_pipeline(normalize, split_newline, concat_tail_no, split_punc2)
+  return make_pipeline(normalize, split_newline, concat_tail_no, split_punc2)
+
+
+@functools.lru_cache(maxsize=_ANALYSIS_CACHE_SIZE)
+def count_sentences(text):
+  """Count the number of sentences."""
+  segmenter = _get_segmenter()
   segmented_sentences = list(segmenter(text))
   return len(segmented_sentences)
 
@@ -144,5 +171,33 @@ def generate_keywords(num_keywords):
 
 def tokenizing_texts(text):
   """Return tokenized texts"""
-  tokenizer = Tokenizer()
-  return tokenizer.tokenize(text)
+  return tuple(iter_tokens(text))
+
+
+def iter_tokens(text):
+  """Yields the tokens of `text` as they are produced by Janome.
+
+  Callers may stop iterating early, e.g. once a count threshold is reached.
+  The tokens of fully tokenized texts are cached and shared by all the
+  checkers.
+
+  Args:
+    text: A string to tokenize.
+
+  Yields:
+    The Janome tokens of `text`.
+  """
+  tokens = _token_cache.get(text)
+  if tokens is not None:
+    _token_cache.move_to_end(text)
+    yield from tokens
+    return
+
+  tokens = []
+  for token in _get_tokenizer().tokenize(text):
+    tokens.append(token)
+    yield token
+
+  _token_cache[text] = tuple(tokens)
+  if len(_token_cache) > _ANALYSIS_CACHE_SIZE:
+    _token_cache.popitem(last=False)
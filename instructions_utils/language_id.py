@@ -0,0 +1,128 @@
+# coding=utf-8
+# Copyright 2024 The Google Research Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Language identification shared by the checkers of every language.
+
+Wraps `langdetect.detect` with a fixed seed, so that a text always gets the
+same label, and memoizes the label of each text by its digest. The same text
+is often checked several times, e.g. by the language and the letter case
+checkers of a prompt, or as both the response and a loose variant of it.
+
+langdetect only reads the first 10000 characters of a text, once its URLs and
+e-mail addresses are replaced by spaces, but it runs those replacements over
+the whole text. A long text is cut to a bounded sample first when the cut
+cannot change what langdetect reads, see `_sample`, so the labels are the same
+as those of the whole texts.
+"""
+
+import collections
+import hashlib
+
+import langdetect
+
+# Seed of the langdetect detectors, as set by the evaluation binaries.
+SEED = 0
+
+# The detectors draw n-grams at random, from a generator seeded by the factory.
+langdetect.DetectorFactory.seed = SEED
+
+# The number of characters langdetect reads from a text.
+_MAX_TEXT_LENGTH = 10000
+
+# The maximum length of the part of an e-mail address before the "@" that
+# langdetect replaces.
+_MAX_MAIL_PREFIX_LENGTH = 64
+
+# The length of the sample of a long text, see `_sample`.
+_SAMPLE_LENGTH = _MAX_TEXT_LENGTH + _MAX_MAIL_PREFIX_LENGTH
+
+# Combining marks that langdetect merges with the preceding vowel.
+_DIACRITICAL_MARKS = "\u0300\u0301\u0303\u0309\u0323"
+
+# The maximum number of texts whose label is kept in memory.
+_LABEL_CACHE_SIZE = 65536
+
+# Label, or `LangDetectException`, by text digest in LRU order.
+_label_cache = collections.OrderedDict()
+
+
+def _digest(text):
+  return hashlib.blake2b(text.encode("utf-8", "surrogatepass"),
+                         digest_size=16).digest()
+
+
+def _sample(text):
+  """Returns the start of `text` that langdetect reads, or `text` itself.
+
+  langdetect shortens the text by replacing URLs and e-mail addresses with a
+  space and by merging Vietnamese vowels with their combining marks before it
+  reads the first `_MAX_TEXT_LENGTH` characters. If the sample holds none of
+  these, langdetect reads its start unchanged, and any of them that crosses
+  the cut begins at or after the `_MAX_TEXT_LENGTH` character.
+  """
+  if len(text) <= _SAMPLE_LENGTH:
+    return text
+  sample = text[:_SAMPLE_LENGTH]
+  if ("://" in sample or "@" in sample
+      or any(mark in sample for mark in _DIACRITICAL_MARKS)):
+    return text
+  return sample
+
+
+def _detect(text):
+  try:
+    return langdetect.detect(text)
+  except langdetect.LangDetectException as e:
+    # Without the traceback, which holds on to the frames of the checker.
+    return e.with_traceback(None)
+
+
+def _lookup(text):
+  """Returns the cached label or exception of `text`, detecting it if needed."""
+  text = _sample(text)
+  key = _digest(text)
+  label = _label_cache.get(key)
+  if label is None:
+    label = _detect(text)
+    _label_cache[key] = label
+    if len(_label_cache) > _LABEL_CACHE_SIZE:
+      _label_cache.popitem(last=False)
+  else:
+    _label_cache.move_to_end(key)
+  return label
+
+
+def detect(text):
+  """Returns the language code of `text`, as `langdetect.detect` does.
+
+  Args:
+    text: A string.
+
+  Returns:
+    The ISO 639-1 code of the language of `text`, e.g. "en".
+
+  Raises:
+    langdetect.LangDetectException: If the language cannot be detected, e.g.
+      for a text without letters.
+  """
+  label = _lookup(text)
+  if isinstance(label, langdetect.LangDetectException):
+    raise langdetect.LangDetectException(label.get_code(), str(label))
+  return label
+
+
+def clear_cache():
+  """Drops the memoized labels."""
+  _label_cache.clear()
@@ -15,10 +15,12 @@
 
 """Utility library of instructions."""
 
+import contextlib
+import dataclasses
 import functools
 import random
 import re
-from typing import List
+from typing import List, Optional, Tuple
 import spacy
 import immutabledict
 import nltk
@@ -68,6 +70,26 @@ _WEBSITES = "[.](com|net|org|io|gov|edu|me|br)"
 _DIGITS = "([0-9])"
 _MULTIPLE_DOTS = r"\.{2,}"
 
+# The maximum number of texts whose analysis is kept in memory.
+_ANALYSIS_CACHE_SIZE = 1024
+
+# The default batch size of `preanalyze_texts`.
+_BATCH_SIZE = 64
+
+# Pipeline components that word counting does not use.
+_UNUSED_COMPONENTS = ["tagger", "parser", "ner", "morphologizer",
+                      "attribute_ruler", "lemmatizer"]
+
+# Analyses computed in bulk by `preanalyze_texts`, looked up before parsing.
+_preanalyzed = {}
+
+# The texts `analyze_text` was asked for inside `collect_texts`, if active.
+_collected = None
+
+
+class AnalysisPending(Exception):
+  """Raised by `analyze_text` inside `collect_texts` for a text to analyze."""
+
 def split_into_sentences(text):
   """Split the text into sentences.
 
@@ -120,30 +142,104 @@ def split_into_sentences(text):
     sentences = sentences[:-1]
   return sentences
 
-def count_words(text):
-  """Counts the number of words."""
-  nlp = _get_sentence_tokenizer()
-  tokenized_text = nlp(text)  # Process the text with the Portuguese tokenizer
-  num_words = len([token.text for token in tokenized_text if not token.is_punct])  # Count non-punctuation tokens
-  return num_words
-
 @functools.lru_cache(maxsize=None)
 def _get_sentence_tokenizer():
-    return spacy.load("pt_core_news_sm", disable=["tagger", "parser", "ner"])
+    return spacy.load("pt_core_news_sm", disable=_UNUSED_COMPONENTS)
+
+
+@dataclasses.dataclass(frozen=True)
+class TextAnalysis:
+  """The spaCy analysis of a text shared by all the checkers.
+
+  Attributes:
+    words: The non-punctuation tokens of the text.
+    num_sentences: The number of sentences of the text, or None when the
+      pipeline does not set sentence boundaries.
+  """
+  words: Tuple[str, ...]
+  num_sentences: Optional[int]
+
+
+def _analyze_doc(tokenized_text):
+  num_sentences = None
+  if tokenized_text.has_annotation("SENT_START"):
+    num_sentences = len(list(tokenized_text.sents))
+  return TextAnalysis(
+      words=tuple(token.text for token in tokenized_text if not token.is_punct),
+      num_sentences=num_sentences,
+  )
+
+
+@functools.lru_cache(maxsize=_ANALYSIS_CACHE_SIZE)
+def analyze_text(text):
+  """Parses `text` once with spaCy and returns its `TextAnalysis`."""
+  analysis = _preanalyzed.get(text)
+  if analysis is None:
+    if _collected is not None:
+      _collected.append(text)
+      raise AnalysisPending(text)
+    nlp = _get_sentence_tokenizer()
+    analysis = _analyze_doc(nlp(text))  # Process the text with the Portuguese tokenizer
+  return analysis
+
+
+def preanalyze_texts(texts, batch_size=_BATCH_SIZE, n_process=1):
+  """Analyzes many texts in batches with `nlp.pipe`.
+
+  The analyses are kept until `clear_preanalyzed` is called and are used by
+  `analyze_text` instead of parsing the texts one at a time.
+
+  Args:
+    texts: An iterable of strings.
+    batch_size: The number of texts spaCy processes per batch.
+    n_process: The number of processes spaCy uses.
+  """
+  nlp = _get_sentence_tokenizer()
+  pending = [text for text in dict.fromkeys(texts) if text not in _preanalyzed]
+  docs = nlp.pipe(pending, batch_size=batch_size, n_process=n_process)
+  for text, tokenized_text in zip(pending, docs):
+    _preanalyzed[text] = _analyze_doc(tokenized_text)
+
+
+def clear_preanalyzed():
+  """Drops the analyses computed by `preanalyze_texts`."""
+  _preanalyzed.clear()
+
+
+@contextlib.contextmanager
+def collect_texts():
+  """Collects the texts the checkers analyze instead of parsing them.
+
+  Inside the block, `analyze_text` appends a text it has no analysis of to
+  the yielded list and raises `AnalysisPending`, so that the texts of many
+  checks can be analyzed together by `preanalyze_texts` before the checks are
+  run again.
+
+  Yields:
+    The list of the collected texts.
+  """
+  global _collected
+  _collected = []
+  try:
+    yield _collected
+  finally:
+    _collected = None
+
+
+def count_words(text):
+  """Counts the number of words."""
+  return len(analyze_text(text).words)  # Count non-punctuation tokens
 
 def tokenize_words(text):
   """Returns a list of words from the text, respecting Portuguese special characters and features with spaCy."""
-  # Load the Portuguese tokenizer model from spaCy
-  nlp = _get_sentence_tokenizer()
-  tokenized_text = nlp(text)  # Process the text with the Portuguese tokenizer
   # Extract non-punctuation tokens
-  words = [token.text for token in tokenized_text if not token.is_punct]
-  return words
+  return list(analyze_text(text).words)
 
 def count_sentences(text) -> int:
-    nlp = _get_sentence_tokenizer()
-    tokenized_text = nlp(text)
-    num_sentences = len(list(tokenized_text.sents))  # Count the number of sentences
+    num_sentences = analyze_text(text).num_sentences
+    if num_sentences is None:
+      # Same error as spaCy's `Doc.sents` without sentence boundaries.
+      raise ValueError("Sentence boundaries unset for the text.")
     return num_sentences
 
 def generate_keywords(num_keywords):
@@ -0,0 +1,359 @@
+"""Binary aggregating the results of every model and language at once.
+
+Loads every `{evaluations_dir}/{lang}_input_response_data_{model}` directory,
+from its `results_store` when it has one and otherwise from its
+`eval_results_*.jsonl` files, into flat arrays indexed by model and language,
+prompt and instruction. Computes the prompt-level and instruction-level
+accuracies in strict and loose mode, their bootstrap confidence intervals and
+the accuracies of every instruction group and instruction id (tier 1, as in
+the reports of `evaluation_main`) with vectorized NumPy operations, and prints the leaderboard table
+of the README:
+
+  python3 leaderboard.py --evaluations_dir=./evaluations --output=scores.json
+
+The bootstrap resamples the prompts of each model and language, so the
+intervals of the instruction-level accuracies account for the instructions of
+a prompt not being independent.
+"""
+
+import json
+import os
+import re
+
+from absl import app
+from absl import flags
+import numpy as np
+
+import results_store
+
+
+_EVALUATIONS_DIR = flags.DEFINE_string(
+    "evaluations_dir", "./evaluations", "Directory of the eval results."
+)
+
+_METRIC = flags.DEFINE_enum(
+    "metric",
+    "strict_instruction",
+    ["strict_prompt", "strict_instruction", "loose_prompt",
+     "loose_instruction"],
+    "Accuracy shown in the leaderboard table.",
+)
+
+_BOOTSTRAP_SAMPLES = flags.DEFINE_integer(
+    "bootstrap_samples", 1000,
+    "Number of bootstrap resamples of the prompts, 0 disables the intervals.",
+)
+
+_CONFIDENCE = flags.DEFINE_float(
+    "confidence", 0.95, "Confidence level of the bootstrap intervals."
+)
+
+_SEED = flags.DEFINE_integer("seed", 0, "Seed of the bootstrap resamples.")
+
+_SHOW_CI = flags.DEFINE_bool(
+    "show_ci", False, "Adds the confidence intervals to the table."
+)
+
+_OUTPUT = flags.DEFINE_string(
+    "output", None,
+    "JSON file to write every accuracy, interval and tier accuracy to.",
+)
+
+_RESULT_DIR_RE = re.compile(
+    r"^(?P<language>[a-z]+)_input_response_data_(?P<model>.+)$")
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "ja": "Japanese",
+    "pt": "Portuguese",
+}
+
+METRICS = ("strict_prompt", "strict_instruction", "loose_prompt",
+           "loose_instruction")
+
+# The prefix of a legacy JSONL record up to its prompt, which is all that is
+# needed from it, see `evaluation_main.write_output`.
+_PROMPT_FIELD = ', "prompt": '
+
+
+def _read_jsonl_results(path):
+  """Returns the instruction ids and results of each record of a JSONL file."""
+  instruction_ids = []
+  results = []
+  with open(path, encoding="utf-8") as f:
+    for line in f:
+      if not line.strip():
+        continue
+      end = line.find(_PROMPT_FIELD)
+      # Only decodes the fields before the prompt and the response.
+      record = json.loads(line[:end] + "}" if end >= 0 else line)
+      instruction_ids.append(record["instruction_id_list"])
+      results.append(record["follow_instruction_list"])
+  return instruction_ids, results
+
+
+def _load_result_dir(output_dir):
+  """Returns the offsets, instruction ids and strict and loose results."""
+  if results_store.exists(output_dir):
+    results = results_store.load(output_dir)
+    return (np.asarray(results.offsets),
+            results.instruction_ids[results.instructions],
+            np.asarray(results.strict), np.asarray(results.loose))
+  instruction_ids, strict = _read_jsonl_results(
+      results_store.jsonl_path(output_dir, "strict"))
+  _, loose = _read_jsonl_results(results_store.jsonl_path(output_dir, "loose"))
+  offsets = np.zeros(len(strict) + 1, dtype=np.int64)
+  np.cumsum([len(r) for r in strict], out=offsets[1:])
+  return (offsets,
+          np.array([i for ids in instruction_ids for i in ids], dtype=str),
+          np.array([r for rs in strict for r in rs], dtype=bool),
+          np.array([r for rs in loose for r in rs], dtype=bool))
+
+
+class Results:
+  """The results of every model and language, in flat arrays.
+
+  The results are grouped by `(model, language)` pair, with the prompts of a
+  group contiguous.
+
+  Attributes:
+    groups: The `(model, language)` pair of each group.
+    group_offsets: The prompts of group `g` are
+      `group_offsets[g]:group_offsets[g + 1]`.
+    prompt_offsets: The instructions of prompt `i` are
+      `prompt_offsets[i]:prompt_offsets[i + 1]`.
+    prompt_groups: The group of each prompt.
+    instruction_groups: The group of each instruction.
+    instruction_prompts: The prompt of each instruction.
+    instruction_ids: The distinct instruction ids.
+    instructions: The index in `instruction_ids` of each instruction.
+    strict: The strict result of each instruction.
+    loose: The loose result of each instruction.
+  """
+
+  def __init__(self, evaluations_dir):
+    self.groups = []
+    offsets, ids, strict, loose = [], [], [], []
+    instruction_start = 0
+    for name in sorted(os.listdir(evaluations_dir)):
+      match = _RESULT_DIR_RE.match(name)
+      output_dir = os.path.join(evaluations_dir, name)
+      if not match or not os.path.isdir(output_dir):
+        continue
+      if not (results_store.exists(output_dir) or os.path.exists(
+          results_store.jsonl_path(output_dir, "strict"))):
+        continue
+      dir_offsets, dir_ids, dir_strict, dir_loose = _load_result_dir(
+          output_dir)
+      if len(dir_offsets) < 2:
+        continue
+      self.groups.append((match["model"], match["language"]))
+      offsets.append(dir_offsets[:-1] + instruction_start)
+      instruction_start += dir_offsets[-1]
+      ids.append(dir_ids)
+      strict.append(dir_strict)
+      loose.append(dir_loose)
+    if not self.groups:
+      raise ValueError(f"No evaluation results in {evaluations_dir}.")
+
+    prompt_sizes = [len(o) for o in offsets]
+    instruction_sizes = [len(s) for s in strict]
+    self.prompt_groups = np.repeat(np.arange(len(self.groups)), prompt_sizes)
+    self.instruction_groups = np.repeat(np.arange(len(self.groups)),
+                                        instruction_sizes)
+    self.prompt_offsets = np.append(np.concatenate(offsets),
+                                    instruction_start)
+    self.group_offsets = np.append(0, np.cumsum(prompt_sizes))
+    self.instruction_prompts = np.repeat(np.arange(len(self.prompt_groups)),
+                                         np.diff(self.prompt_offsets))
+    self.instruction_ids, self.instructions = np.unique(
+        np.concatenate(ids), return_inverse=True)
+    self.strict = np.concatenate(strict)
+    self.loose = np.concatenate(loose)
+
+  def results(self, variant):
+    return self.strict if variant == "strict" else self.loose
+
+  def prompt_counts(self, variant):
+    """Returns the followed and total instructions of each prompt."""
+    followed = np.bincount(self.instruction_prompts,
+                           weights=self.results(variant),
+                           minlength=len(self.prompt_groups))
+    return followed, np.diff(self.prompt_offsets).astype(float)
+
+
+def _tier_accuracies(results, variant, tier_of_instruction, num_tiers):
+  """Returns the `(group, tier)` accuracies and counts of `variant`."""
+  index = results.instruction_groups * num_tiers + tier_of_instruction
+  size = len(results.groups) * num_tiers
+  counts = np.bincount(index, minlength=size)
+  followed = np.bincount(index, weights=results.results(variant),
+                         minlength=size)
+  with np.errstate(invalid="ignore", divide="ignore"):
+    accuracies = followed / counts
+  return (accuracies.reshape(len(results.groups), num_tiers),
+          counts.reshape(len(results.groups), num_tiers))
+
+
+def aggregate(results, bootstrap_samples=1000, confidence=0.95, seed=0):
+  """Computes every accuracy of `results` and its bootstrap interval.
+
+  Args:
+    results: A `Results`.
+    bootstrap_samples: The number of resamples of the prompts of each group,
+      0 to skip the intervals.
+    confidence: The confidence level of the intervals.
+    seed: The seed of the resamples.
+
+  Returns:
+    A list with one dictionary per `(model, language)` group, with the
+    `METRICS` accuracies, their `{metric}_ci` intervals, and the
+    `{variant}_by_group` and `{variant}_tier1` accuracies by instruction group
+    and instruction id. The tier 0 of the reports of `evaluation_main`, the
+    language, is the instruction-level accuracy of the entry.
+  """
+  num_groups = len(results.groups)
+  sizes = np.diff(results.group_offsets)
+  scores = {}
+  counts = {}
+  for variant in results_store.VARIANTS:
+    counts[variant] = results.prompt_counts(variant)
+    followed, total = counts[variant]
+    scores[f"{variant}_prompt"] = (
+        np.bincount(results.prompt_groups, weights=followed == total,
+                    minlength=num_groups)
+        / np.bincount(results.prompt_groups, minlength=num_groups))
+    scores[f"{variant}_instruction"] = (
+        np.bincount(results.prompt_groups, weights=followed,
+                    minlength=num_groups)
+        / np.bincount(results.prompt_groups, weights=total,
+                      minlength=num_groups))
+
+  intervals = {}
+  if bootstrap_samples > 0:
+    rng = np.random.default_rng(seed)
+    # The total instructions, then the followed prompts and instructions of
+    # each variant, by prompt.
+    columns = [counts["strict"][1]]
+    for variant in results_store.VARIANTS:
+      followed, total = counts[variant]
+      columns += [followed == total, followed]
+    columns = np.stack(columns, axis=1)
+    # Sums of `columns` over the resampled prompts, by resample and group.
+    sums = np.empty((bootstrap_samples, num_groups, len(columns[0])))
+    resamples = np.arange(bootstrap_samples)[:, None]
+    for g, (start, end) in enumerate(zip(results.group_offsets[:-1],
+                                         results.group_offsets[1:])):
+      size = end - start
+      samples = rng.integers(0, size, size=(bootstrap_samples, size))
+      # How many times each resample draws each prompt of the group.
+      draws = np.bincount((resamples * size + samples).ravel(),
+                          minlength=bootstrap_samples * size)
+      sums[:, g] = draws.reshape(bootstrap_samples, size) @ columns[start:end]
+
+    quantiles = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    for v, variant in enumerate(results_store.VARIANTS):
+      for metric, resampled in [
+          ("prompt", sums[:, :, 1 + 2 * v] / sizes),
+          ("instruction", sums[:, :, 2 + 2 * v] / sums[:, :, 0])]:
+        intervals[f"{variant}_{metric}"] = np.percentile(
+            resampled, quantiles, axis=0).T
+
+  # The instruction group, e.g. "keywords" of "es:keywords:letter".
+  group_names, group_of_id = np.unique(
+      [i.split(":")[-2] if ":" in i else i
+       for i in results.instruction_ids.tolist()], return_inverse=True)
+  tiers = {}
+  for variant in results_store.VARIANTS:
+    tiers[variant] = {
+        "by_group": _tier_accuracies(results, variant,
+                                     group_of_id[results.instructions],
+                                     len(group_names)) + (group_names,),
+        "tier1": _tier_accuracies(results, variant, results.instructions,
+                                  len(results.instruction_ids))
+                 + (results.instruction_ids,),
+    }
+
+  entries = []
+  for g, (model, language) in enumerate(results.groups):
+    entry = {"model": model, "language": language,
+             "prompts": int(sizes[g])}
+    for metric in METRICS:
+      entry[metric] = float(scores[metric][g])
+      if metric in intervals:
+        entry[f"{metric}_ci"] = intervals[metric][g].tolist()
+    for variant, variant_tiers in tiers.items():
+      for tier, (accuracies, tier_counts, names) in variant_tiers.items():
+        present = tier_counts[g] > 0
+        entry[f"{variant}_{tier}"] = dict(zip(
+            names[present].tolist(), accuracies[g][present].tolist()))
+    entries.append(entry)
+  return entries
+
+
+def leaderboard_table(entries, metric="strict_instruction", show_ci=False):
+  """Returns the Markdown leaderboard of `metric`, in percent.
+
+  Models are sorted by decreasing average over the languages other than
+  English, which is only shown for the models evaluated in all of them.
+  """
+  languages = sorted({entry["language"] for entry in entries},
+                     key=lambda language: (language != "en", language))
+  averaged = [language for language in languages if language != "en"]
+  by_model = {}
+  for entry in entries:
+    by_model.setdefault(entry["model"], {})[entry["language"]] = entry
+
+  def cell(entry):
+    if entry is None:
+      return "-"
+    text = f"{entry[metric] * 100:.1f}"
+    if show_ci and f"{metric}_ci" in entry:
+      low, high = entry[f"{metric}_ci"]
+      text += f" ({low * 100:.1f}-{high * 100:.1f})"
+    return text
+
+  rows = []
+  for model, model_entries in by_model.items():
+    average = None
+    if averaged and all(language in model_entries for language in averaged):
+      average = np.mean([model_entries[language][metric]
+                         for language in averaged])
+    rows.append((model, [cell(model_entries.get(language))
+                         for language in languages], average))
+  rows.sort(key=lambda row: (row[2] is None, -(row[2] or 0), row[0]))
+
+  average_name = "Average ({})".format(
+      "/".join(language.upper() for language in averaged))
+  header = (["Model Name"]
+            + [LANGUAGE_NAMES.get(language, language) for language in languages]
+            + [average_name])
+  table = [header] + [
+      [model] + cells + ["-" if average is None else f"{average * 100:.1f}"]
+      for model, cells, average in rows]
+  widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+  lines = ["| " + " | ".join(
+      value.ljust(widths[i]) if i == 0 else value.rjust(widths[i])
+      for i, value in enumerate(row)) + " |" for row in table]
+  lines.insert(1, "|:" + "-" * (widths[0] + 1) + "|" + "|".join(
+      "-" * (width + 1) + ":" for width in widths[1:]) + "|")
+  return "\n".join(lines)
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError("Too many command-line arguments.")
+
+  entries = aggregate(Results(_EVALUATIONS_DIR.value),
+                      bootstrap_samples=_BOOTSTRAP_SAMPLES.value,
+                      confidence=_CONFIDENCE.value, seed=_SEED.value)
+  print(leaderboard_table(entries, _METRIC.value, _SHOW_CI.value))
+  if _OUTPUT.value:
+    with open(_OUTPUT.value, "w") as f:
+      json.dump(entries, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+  app.run(main)
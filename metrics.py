@@ -0,0 +1,215 @@
+"""Run log of stage durations, throughput and resource use.
+
+Records are appended as JSON lines to a run log (by default
+`metrics/run_log.jsonl`, next to `evaluations/`), one per stage or
+measurement, so that runs can be compared over time. Every record has the
+`run_id` of the run, taken from the `METRICS_RUN_ID` environment variable when
+set so that the subprocesses of a run share it.
+
+Run this module to summarize a run log or convert it to CSV:
+
+  python metrics.py --run_log metrics/run_log.jsonl --csv run_log.csv
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import datetime
+import json
+import os
+import resource
+import sys
+import time
+
+DEFAULT_PATH = "./metrics/run_log.jsonl"
+RUN_ID_ENV = "METRICS_RUN_ID"
+
+
+def new_run_id():
+  return datetime.datetime.now().strftime("%Y%m%d-%H%M%S-") + str(os.getpid())
+
+
+def peak_rss_mb():
+  """Returns the peak resident memory of this process and its children in MiB."""
+  peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+  # `ru_maxrss` is in bytes on macOS and in kilobytes elsewhere.
+  if sys.platform == "darwin":
+    peak_kb /= 1024
+  return round(peak_kb / 1024, 1)
+
+
+def hit_rate(hits, misses):
+  return hits / (hits + misses) if hits + misses else None
+
+
+class RunLog:
+  """Appends metric records to a JSONL run log."""
+
+  def __init__(self, path=DEFAULT_PATH, run_id=None):
+    self.path = path
+    self.run_id = run_id or os.environ.get(RUN_ID_ENV) or new_run_id()
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+  def record(self, kind, **fields):
+    """Appends a record of type `kind` with `fields`."""
+    record = {"run_id": self.run_id, "time": time.time(), "kind": kind}
+    record.update(fields)
+    with open(self.path, "a", encoding="utf-8") as f:
+      f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+  def record_stage(self, stage, seconds, kind="stage", **fields):
+    """Records a stage that took `seconds`, with the current peak memory.
+
+    The `prompts` and `tokens` fields, if any, are also turned into rates.
+    """
+    for counter in ("prompts", "tokens"):
+      if fields.get(counter) is not None and seconds > 0:
+        fields[f"{counter}_per_sec"] = fields[counter] / seconds
+    self.record(kind, stage=stage, seconds=seconds,
+                peak_rss_mb=peak_rss_mb(), **fields)
+
+  @contextlib.contextmanager
+  def stage(self, stage, kind="stage", **fields):
+    """Records the duration and peak memory of the enclosed code.
+
+    The yielded dictionary can be filled with more fields, e.g. the number of
+    prompts.
+
+    Args:
+      stage: The name of the stage, e.g. "load", "generate" or "evaluate".
+      kind: The kind of the record. The stages of the benchmark pipeline,
+        which run the other stages in subprocesses, are of kind "pipeline".
+      **fields: Fields of the record, e.g. the model and language.
+
+    Yields:
+      A dictionary of extra fields of the record.
+    """
+    extra = {}
+    start = time.perf_counter()
+    try:
+      yield extra
+    finally:
+      fields.update(extra)
+      self.record_stage(stage, time.perf_counter() - start, kind, **fields)
+
+  def cache(self, cache, hits, misses, **fields):
+    """Records the hits, misses and hit rate of a cache."""
+    self.record("cache", cache=cache, hits=hits, misses=misses,
+                hit_rate=hit_rate(hits, misses), **fields)
+
+
+def stage(run_log, stage_name, **fields):
+  """Returns `run_log.stage(...)`, or a no-op if `run_log` is None."""
+  if run_log is None:
+    return contextlib.nullcontext({})
+  return run_log.stage(stage_name, **fields)
+
+
+class CheckerTimer:
+  """Accumulates the time spent checking responses, by instruction id."""
+
+  def __init__(self):
+    self.seconds = collections.defaultdict(float)
+    self.calls = collections.defaultdict(int)
+
+  def add(self, instruction_id, seconds, calls=1):
+    self.seconds[instruction_id] += seconds
+    self.calls[instruction_id] += calls
+
+  def update(self, other):
+    """Adds the times of another timer, or of the result of `pop`."""
+    seconds, calls = other if isinstance(other, tuple) else (other.seconds,
+                                                             other.calls)
+    for instruction_id in seconds:
+      self.add(instruction_id, seconds[instruction_id], calls[instruction_id])
+
+  def pop(self):
+    """Returns the accumulated `(seconds, calls)` and resets them."""
+    popped = (dict(self.seconds), dict(self.calls))
+    self.seconds.clear()
+    self.calls.clear()
+    return popped
+
+  def log(self, run_log, **fields):
+    """Records one `checker` record per instruction id."""
+    for instruction_id in sorted(self.seconds):
+      run_log.record("checker", instruction_id=instruction_id,
+                     language=instruction_id.split(":")[0],
+                     seconds=self.seconds[instruction_id],
+                     calls=self.calls[instruction_id], **fields)
+
+
+def read_run_log(path):
+  with open(path, encoding="utf-8") as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def write_csv(records, path):
+  """Writes records to CSV, with one column per field of any record."""
+  columns = []
+  for record in records:
+    columns.extend(c for c in record if c not in columns)
+  with open(path, "w", newline="", encoding="utf-8") as f:
+    writer = csv.DictWriter(f, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(records)
+
+
+def print_summary(records):
+  """Prints the time of each stage, the cache hit rates and the top checkers."""
+  stages = {"pipeline": collections.defaultdict(float),
+            "stage": collections.defaultdict(float)}
+  caches = collections.defaultdict(lambda: [0, 0])
+  checkers = CheckerTimer()
+  for record in records:
+    if record["kind"] in stages:
+      stages[record["kind"]][record["stage"]] += record["seconds"]
+    elif record["kind"] == "cache":
+      caches[record["cache"]][0] += record["hits"]
+      caches[record["cache"]][1] += record["misses"]
+    elif record["kind"] == "checker":
+      checkers.add(record["instruction_id"], record["seconds"],
+                   record["calls"])
+  for kind, kind_stages in stages.items():
+    if not kind_stages:
+      continue
+    total = sum(kind_stages.values())
+    print(f"{kind} seconds share")
+    for stage, seconds in sorted(kind_stages.items(),
+                                 key=lambda item: -item[1]):
+      share = seconds / total if total else 0
+      print(f"{stage} {seconds:.1f} {share:.1%}")
+    print()
+  for cache, (hits, misses) in sorted(caches.items()):
+    rate = hit_rate(hits, misses)
+    print(f"{cache} cache: {hits} hits, {misses} misses"
+          + (f", {rate:.1%} hit rate" if rate is not None else ""))
+  if caches:
+    print()
+  if checkers.seconds:
+    print("instruction_id seconds calls")
+    for instruction_id, seconds in sorted(checkers.seconds.items(),
+                                          key=lambda item: -item[1])[:20]:
+      print(f"{instruction_id} {seconds:.2f} {checkers.calls[instruction_id]}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--run_log", default=DEFAULT_PATH, help="Run log to read.")
+  parser.add_argument("--run_id", default=None,
+                      help="Run to summarize. Defaults to the last run of the log.")
+  parser.add_argument("--csv", default=None,
+                      help="CSV file to write the records to.")
+  args = parser.parse_args()
+
+  run_log_records = read_run_log(args.run_log)
+  if args.csv:
+    write_csv(run_log_records, args.csv)
+  if run_log_records:
+    run_id = args.run_id or run_log_records[-1]["run_id"]
+    print(f"run {run_id}")
+    print_summary([r for r in run_log_records if r["run_id"] == run_id])
@@ -1,8 +1,12 @@
 import os
+import json
+import warnings
 from typing import Dict, List, Optional
-from openai import AsyncOpenAI, BadRequestError, OpenAI
+from openai import NOT_GIVEN, AsyncOpenAI, BadRequestError, OpenAI
 from tenacity import retry, stop_after_attempt, wait_fixed
 
+from response_cache import ResponseCache, normalize_params
+
 VLLM_BASE_URL = os.environ.get("VLLM_BASE_URL", "http://10.100.0.111:8020/v1")
 VLLM_API_KEY  = os.environ.get("VLLM_API_KEY", "no-key-needed")
 
@@ -14,6 +18,21 @@ STOP_STRINGS      = ["<|im_end|>", "<|end_of_text|>"]
 STOP_TOKEN_IDS    = None
 LOGITS_PROCESSORS: List[str] = []
 
+# Semente opcional da amostragem: com ela a mesma conversa gera a mesma resposta.
+RESP_SEED = os.environ.get("RESP_SEED")
+RESP_SEED = int(RESP_SEED) if RESP_SEED else None
+
+# Cache de respostas opcional, só com temperatura 0 ou com RESP_SEED: com amostragem
+# sem semente ele repetiria sempre a primeira amostra.
+RESP_CACHE_PATH = os.environ.get("RESP_CACHE_PATH")
+response_cache = None
+if RESP_CACHE_PATH:
+    if RESP_TEMPERATURE > 0 and RESP_SEED is None:
+        warnings.warn(f"RESP_CACHE_PATH ignorado: RESP_TEMPERATURE={RESP_TEMPERATURE} > 0 "
+                      "sem RESP_SEED, o cache repetiria a primeira amostra.")
+    else:
+        response_cache = ResponseCache(RESP_CACHE_PATH)
+
 client = OpenAI(base_url=VLLM_BASE_URL, api_key=VLLM_API_KEY)
 
 def get_model_id() -> str:
@@ -47,15 +66,36 @@ def chat_call(
         for k, v in extra_body_override.items():
             extra_body[k] = v
 
+    # Com amostragem sem semente cada chamada deve gerar uma nova resposta; com
+    # semente a amostra faz parte da chave.
+    use_cache = response_cache is not None and (temperature <= 0 or RESP_SEED is not None)
+    if use_cache:
+        params = normalize_params({
+            "api": "openai.chat.completions",
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "seed": RESP_SEED,
+            "extra_body": extra_body,
+        })
+        key = ResponseCache.key(model_id, params, json.dumps(final_messages, ensure_ascii=False))
+        cached = response_cache.get_many([key])
+        if key in cached:
+            return cached[key]
+
     resp = client.chat.completions.create(
         model=model_id,
         messages=final_messages,
         temperature=temperature,
         top_p=top_p,
         max_tokens=max_tokens,
+        seed=NOT_GIVEN if RESP_SEED is None else RESP_SEED,
         extra_body=extra_body,
     )
-    return resp.choices[0].message.content or ""
+    content = resp.choices[0].message.content or ""
+    if use_cache:
+        response_cache.put_many(model_id, params, {key: content})
+    return content
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(0.1))
 def safe_chat_call(
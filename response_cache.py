@@ -0,0 +1,114 @@
+"""Persistent cache of generated responses, shared by models and runs.
+
+A response is stored under a digest of the model id, the normalized sampling
+parameters and the prompt, so regenerating data for unchanged models only
+generates the prompts that are new.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+
+DEFAULT_PATH = "./cache/response_cache.sqlite"
+
+# `SamplingParams` attributes that change what vLLM generates.
+_VLLM_SAMPLING_FIELDS = [
+    "n", "best_of", "presence_penalty", "frequency_penalty", "repetition_penalty",
+    "temperature", "top_p", "top_k", "min_p", "seed", "stop", "stop_token_ids",
+    "ignore_eos", "max_tokens", "min_tokens", "skip_special_tokens",
+]
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def normalize_params(params):
+    """Returns sampling parameters as canonical JSON, ignoring unset ones."""
+    params = {name: value for name, value in params.items() if value is not None}
+    # Integral floats such as `temperature=0.0` and `temperature=0` are the same.
+    params = {name: int(value) if isinstance(value, float) and value.is_integer() else value
+              for name, value in params.items()}
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+def vllm_sampling_params(sampling_params):
+    """Returns the attributes of a vLLM `SamplingParams` that matter for caching."""
+    return {name: getattr(sampling_params, name) for name in _VLLM_SAMPLING_FIELDS
+            if hasattr(sampling_params, name)}
+
+
+class ResponseCache:
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key BLOB PRIMARY KEY, model TEXT NOT NULL, params TEXT NOT NULL, "
+            "response TEXT NOT NULL) WITHOUT ROWID")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_id, params, prompt):
+        """Returns the cache key of `prompt`; `params` is from `normalize_params`."""
+        return _digest("\n".join([model_id, params, _digest(prompt).hex()]))
+
+    def get_many(self, keys):
+        """Returns a dictionary of the cached responses of `keys`."""
+        keys = list(keys)
+        responses = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT key, response FROM responses WHERE key IN ({','.join('?' * len(batch))})",
+                batch)
+            responses.update(rows)
+        self.hits += len(responses)
+        self.misses += len(keys) - len(responses)
+        return responses
+
+    def put_many(self, model_id, params, responses):
+        """Stores a dictionary of responses by key."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO responses (key, model, params, response) VALUES (?, ?, ?, ?)",
+                [(key, model_id, params, response) for key, response in responses.items()])
+
+    def cached(self, generate_fn, model_id, params):
+        """Wraps `generate_fn` to only generate the prompts missing from the cache.
+
+        Args:
+            generate_fn: A function returning the list of responses to a list of prompts.
+            model_id: The model generating the responses.
+            params: A dictionary of the parameters that change the responses.
+
+        Returns:
+            A function with the signature of `generate_fn`.
+        """
+        params = normalize_params(params)
+
+        def generate(prompts):
+            prompts = list(prompts)
+            keys = [self.key(model_id, params, prompt) for prompt in prompts]
+            responses = self.get_many(keys)
+            missing = [i for i, key in enumerate(keys) if key not in responses]
+            if missing:
+                generated = generate_fn([prompts[i] for i in missing])
+                new_responses = {keys[i]: response for i, response in zip(missing, generated)}
+                # Failed requests return None and are retried on the next run.
+                self.put_many(model_id, params, {key: response for key, response in new_responses.items()
+                                                 if response is not None})
+                responses.update(new_responses)
+            return [responses[key] for key in keys]
+
+        return generate
+
+    def close(self):
+        self._connection.close()
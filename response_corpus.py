@@ -0,0 +1,162 @@
+"""Responses of a response file packed into one shared memory segment.
+
+The worker pool of `evaluation_main` would otherwise pickle every response to
+the worker checking it. A `ResponseCorpus` packs the responses once, as UTF-8
+text, into a `multiprocessing.shared_memory` segment that every worker
+attaches to by name, so that a task only carries the position of its prompt:
+
+  header    int64[2]       The number of responses and the size of the text.
+  offsets   int64[n + 1]   Response `i` is `text[offsets[i]:offsets[i + 1]]`.
+  missing   bool[n]        Whether prompt `i` has no response.
+  text      uint8[...]     The UTF-8 responses, back to back.
+
+The responses are addressed by the position of their prompt in the input
+file rather than by key, as the keys of a file need not be unique.
+
+The arrays are NumPy views of the segment, and `view` returns a zero-copy
+`memoryview` of a response, so attaching costs the same whatever the size of
+the corpus and the number of workers.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_INT64_SIZE = np.dtype(np.int64).itemsize
+
+
+def _layout(size):
+  """Returns the byte offsets of the arrays of a corpus of `size` responses."""
+  offsets = 2 * _INT64_SIZE
+  missing = offsets + (size + 1) * _INT64_SIZE
+  text = missing + size
+  return offsets, missing, text
+
+
+class ResponseCorpus:
+  """Responses by prompt position, in a shared memory segment.
+
+  Create a corpus with `create` and release it with `unlink`, or use it as a
+  context manager. Other processes open it with `attach(corpus.name)`.
+  """
+
+  def __init__(self, shm, owner=False):
+    self._shm = shm
+    self._owner = owner
+    header = np.ndarray((2,), np.int64, shm.buf)
+    size, text_size = (int(value) for value in header)
+    offsets_start, missing_start, text_start = _layout(size)
+    self.offsets = np.ndarray((size + 1,), np.int64, shm.buf, offsets_start)
+    self.missing = np.ndarray((size,), np.bool_, shm.buf, missing_start)
+    self._text = shm.buf[text_start:text_start + text_size]
+
+  @classmethod
+  def create(cls, responses):
+    """Packs responses into a new shared memory segment.
+
+    Args:
+      responses: An iterable of responses, e.g. those of the pairs of
+        `ResponseIndex.iter_pairs` in the order of the inputs. A None or other
+        non-str response is kept as missing.
+
+    Returns:
+      The `ResponseCorpus`, which owns the segment.
+    """
+    encoded_responses = [
+        None if not isinstance(response, str)
+        else response.encode("utf-8", "surrogatepass")
+        for response in responses
+    ]
+    size = len(encoded_responses)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum([len(encoded or b"") for encoded in encoded_responses],
+              out=offsets[1:])
+    text_size = int(offsets[-1])
+    offsets_start, missing_start, text_start = _layout(size)
+    # A segment cannot be empty.
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=max(1, text_start + text_size))
+    try:
+      np.ndarray((2,), np.int64, shm.buf)[:] = (size, text_size)
+      np.ndarray(offsets.shape, np.int64, shm.buf, offsets_start)[:] = offsets
+      np.ndarray((size,), np.bool_, shm.buf, missing_start)[:] = [
+          encoded is None for encoded in encoded_responses]
+      for encoded, start in zip(encoded_responses, offsets.tolist()):
+        if encoded:
+          shm.buf[text_start + start:text_start + start + len(encoded)] = (
+              encoded)
+    except BaseException:
+      shm.close()
+      shm.unlink()
+      raise
+    return cls(shm, owner=True)
+
+  @classmethod
+  def attach(cls, name):
+    """Returns the corpus of the segment `name`, created by another process."""
+    return cls(shared_memory.SharedMemory(name=name))
+
+  @property
+  def name(self):
+    """The name of the shared memory segment, to `attach` to."""
+    return self._shm.name
+
+  def __len__(self):
+    return len(self.missing)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.unlink()
+
+  def __del__(self):
+    # Before the segment itself is collected, which fails while the arrays
+    # still export its buffer.
+    self.close()
+
+  def __reduce__(self):
+    # Pickled by name, e.g. as an argument of a worker pool initializer.
+    return type(self).attach, (self.name,)
+
+  def view(self, position):
+    """Returns a zero-copy `memoryview` of the UTF-8 response at `position`.
+
+    Returns:
+      The view, or None if the prompt has no response.
+
+    Raises:
+      IndexError: If `position` is out of range.
+    """
+    if not 0 <= position < len(self):
+      raise IndexError(f"Position {position} out of range of a corpus of "
+                       f"{len(self)} responses.")
+    if self.missing[position]:
+      return None
+    return self._text[self.offsets[position]:self.offsets[position + 1]]
+
+  def get(self, position):
+    """Returns the response at `position`, None if the prompt has none."""
+    view = self.view(position)
+    if view is None:
+      return None
+    return str(view, "utf-8", "surrogatepass")
+
+  def close(self):
+    """Detaches from the segment, after which the corpus cannot be read."""
+    if self._shm is None:
+      return
+    # The arrays and views export the buffer of the segment, which cannot be
+    # closed while they are alive, so views returned by `view` must be
+    # released first.
+    self._text.release()
+    self.offsets = self.missing = self._text = None
+    self._shm.close()
+    self._shm = None
+
+  def unlink(self):
+    """Closes the corpus and, in the creating process, frees the segment."""
+    shm = self._shm
+    self.close()
+    if shm is not None and self._owner:
+      shm.unlink()
@@ -0,0 +1,155 @@
+"""Index of a response jsonl file for joining responses to inputs.
+
+Responses are matched to inputs by `key` when the response file has one and
+otherwise by a digest of the whitespace-normalized prompt. Only the line
+offsets are kept in memory, in sorted arrays; the responses themselves are read
+from the file when they are needed.
+"""
+
+import array
+import bisect
+import hashlib
+import json
+
+from absl import logging
+
+
+def prompt_digest(prompt):
+  """Returns a 64-bit digest of `prompt` that ignores whitespace changes."""
+  normalized = " ".join(prompt.split()).encode("utf-8")
+  return int.from_bytes(
+      hashlib.blake2b(normalized, digest_size=8).digest(), "little")
+
+
+class _SortedOffsets:
+  """Maps integer ids to file offsets with two parallel sorted arrays.
+
+  When an id appears more than once the last offset wins, as it did with the
+  prompt to response dictionary; the offsets that lost are in `duplicates`.
+  """
+
+  def __init__(self, ids, offsets):
+    # The sort is stable, so equal ids stay in file order.
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    self.ids = array.array(ids.typecode)
+    self.offsets = array.array("q")
+    self.duplicates = []
+    for i in order:
+      if self.ids and self.ids[-1] == ids[i]:
+        self.duplicates.append(self.offsets[-1])
+        self.offsets[-1] = offsets[i]
+      else:
+        self.ids.append(ids[i])
+        self.offsets.append(offsets[i])
+
+  def __len__(self):
+    return len(self.ids)
+
+  def get(self, id_):
+    i = bisect.bisect_left(self.ids, id_)
+    if i < len(self.ids) and self.ids[i] == id_:
+      return self.offsets[i]
+    return None
+
+
+class ResponseIndex:
+  """Offsets of the responses of a jsonl file, by key and by prompt digest."""
+
+  def __init__(self, input_jsonl_filename):
+    self.filename = input_jsonl_filename
+    self._file = None
+
+    keys = array.array("q")
+    key_offsets = array.array("q")
+    digests = array.array("Q")
+    digest_offsets = array.array("q")
+    with open(input_jsonl_filename, "rb") as f:
+      offset = 0
+      for line in f:
+        if line.strip():
+          example = json.loads(line)
+          if example.get("key") is not None:
+            keys.append(example["key"])
+            key_offsets.append(offset)
+          digests.append(prompt_digest(example["prompt"]))
+          digest_offsets.append(offset)
+        offset += len(line)
+
+    self._by_key = _SortedOffsets(keys, key_offsets)
+    self._by_digest = _SortedOffsets(digests, digest_offsets)
+
+  def __len__(self):
+    return len(self._by_digest)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state["_file"] = None
+    return state
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+  def _offset(self, inp):
+    if len(self._by_key) and inp.key is not None:
+      offset = self._by_key.get(inp.key)
+      if offset is not None:
+        return offset
+    return self._by_digest.get(prompt_digest(inp.prompt))
+
+  def __contains__(self, inp):
+    return self._offset(inp) is not None
+
+  def _file_handle(self):
+    if self._file is None:
+      self._file = open(self.filename, "rb")
+    return self._file
+
+  def _read(self, offset):
+    f = self._file_handle()
+    f.seek(offset)
+    return json.loads(f.readline())["response"]
+
+  def get(self, inp, default=None):
+    """Returns the response to the `InputExample` `inp`, read from the file."""
+    offset = self._offset(inp)
+    if offset is None:
+      return default
+    return self._read(offset)
+
+  def iter_pairs(self, inputs):
+    """Yields `(input, response)` for `inputs`, reading responses on demand.
+
+    Inputs without a response get a `None` response, which fails every
+    instruction, and are logged once all inputs have been joined.
+    """
+    missing = []
+    for inp in inputs:
+      offset = self._offset(inp)
+      if offset is None:
+        missing.append(inp.key)
+        yield inp, None
+      else:
+        yield inp, self._read(offset)
+    self.close()
+    if missing:
+      logging.warning("%d prompts have no response in %s, keys: %s",
+                      len(missing), self.filename, missing)
+
+  def log_duplicates(self, limit=10):
+    """Logs the responses overridden by a later one with the same key/prompt."""
+    # Responses with a key are matched by key, so their prompts may repeat.
+    by_key = bool(len(self._by_key))
+    offsets = (self._by_key if by_key else self._by_digest).duplicates
+    if not offsets:
+      return
+    examples = []
+    for offset in sorted(offsets)[:limit]:
+      self._file_handle().seek(offset)
+      example = json.loads(self._file.readline())
+      examples.append(example["key"] if by_key else example["prompt"][:50])
+    self.close()
+    logging.warning("%d duplicate %s in %s, the last responses are used: %s",
+                    len(offsets), "keys" if by_key else "prompts",
+                    self.filename, examples)
@@ -0,0 +1,175 @@
+"""Persistent cache of checker results, for re-evaluations after checker fixes.
+
+A result is stored under a digest of the instruction id, its canonical
+arguments, the response, the strict/loose variant and a fingerprint of the
+checker source. Patching a checker class changes its fingerprint, so only the
+results of that checker are recomputed; so does patching the language util
+module the checker uses. Changes to other module-level code of
+`instructions/*_instructions.py` are not tracked: delete the cache file after
+such a change.
+"""
+
+import ast
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import sys
+
+STRICT = "strict"
+LOOSE = "loose"
+
+
+def _digest(data):
+  return hashlib.blake2b(data.encode("utf-8", "surrogatepass"),
+                         digest_size=16).digest()
+
+
+def _json_default(o):
+  if isinstance(o, (set, frozenset)):
+    return sorted(o)
+  return repr(o)
+
+
+def canonical_kwargs(kwargs):
+  """Returns `kwargs` as a JSON string independent of order and unset args."""
+  return json.dumps({k: v for k, v in (kwargs or {}).items() if v is not None},
+                    sort_keys=True, ensure_ascii=False, default=_json_default)
+
+
+def _batches(keys, size=500):
+  # Stays well below the SQLite limit on the number of query parameters.
+  for start in range(0, len(keys), size):
+    yield keys[start:start + size]
+
+
+@functools.lru_cache(maxsize=None)
+def _module_sources(module_name):
+  """Returns the source of a module and of each of its top-level classes."""
+  source = inspect.getsource(sys.modules[module_name])
+  lines = source.splitlines(keepends=True)
+  # Parses the module once, `inspect.getsource` would do it for every class.
+  classes = {
+      node.name: "".join(lines[node.lineno - 1:node.end_lineno])
+      for node in ast.parse(source).body if isinstance(node, ast.ClassDef)
+  }
+  return source, classes
+
+
+@functools.lru_cache(maxsize=None)
+def checker_fingerprint(instruction_cls):
+  """Returns a digest of the source of a checker class and what it relies on.
+
+  Covers the class, its base classes and the `instruction_utils` modules
+  imported by the module defining it.
+  """
+  sources = []
+  for cls in inspect.getmro(instruction_cls):
+    if cls is not object:
+      sources.append(_module_sources(cls.__module__)[1][cls.__qualname__])
+  module = sys.modules[instruction_cls.__module__]
+  for name, value in sorted(vars(module).items()):
+    if (inspect.ismodule(value)
+        and value.__name__.startswith("instruction_utils.")):
+      sources.append(_module_sources(value.__name__)[0])
+  return _digest("\n".join(sources)).hex()
+
+
+class ResultCache:
+  """SQLite store of checker results shared by the evaluation processes.
+
+  Each process opens its own connection on first use, so a cache created
+  before the worker processes are forked can be used in all of them.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._connection = None
+    self._pid = None
+    self.hits = 0
+    self.misses = 0
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state["_connection"] = None
+    state["_pid"] = None
+    return state
+
+  def _connect(self):
+    if self._connection is None or self._pid != os.getpid():
+      directory = os.path.dirname(self.path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self._connection = sqlite3.connect(self.path, timeout=60)
+      self._connection.execute("PRAGMA journal_mode=WAL")
+      self._connection.execute("PRAGMA synchronous=NORMAL")
+      self._connection.execute(
+          "CREATE TABLE IF NOT EXISTS results "
+          "(key BLOB PRIMARY KEY, followed INTEGER NOT NULL) WITHOUT ROWID")
+      self._pid = os.getpid()
+    return self._connection
+
+  def keys(self, instruction, kwargs, response):
+    """Returns the strict and loose cache keys of a checker and a response.
+
+    Args:
+      instruction: A checker built with `kwargs`.
+      kwargs: The arguments of the instruction in the input data.
+      response: The response to check.
+
+    Returns:
+      A `{STRICT: key, LOOSE: key}` dictionary.
+    """
+    prefix = "\n".join([
+        instruction.id,
+        checker_fingerprint(type(instruction)),
+        canonical_kwargs(kwargs),
+        # Includes the arguments drawn at random and the prompt, for checkers
+        # that depend on it.
+        canonical_kwargs(instruction.get_instruction_args()),
+        _digest(response).hex(),
+    ])
+    return {variant: _digest(prefix + "\n" + variant)
+            for variant in (STRICT, LOOSE)}
+
+  def get_many(self, keys):
+    """Returns a dictionary of the cached results of `keys`."""
+    keys = list(keys)
+    results = {}
+    connection = self._connect()
+    for batch in _batches(keys):
+      rows = connection.execute(
+          "SELECT key, followed FROM results WHERE key IN "
+          f"({','.join('?' * len(batch))})", batch)
+      results.update((key, bool(followed)) for key, followed in rows)
+    self.hits += len(results)
+    self.misses += len(keys) - len(results)
+    return results
+
+  def contains_all(self, keys):
+    """Returns whether all of `keys` are cached, without counting hits."""
+    keys = set(keys)
+    connection = self._connect()
+    found = 0
+    for batch in _batches(list(keys)):
+      found += connection.execute(
+          "SELECT COUNT(*) FROM results WHERE key IN "
+          f"({','.join('?' * len(batch))})", batch).fetchone()[0]
+    return found == len(keys)
+
+  def put_many(self, results):
+    """Stores a dictionary of results by key."""
+    if not results:
+      return
+    connection = self._connect()
+    with connection:
+      connection.executemany(
+          "INSERT OR REPLACE INTO results (key, followed) VALUES (?, ?)",
+          ((key, int(followed)) for key, followed in results.items()))
+
+  def close(self):
+    if self._connection is not None:
+      self._connection.close()
+      self._connection = None
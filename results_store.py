@@ -0,0 +1,295 @@
+"""Compact columnar store of the evaluation results.
+
+The `eval_results_{strict,loose}.jsonl` files repeat the prompt and the
+response in every record of both files. The store keeps the strict and the
+loose result of every instruction once, in packed NumPy arrays, and refers to
+the prompts and responses by key into the input and response files:
+
+  {output_dir}/results/
+    meta.json           The input and response files and the instruction ids.
+    keys.npy            int64, the key of each prompt.
+    prompt_digests.npy  uint64, the `response_index.prompt_digest` of each
+                        prompt, to check that the input data is unchanged.
+    offsets.npy         int64, where the instructions of each prompt start.
+    instructions.npy    uint16, the index in `meta.json` of each instruction.
+    strict.npy          bool, the strict result of each instruction.
+    loose.npy           bool, the loose result of each instruction.
+
+The arrays are memory-mapped when the store is loaded. Run this module to
+export stores to the legacy JSONL files, or to convert legacy JSONL files to
+stores:
+
+  python results_store.py --export evaluations/en_input_response_data_MODEL
+  python results_store.py --convert --input_data data/en_input_data.jsonl \
+      --input_response_data data/en_input_response_data_MODEL.jsonl \
+      evaluations/en_input_response_data_MODEL
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import response_index
+
+RESULTS_DIR = "results"
+VARIANTS = ("strict", "loose")
+
+_FORMAT_VERSION = 1
+_ARRAYS = {
+    "keys": np.int64,
+    "prompt_digests": np.uint64,
+    "offsets": np.int64,
+    "instructions": np.uint16,
+    "strict": np.bool_,
+    "loose": np.bool_,
+}
+
+
+def store_dir(output_dir):
+  """Returns the store directory of the results of `output_dir`."""
+  return os.path.join(output_dir, RESULTS_DIR)
+
+
+def jsonl_path(output_dir, variant):
+  """Returns the legacy `eval_results_{variant}.jsonl` of `output_dir`."""
+  return os.path.join(output_dir, f"eval_results_{variant}.jsonl")
+
+
+class ResultsWriter:
+  """Accumulates the results of prompts and writes them as a store.
+
+  Only the keys and the results are kept in memory, a few bytes per
+  instruction, so the writer also fits the streaming evaluation.
+  """
+
+  def __init__(self, output_dir, input_data, response_data):
+    self.output_dir = output_dir
+    self.input_data = input_data
+    self.response_data = response_data
+    self._instruction_ids = {}
+    self._columns = {name: [] for name in _ARRAYS}
+    self._columns["offsets"].append(0)
+
+  def __len__(self):
+    return len(self._columns["keys"])
+
+  def add(self, key, strict, loose):
+    """Adds the strict and loose `OutputExample` of the prompt with `key`."""
+    self._columns["keys"].append(key)
+    self._columns["prompt_digests"].append(
+        response_index.prompt_digest(strict.prompt))
+    self._columns["instructions"].extend(
+        self._instruction_ids.setdefault(instruction_id,
+                                         len(self._instruction_ids))
+        for instruction_id in strict.instruction_id_list)
+    self._columns["strict"].extend(strict.follow_instruction_list)
+    self._columns["loose"].extend(loose.follow_instruction_list)
+    self._columns["offsets"].append(len(self._columns["strict"]))
+
+  def write(self):
+    """Writes the store and returns its directory."""
+    directory = store_dir(self.output_dir)
+    os.makedirs(directory, exist_ok=True)
+    for name, dtype in _ARRAYS.items():
+      np.save(os.path.join(directory, name + ".npy"),
+              np.array(self._columns[name], dtype=dtype))
+    # Written last, a store without it is incomplete.
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+      json.dump({
+          "version": _FORMAT_VERSION,
+          "input_data": self.input_data,
+          "response_data": self.response_data,
+          "instruction_ids": list(self._instruction_ids),
+      }, f, indent=2)
+    return directory
+
+
+def _iter_input_records(input_data):
+  with open(input_data, encoding="utf-8") as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+class _Input:
+  """The fields of an `InputExample` that `ResponseIndex` matches on."""
+
+  def __init__(self, key, prompt):
+    self.key = key
+    self.prompt = prompt
+
+
+class EvaluationResults:
+  """The results of a response file, loaded from a store.
+
+  Attributes:
+    keys: The key of each prompt.
+    offsets: The instructions of prompt `i` are `offsets[i]:offsets[i + 1]`.
+    instructions: The index in `instruction_ids` of each instruction.
+    instruction_ids: The instruction ids, as a NumPy array of strings.
+    strict: The strict result of each instruction.
+    loose: The loose result of each instruction.
+    input_data: The input file the keys refer to.
+    response_data: The response file the results are of.
+  """
+
+  def __init__(self, output_dir, mmap_mode="r"):
+    directory = store_dir(output_dir)
+    with open(os.path.join(directory, "meta.json")) as f:
+      meta = json.load(f)
+    if meta["version"] != _FORMAT_VERSION:
+      raise ValueError(f"Unsupported results store version {meta['version']} "
+                       f"in {directory}.")
+    self.output_dir = output_dir
+    self.input_data = meta["input_data"]
+    self.response_data = meta["response_data"]
+    self.instruction_ids = np.array(meta["instruction_ids"], dtype=str)
+    for name in _ARRAYS:
+      setattr(self, name, np.load(os.path.join(directory, name + ".npy"),
+                                  mmap_mode=mmap_mode))
+
+  def __len__(self):
+    return len(self.keys)
+
+  def results(self, variant):
+    """Returns the result of each instruction in `variant`."""
+    if variant not in VARIANTS:
+      raise ValueError(f"Unknown variant {variant!r}, expected one of "
+                       f"{VARIANTS}.")
+    return getattr(self, variant)
+
+  def follow_all(self, variant):
+    """Returns whether each prompt follows all its instructions."""
+    failures = np.concatenate(
+        [[0], np.cumsum(~self.results(variant), dtype=np.int64)])
+    return failures[self.offsets[1:]] == failures[self.offsets[:-1]]
+
+  def accuracy(self, variant):
+    """Returns the prompt-level and instruction-level accuracy of `variant`."""
+    return (float(self.follow_all(variant).mean()),
+            float(self.results(variant).mean()))
+
+  def iter_records(self, variant, input_data=None, response_data=None):
+    """Yields the legacy JSONL records of `variant`.
+
+    Args:
+      variant: "strict" or "loose".
+      input_data: The input file, instead of the one the store refers to.
+      response_data: The response file, instead of the one the store refers
+        to.
+
+    Yields:
+      The records of `eval_results_{variant}.jsonl`, in the order of the
+      evaluation.
+
+    Raises:
+      ValueError: If a prompt of the store is missing from the input file or
+        has changed.
+    """
+    results = self.results(variant)
+    prompts = {record["key"]: record["prompt"]
+               for record in _iter_input_records(input_data or self.input_data)}
+    index = response_index.ResponseIndex(response_data or self.response_data)
+    try:
+      for i, key in enumerate(self.keys.tolist()):
+        prompt = prompts.get(key)
+        if (prompt is None or response_index.prompt_digest(prompt)
+            != int(self.prompt_digests[i])):
+          raise ValueError(f"The prompt of key {key} is missing from or has "
+                           "changed in the input data.")
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        follow_instruction_list = results[start:end].tolist()
+        # In the field order of `evaluation_main.write_output`.
+        yield {
+            "follow_all_instructions": all(follow_instruction_list),
+            "follow_instruction_list": follow_instruction_list,
+            "instruction_id_list": self.instruction_ids[
+                self.instructions[start:end]].tolist(),
+            "prompt": prompt,
+            "response": index.get(_Input(key, prompt)),
+        }
+    finally:
+      index.close()
+
+
+def load(output_dir, mmap_mode="r"):
+  """Returns the `EvaluationResults` of the store of `output_dir`."""
+  return EvaluationResults(output_dir, mmap_mode=mmap_mode)
+
+
+def exists(output_dir):
+  return os.path.exists(os.path.join(store_dir(output_dir), "meta.json"))
+
+
+def export_jsonl(output_dir, input_data=None, response_data=None):
+  """Writes the legacy `eval_results_*.jsonl` files of a store.
+
+  Returns:
+    The paths of the written files.
+  """
+  results = load(output_dir)
+  paths = []
+  for variant in VARIANTS:
+    path = jsonl_path(output_dir, variant)
+    with open(path, "w") as f:
+      for record in results.iter_records(variant, input_data, response_data):
+        f.write(json.dumps(record))
+        f.write("\n")
+    paths.append(path)
+  return paths
+
+
+def convert_jsonl(output_dir, input_data, response_data):
+  """Writes the store of the legacy `eval_results_*.jsonl` files of a dir.
+
+  The records are matched to the keys of `input_data` by prompt.
+
+  Returns:
+    The directory of the store.
+  """
+  keys = {response_index.prompt_digest(record["prompt"]): record["key"]
+          for record in _iter_input_records(input_data)}
+  writer = ResultsWriter(output_dir, input_data, response_data)
+  with open(jsonl_path(output_dir, "strict"), encoding="utf-8") as strict_f, \
+      open(jsonl_path(output_dir, "loose"), encoding="utf-8") as loose_f:
+    for strict_line, loose_line in zip(strict_f, loose_f):
+      strict = argparse.Namespace(**json.loads(strict_line))
+      loose = argparse.Namespace(**json.loads(loose_line))
+      key = keys.get(response_index.prompt_digest(strict.prompt))
+      if key is None:
+        raise ValueError(f"A prompt of {output_dir} is not in {input_data}.")
+      writer.add(key, strict, loose)
+  return writer.write()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("output_dirs", nargs="+",
+                      help="Directories of the evaluation results.")
+  mode = parser.add_mutually_exclusive_group(required=True)
+  mode.add_argument("--export", action="store_true",
+                    help="Writes the legacy JSONL files of the stores.")
+  mode.add_argument("--convert", action="store_true",
+                    help="Writes the stores of the legacy JSONL files.")
+  parser.add_argument("--input_data", default=None,
+                      help="Input file, required by --convert. Overrides the "
+                           "one of the store with --export.")
+  parser.add_argument("--input_response_data", default=None,
+                      help="Response file, required by --convert. Overrides "
+                           "the one of the store with --export.")
+  args = parser.parse_args()
+
+  if args.convert and not (args.input_data and args.input_response_data
+                           and len(args.output_dirs) == 1):
+    parser.error("--convert requires --input_data, --input_response_data and "
+                 "a single directory.")
+  for directory in args.output_dirs:
+    if args.export:
+      for exported in export_jsonl(directory, args.input_data,
+                                   args.input_response_data):
+        print(f"Generated: {exported}")
+    else:
+      print("Generated: " + convert_jsonl(directory, args.input_data,
+                                         args.input_response_data))
@@ -3,25 +3,26 @@ import argparse
 import torch
 import gc
 import sys
+import time
 import traceback
+from glob import glob
 from datasets import load_dataset
 from vllm import LLM, SamplingParams
 
-def run_model_inference(model_name):
-    print(f"\n[WORKER] Iniciando: {model_name}")
+import metrics
+from generation_checkpoint import GenerationCheckpoint, generate_all, prompt_keys
+from response_cache import DEFAULT_PATH, ResponseCache, vllm_sampling_params
 
-    # 1. Limpeza
-    gc.collect()
-    torch.cuda.empty_cache()
+MAX_MODEL_LEN = 4096
 
-    # 2. Carregar Modelo
+def load_model(model_name):
+    print(f"[WORKER] Carregando vLLM...")
     try:
-        print(f"[WORKER] Carregando vLLM...")
-        llm = LLM(
+        return LLM(
             model=model_name,
             trust_remote_code=True,
             gpu_memory_utilization=0.90,
-            max_model_len=4096,
+            max_model_len=MAX_MODEL_LEN,
             enforce_eager=True,
             tensor_parallel_size=1,
             device="cuda"
@@ -31,53 +32,112 @@ def run_model_inference(model_name):
         traceback.print_exc()
         sys.exit(1)
 
+def find_input_file(data_dir, language):
+    # Prioridade para o arquivo limpo
+    for suffix in ("_FINAL_CLEAN", "_clean", ""):
+        input_file = f"{language}_input_data{suffix}.jsonl"
+        if os.path.exists(os.path.join(data_dir, input_file)):
+            return input_file
+    return None
+
+def find_languages(data_dir):
+    paths = glob(os.path.join(data_dir, "*_input_data*.jsonl"))
+    return sorted({os.path.basename(path).split("_input_data")[0] for path in paths})
+
+def run_model_inference(model_name, response_cache_path=DEFAULT_PATH, all_languages=False,
+                        checkpoint_every=2048, run_log_path=""):
+    print(f"\n[WORKER] Iniciando: {model_name}")
+    run_log = metrics.RunLog(run_log_path) if run_log_path else None
+
+    # 1. Limpeza
+    with metrics.stage(run_log, "cleanup", model=model_name):
+        gc.collect()
+        torch.cuda.empty_cache()
+
+    # 2. Modelo: carregado só quando algum prompt não está no cache de respostas
+    llm = None
     sampling_params = SamplingParams(temperature=0.0, max_tokens=2048)
 
-    # 3. Identificar arquivo de dados
+    # 3. Identificar arquivos de dados
     data_dir = "./data"
-    input_file = None
+    languages = find_languages(data_dir) if all_languages else ["pt"]
+    input_files = {language: find_input_file(data_dir, language) for language in languages}
+    input_files = {language: input_file for language, input_file in input_files.items() if input_file}
 
-    # Prioridade para o arquivo limpo
-    if os.path.exists(os.path.join(data_dir, "pt_input_data_FINAL_CLEAN.jsonl")):
-        input_file = "pt_input_data_FINAL_CLEAN.jsonl"
-    elif os.path.exists(os.path.join(data_dir, "pt_input_data_clean.jsonl")):
-        input_file = "pt_input_data_clean.jsonl"
-    elif os.path.exists(os.path.join(data_dir, "pt_input_data.jsonl")):
-        input_file = "pt_input_data.jsonl"
-
-    if not input_file:
+    if not input_files:
         print(f"❌ Nenhum arquivo de input encontrado em {data_dir}")
         sys.exit(1)
 
-    input_path = os.path.join(data_dir, input_file)
-    print(f"[WORKER] Usando arquivo de entrada: {input_file}")
-
     # 4. Processamento
     try:
-        ds = load_dataset("json", data_files={"train": input_path}, split="train")
-
-        # Detecta coluna de prompt
-        col_names = ds.column_names
-        prompt_col = "prompt"
-        if "prompt" not in col_names:
-            for c in ["instruction", "pergunta", "input"]:
-                if c in col_names:
-                    prompt_col = c; break
-
-        print(f"[WORKER] Coluna de prompt detectada: '{prompt_col}'")
-        prompts = [item[prompt_col] for item in ds]
-
-        # Geração
-        outputs = llm.generate(prompts, sampling_params)
-        generated_text = [output.outputs[0].text for output in outputs]
-
-        # Salva Saída (SEM O _new)
+        datasets, prompt_cols, checkpoints = [], [], []
         safe_model = model_name.replace('/', '__')
-        output_filename = os.path.join(data_dir, f"pt_input_response_data_{safe_model}.jsonl")
-
-        ds = ds.add_column("response", generated_text)
-        ds.select_columns([prompt_col, "response"]).to_json(output_filename)
-        print(f"✅ [SUCESSO] Arquivo salvo: {output_filename}")
+        for language, input_file in input_files.items():
+            print(f"[WORKER] Usando arquivo de entrada: {input_file}")
+            input_path = os.path.join(data_dir, input_file)
+            ds = load_dataset("json", data_files={"train": input_path}, split="train")
+
+            # Detecta coluna de prompt
+            col_names = ds.column_names
+            prompt_col = "prompt"
+            if "prompt" not in col_names:
+                for c in ["instruction", "pergunta", "input"]:
+                    if c in col_names:
+                        prompt_col = c; break
+
+            print(f"[WORKER] Coluna de prompt detectada: '{prompt_col}'")
+
+            # Salva Saída (SEM O _new)
+            output_filename = os.path.join(data_dir, f"{language}_input_response_data_{safe_model}.jsonl")
+            datasets.append(ds)
+            prompt_cols.append(prompt_col)
+            checkpoints.append(GenerationCheckpoint(output_filename))
+
+        # Métricas da geração; o tempo de carga do modelo fica de fora
+        generated = {"seconds": 0.0, "prompts": 0, "tokens": 0}
+
+        # Geração: os prompts de todos os idiomas vão numa única submissão, para o
+        # batching contínuo do vLLM ver a carga toda, com checkpoint a cada bloco
+        def generate(chunk):
+            nonlocal llm
+            if llm is None:
+                with metrics.stage(run_log, "load", model=model_name):
+                    llm = load_model(model_name)
+            start = time.perf_counter()
+            outputs = llm.generate(chunk, sampling_params)
+            generated["seconds"] += time.perf_counter() - start
+            generated["prompts"] += len(outputs)
+            generated["tokens"] += sum(len(output.outputs[0].token_ids) for output in outputs)
+            return [output.outputs[0].text for output in outputs]
+
+        response_cache = None
+        if response_cache_path:
+            response_cache = ResponseCache(response_cache_path)
+            cache_params = {"api": "vllm.generate", "max_model_len": MAX_MODEL_LEN,
+                            **vllm_sampling_params(sampling_params)}
+            generate = response_cache.cached(generate, model_name, cache_params)
+
+        generated_texts = generate_all(
+            generate, checkpoints,
+            [prompt_keys(ds, prompt_col) for ds, prompt_col in zip(datasets, prompt_cols)],
+            [ds[prompt_col] for ds, prompt_col in zip(datasets, prompt_cols)],
+            chunk_size=checkpoint_every)
+
+        if run_log:
+            run_log.record_stage("generate", generated["seconds"], model=model_name,
+                                 languages=list(input_files), prompts=generated["prompts"],
+                                 tokens=generated["tokens"])
+            if response_cache is not None:
+                run_log.cache("response", response_cache.hits, response_cache.misses,
+                              model=model_name)
+
+        # Divide as respostas de volta em um arquivo por idioma
+        for ds, prompt_col, checkpoint, generated_text in zip(datasets, prompt_cols, checkpoints, generated_texts):
+            ds = ds.add_column("response", generated_text)
+            # Mantém a chave para que a avaliação associe as respostas pela chave
+            key_cols = ["key"] if "key" in ds.column_names else []
+            checkpoint.commit(ds.select_columns(key_cols + [prompt_col, "response"]).to_json)
+            print(f"✅ [SUCESSO] Arquivo salvo: {checkpoint.output_path}")
 
     except Exception as e:
         print(f"❌ [ERRO] Falha durante geração: {e}")
@@ -87,5 +147,14 @@ def run_model_inference(model_name):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--model_name", type=str, required=True)
+    parser.add_argument("--response_cache", type=str, default=DEFAULT_PATH,
+                        help="Arquivo SQLite com o cache de respostas; vazio para desativar.")
+    parser.add_argument("--all_languages", action="store_true",
+                        help="Gera as respostas de todos os data/*_input_data.jsonl com uma única carga do modelo.")
+    parser.add_argument("--checkpoint_every", type=int, default=2048,
+                        help="Número de prompts gerados entre dois checkpoints.")
+    parser.add_argument("--run_log", type=str, default="",
+                        help="Arquivo JSONL onde registrar os tempos de carga e geração; vazio para desativar.")
     args = parser.parse_args()
-    run_model_inference(args.model_name)
+    run_model_inference(args.model_name, args.response_cache, args.all_languages, args.checkpoint_every,
+                        args.run_log)